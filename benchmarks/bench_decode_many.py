@@ -0,0 +1,80 @@
+"""Benchmark for the scaling of decode_many() with the number of workers.
+
+Usage::
+
+    python benchmarks/bench_decode_many.py path/to/*.jpg --repeat 20
+
+If no paths are given then the JPEG files from *pylibjpeg-data* are used.
+"""
+
+import argparse
+import os
+from pathlib import Path
+import time
+
+from pylibjpeg import decode, decode_many
+
+
+def get_sources(paths):
+    """Return the encoded data to use for the benchmark."""
+    if not paths:
+        from ljdata import JPEG_DIRECTORY
+
+        paths = sorted(Path(JPEG_DIRECTORY, "10918").glob("**/*.JPG"))
+
+    sources = []
+    for path in paths:
+        data = Path(path).read_bytes()
+        try:
+            decode(data)
+        except Exception:
+            continue
+
+        sources.append(data)
+
+    return sources
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="the JPEG files to decode")
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="the number of times to decode each"
+    )
+    parser.add_argument(
+        "--mode", default="thread", help="the decode_many() mode to use"
+    )
+    args = parser.parse_args()
+
+    sources = get_sources(args.paths) * args.repeat
+    nr_bytes = sum(len(x) for x in sources)
+    print(f"Decoding {len(sources)} images ({nr_bytes / 1e6:.1f} MB)")
+
+    start = time.perf_counter()
+    for src in sources:
+        decode(src)
+
+    baseline = time.perf_counter() - start
+    print(f"  decode() loop: {len(sources) / baseline:8.1f} images/s")
+
+    workers = 1
+    cpus = os.cpu_count() or 1
+    while True:
+        start = time.perf_counter()
+        for result in decode_many(sources, workers=workers, mode=args.mode):
+            if result.error:
+                raise result.error
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"  decode_many(workers={workers:>2}, mode={args.mode!r}): {len(sources) / elapsed:8.1f} "
+            f"images/s ({baseline / elapsed:.2f}x)"
+        )
+        if workers >= cpus:
+            break
+
+        workers = min(2 * workers, cpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark for parsing 10918 JPEG data with pylibjpeg.tools.s10918.
+
+Usage::
+
+    python benchmarks/bench_s10918_parse.py path/to/*.jpg --repeat 20
+
+If no paths are given then the JPEG files from *pylibjpeg-data* are used.
+
+The baseline is the byte-at-a-time read loop used by ``parse()`` before v2.2
+to find the markers in and remove the byte stuffing from the entropy-coded
+data, which is where nearly all of its time was spent.
+"""
+
+import argparse
+from io import BytesIO
+from pathlib import Path
+import time
+
+from pylibjpeg.tools.s10918 import parse, parse_buffer
+
+
+def get_sources(paths):
+    """Return the paths and encoded data to use for the benchmark."""
+    if not paths:
+        from ljdata import JPEG_DIRECTORY
+
+        paths = sorted(Path(JPEG_DIRECTORY, "10918").glob("**/*.JPG"))
+
+    sources = []
+    for path in paths:
+        data = Path(path).read_bytes()
+        try:
+            parse_buffer(data)
+        except Exception:
+            continue
+
+        sources.append((path, data))
+
+    return sources
+
+
+def baseline(data):
+    """Return the unstuffed data read a byte at a time from a file-like."""
+    fp = BytesIO(data)
+    encoded = bytearray()
+    segments = []
+    while True:
+        byte = fp.read(1)
+        if byte == b"":
+            break
+
+        if byte != b"\xFF":
+            encoded.extend(byte)
+            continue
+
+        next_byte = fp.read(1)
+        if next_byte == b"\x00":
+            encoded.extend(byte)
+            continue
+
+        segments.append(encoded)
+        encoded = bytearray()
+        while next_byte == b"\xFF":
+            next_byte = fp.read(1)
+
+    return segments
+
+
+def run(label, func, items, nr_bytes, reference=None):
+    """Print the throughput of calling `func` with each of `items`."""
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+
+    elapsed = time.perf_counter() - start
+    msg = f"  {label:<24}: {nr_bytes / elapsed / 1e6:8.1f} MB/s"
+    if reference:
+        msg += f" ({reference / elapsed:.1f}x)"
+
+    print(msg)
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="the JPEG files to parse")
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="the number of times to parse each"
+    )
+    args = parser.parse_args()
+
+    sources = get_sources(args.paths) * args.repeat
+    nr_bytes = sum(len(data) for _, data in sources)
+    print(f"Parsing {len(sources)} images ({nr_bytes / 1e6:.1f} MB)")
+
+    data = [data for _, data in sources]
+    reference = run("per-byte baseline", baseline, data, nr_bytes)
+    run("parse(BytesIO)", lambda x: parse(BytesIO(x)), data, nr_bytes, reference)
+
+    def parse_file(path):
+        with open(path, "rb") as f:
+            parse(f)
+
+    paths = [path for path, _ in sources]
+    run("parse(file)", parse_file, paths, nr_bytes, reference)
+    run("parse_buffer()", parse_buffer, data, nr_bytes, reference)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@
 import logging
 
 from pylibjpeg._version import __version__
-from pylibjpeg.utils import decode  # noqa: F401
+from pylibjpeg.batch import decode_many, decode_stack, encode_many  # noqa: F401
+from pylibjpeg.info import image_info  # noqa: F401
+from pylibjpeg.lazy import LazyImage, open  # noqa: F401
+from pylibjpeg.utils import decode, encode, sniff_format  # noqa: F401
 
 
 # Setup default logging
@@ -0,0 +1,310 @@
+"""An :mod:`asyncio` interface for decoding and encoding.
+
+The blocking work of reading, decoding and encoding is run in a pool of
+threads owned by *pylibjpeg*, with the number of jobs that may run at once
+limited to the size of the pool. Jobs waiting for a free worker are only
+submitted once one becomes available, so cancelling a task that's waiting
+drops its work entirely.
+
+.. versionadded:: 2.2
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import threading
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Iterable,
+    Optional,
+    TypeVar,
+    Union,
+)
+import weakref
+
+import numpy as np
+
+from pylibjpeg.batch import DecodeResult
+from pylibjpeg.utils import (
+    DecodeSource,
+    _check_decoders,
+    _decode_data,
+    _read_source,
+    encode as _encode,
+)
+
+
+T = TypeVar("T")
+
+_LOCK = threading.Lock()
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_CONCURRENCY = os.cpu_count() or 1
+# Each event loop needs its own semaphore
+_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"
+_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def set_concurrency(limit: int) -> None:
+    """Set the maximum number of decoding or encoding jobs that run at once.
+
+    The current pool of threads is shut down once its running jobs have
+    completed and a new pool of `limit` threads is used for new jobs.
+
+    Parameters
+    ----------
+    limit : int
+        The maximum number of jobs, default is the number of CPUs.
+    """
+    global _CONCURRENCY
+
+    if limit < 1:
+        raise ValueError("'limit' must be at least 1")
+
+    with _LOCK:
+        _CONCURRENCY = limit
+        _SEMAPHORES.clear()
+
+    shutdown(wait=False)
+
+
+def get_concurrency() -> int:
+    """Return the maximum number of jobs that run at once."""
+    return _CONCURRENCY
+
+
+def shutdown(wait: bool = True) -> None:
+    """Shut down the pool of threads used to run jobs.
+
+    A new pool is created when needed.
+
+    Parameters
+    ----------
+    wait : bool, optional
+        If ``True`` (default) then wait for the running jobs to complete.
+    """
+    global _EXECUTOR
+
+    with _LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the pool of threads used to run jobs."""
+    global _EXECUTOR
+
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=_CONCURRENCY, thread_name_prefix="pylibjpeg"
+            )
+
+        return _EXECUTOR
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore limiting the jobs for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        if loop not in _SEMAPHORES:
+            _SEMAPHORES[loop] = asyncio.Semaphore(_CONCURRENCY)
+
+        return _SEMAPHORES[loop]
+
+
+async def _run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Return the result of running `func` in the pool of threads.
+
+    If cancelled while waiting for a free worker then `func` is never run,
+    otherwise if it has already started then the cancellation only takes
+    effect after it completes, so the limit on running jobs is kept.
+    """
+    async with _get_semaphore():
+        future: "Future[T]" = _get_executor().submit(func, *args, **kwargs)
+        wrapped = asyncio.wrap_future(future)
+        try:
+            return await asyncio.shield(wrapped)
+        except asyncio.CancelledError:
+            if not future.cancel():
+                await asyncio.wait([wrapped])
+
+            raise
+
+
+def _decode(
+    src: DecodeSource, decoder: str, use_mmap: bool = False, **kwargs: Any
+) -> np.ndarray:
+    """Read and decode `src`."""
+    return _decode_data(_read_source(src, use_mmap), decoder, **kwargs)
+
+
+async def decode(
+    src: DecodeSource, decoder: str = "", use_mmap: bool = False, **kwargs: Any
+) -> np.ndarray:
+    """Return the decoded JPEG image as a :class:`numpy.ndarray`.
+
+    The asynchronous version of :func:`pylibjpeg.decode`, paths and file-likes
+    are read in the pool of threads along with the decoding.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The data to decode. May be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available decoders for the format of the data will be tried.
+    use_mmap : bool, optional
+        If ``True`` and `src` is a path then memory-map the file rather than
+        reading it, default ``False``.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ``ndarray`` containing the decoded image data.
+    """
+    _check_decoders()
+
+    return await _run(_decode, src, decoder, use_mmap, **kwargs)
+
+
+async def _decode_item(
+    position: int, src: DecodeSource, decoder: str, **kwargs: Any
+) -> DecodeResult:
+    """Return the result of reading and decoding `src`."""
+    try:
+        arr = await _run(_decode, src, decoder, **kwargs)
+    except Exception as exc:
+        return DecodeResult(position, None, exc)
+
+    return DecodeResult(position, arr, None)
+
+
+async def decode_many(
+    sources: Union[Iterable[DecodeSource], AsyncIterable[DecodeSource]],
+    decoder: str = "",
+    ordered: bool = True,
+    max_pending: Optional[int] = None,
+    **kwargs: Any,
+) -> AsyncIterator[DecodeResult]:
+    """Yield the decoded JPEG images from `sources`.
+
+    The asynchronous version of :func:`pylibjpeg.decode_many`. Closing the
+    generator or cancelling the task consuming it drops any work that's
+    waiting for a free worker.
+
+    Parameters
+    ----------
+    sources : iterable or async iterable of str, file-like, os.PathLike, or bytes-like
+        The data to decode, each item may be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available decoders for the format of each item will be
+        tried.
+    ordered : bool, optional
+        If ``True`` (default) then yield the results in the same order as
+        `sources`, otherwise yield them as they're completed.
+    max_pending : int, optional
+        The maximum number of sources that are being decoded or waiting to be
+        yielded at any one time, default is twice the concurrency limit.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Yields
+    ------
+    DecodeResult
+        The result for each item in `sources`, containing the position of the
+        item and either the decoded image data or the exception raised while
+        reading or decoding it.
+    """
+    _check_decoders()
+
+    max_pending = max_pending or 2 * _CONCURRENCY
+    if max_pending < 1:
+        raise ValueError("'max_pending' must be at least 1")
+
+    if not isinstance(sources, AsyncIterable):
+        sources = _aiter(sources)
+
+    pending: Deque["asyncio.Task[DecodeResult]"] = deque()
+    try:
+        position = 0
+        async for src in sources:
+            if len(pending) >= max_pending:
+                if ordered:
+                    yield await pending.popleft()
+                else:
+                    yield await _first_completed(pending)
+
+            pending.append(
+                asyncio.ensure_future(_decode_item(position, src, decoder, **kwargs))
+            )
+            position += 1
+
+        while pending:
+            if ordered:
+                yield await pending.popleft()
+            else:
+                yield await _first_completed(pending)
+    finally:
+        for task in pending:
+            task.cancel()
+
+        if pending:
+            await asyncio.wait(pending)
+
+
+async def _aiter(items: Iterable[T]) -> AsyncIterator[T]:
+    """Return an async iterator for `items`."""
+    for item in items:
+        yield item
+
+
+async def _first_completed(
+    pending: Deque["asyncio.Task[DecodeResult]"],
+) -> DecodeResult:
+    """Remove and return the result of the first of `pending` to complete."""
+    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    task = min(done, key=pending.index)
+    pending.remove(task)
+
+    return task.result()
+
+
+async def encode(
+    arr: np.ndarray, encoder: str = "", encoder_type: str = "", **kwargs: Any
+) -> Union[bytes, bytearray]:
+    """Return the encoded `arr` as a :class:`bytes`.
+
+    The asynchronous version of :func:`pylibjpeg.encode`.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The image data to encode as a :class:`~numpy.ndarray`.
+    encoder : str, optional
+        The name of the plugin to use when encoding the data.
+    encoder_type : str, optional
+        The format to encode to, such as ``"JPEG 2000"``. If used without
+        `encoder` then only the encoders for the format will be tried.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the encoder.
+
+    Returns
+    -------
+    bytes
+        The encoded image data.
+    """
+    return await _run(_encode, arr, encoder, encoder_type, **kwargs)
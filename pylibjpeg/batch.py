@@ -0,0 +1,809 @@
+"""Decoding and encoding of multiple images."""
+
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+)
+from concurrent.futures.process import BrokenProcessPool
+import logging
+from math import prod
+import mmap
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import os
+import secrets
+import time
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+
+import numpy as np
+
+from pylibjpeg.info import image_info
+from pylibjpeg.utils import (
+    DecodeSource,
+    Decoder,
+    Encoder,
+    Version,
+    decode_pixel_data,
+    get_pixel_data_decoders,
+    _as_view,
+    _check_decoders,
+    _check_out,
+    _decode_data,
+    _encode_data,
+    _read_source,
+    _resolve_decoders,
+    _resolve_encoders,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DecodeResult(NamedTuple):
+    """The result of decoding one of the sources passed to :func:`decode_many`
+    or :func:`decode_pixel_data_many`.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    position : int
+        The index of the source in the `sources` passed to
+        :func:`decode_many`, or of the frame in the `frames` passed to
+        :func:`decode_pixel_data_many`.
+    arr : numpy.ndarray | None
+        The decoded image data, or ``None`` if decoding failed.
+    error : Exception | None
+        The exception raised while reading or decoding the source, or ``None``
+        if decoding was successful.
+    """
+
+    position: int
+    arr: Optional[np.ndarray]
+    error: Optional[Exception]
+
+
+def _default_workers() -> int:
+    """Return the default number of worker threads."""
+    return os.cpu_count() or 1
+
+
+def _decode_item(
+    index: int,
+    src: DecodeSource,
+    decoder: str,
+    resolved: Dict[str, Dict[str, Decoder]],
+    use_mmap: bool,
+    kwargs: Dict[str, Any],
+) -> DecodeResult:
+    """Return the result of reading and decoding `src`."""
+    try:
+        data = _read_source(src, use_mmap)
+        arr = _decode_data(data, decoder, resolved, **kwargs)
+    except Exception as exc:
+        return DecodeResult(index, None, exc)
+
+    return DecodeResult(index, arr, None)
+
+
+def _schedule(
+    sources: Iterable[Any],
+    submit: Callable[[int, Any], "Future[Any]"],
+    max_pending: int,
+    ordered: bool,
+) -> Iterator[Tuple[int, "Future[Any]"]]:
+    """Yield the completed futures for `sources` as (position, future).
+
+    Parameters
+    ----------
+    sources : iterable
+        The items to submit.
+    submit : Callable[[int, Any], Future]
+        A function that takes the position and item and returns the future
+        for processing the item.
+    max_pending : int
+        The maximum number of futures that are running or waiting to be
+        yielded.
+    ordered : bool
+        If ``True`` then yield the futures in the same order as `sources`,
+        otherwise yield them as they're completed.
+    """
+    pending: Deque[Tuple[int, "Future[Any]"]] = deque()
+    running: Dict["Future[Any]", int] = {}
+    try:
+        if ordered:
+            for position, src in enumerate(sources):
+                if len(pending) >= max_pending:
+                    position_, future = pending.popleft()
+                    wait([future])
+                    yield position_, future
+
+                pending.append((position, submit(position, src)))
+
+            while pending:
+                position_, future = pending.popleft()
+                wait([future])
+                yield position_, future
+
+            return
+
+        for position, src in enumerate(sources):
+            if len(running) >= max_pending:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield running.pop(future), future
+
+            running[submit(position, src)] = position
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield running.pop(future), future
+    finally:
+        # If the generator is closed early, don't process the remainder
+        for _, future in pending:
+            future.cancel()
+
+        for future in running:
+            future.cancel()
+
+
+def decode_many(
+    sources: Iterable[DecodeSource],
+    decoder: str = "",
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    max_pending: Optional[int] = None,
+    mode: str = "thread",
+    use_mmap: bool = False,
+    **kwargs: Any,
+) -> Iterator[DecodeResult]:
+    """Yield the decoded JPEG images from `sources`.
+
+    .. versionadded:: 2.2
+
+    The plugins are resolved once, then each source is read and decoded by a
+    pool of workers. Only a bounded number of sources are read ahead of the
+    results being consumed, so `sources` may be a lazy iterable of any
+    length.
+
+    With the default ``"thread"`` `mode` the sources are decoded using a pool
+    of threads, which scales with the number of available cores for plugins
+    that release the GIL while decoding. For plugins that don't, the
+    ``"process"`` `mode` decodes using a pool of processes instead. Each
+    worker process loads the plugins once and writes the decoded pixels to a
+    :class:`~multiprocessing.shared_memory.SharedMemory` block, and the
+    yielded arrays are views of those blocks rather than copies. A block is
+    released once no more views of it exist.
+
+    Parameters
+    ----------
+    sources : iterable of str, file-like, os.PathLike, or bytes-like
+        The data to decode, each item may be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available decoders for the format of each item will be
+        tried.
+    workers : int, optional
+        The number of workers to use, default is the number of CPUs.
+    ordered : bool, optional
+        If ``True`` (default) then yield the results in the same order as
+        `sources`, otherwise yield them as they're completed.
+    max_pending : int, optional
+        The maximum number of sources that are being decoded or waiting to be
+        yielded at any one time, default is twice the number of `workers`.
+    mode : str, optional
+        The type of worker pool to use, either ``"thread"`` (default) or
+        ``"process"``. Buffers other than :class:`bytes`,
+        :class:`bytearray` and :class:`numpy.ndarray` are copied before being
+        sent to a worker process.
+    use_mmap : bool, optional
+        If ``True`` then memory-map the items that are paths rather than
+        reading them, default ``False``.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Yields
+    ------
+    DecodeResult
+        The result for each item in `sources`, containing the position of the
+        item and either the decoded image data or the exception raised while
+        reading or decoding it.
+
+    Raises
+    ------
+    RuntimeError
+        If no decoders are available.
+    concurrent.futures.process.BrokenProcessPool
+        If using the ``"process"`` `mode` and a worker process terminated
+        abruptly. Results for the items that were being decoded at the time
+        are yielded first with the exception as their error.
+    """
+    _check_decoders()
+
+    workers = workers or _default_workers()
+    if workers < 1:
+        raise ValueError("'workers' must be at least 1")
+
+    max_pending = max_pending or 2 * workers
+    if max_pending < 1:
+        raise ValueError("'max_pending' must be at least 1")
+
+    if mode not in ("thread", "process"):
+        raise ValueError(f"Invalid 'mode' value '{mode}'")
+
+    resolved = _resolve_decoders()
+    if decoder and decoder not in resolved[""]:
+        raise ValueError(
+            f"The '{decoder}' decoder is not available - have you installed "
+            "the plugin?"
+        )
+
+    if mode == "process":
+        yield from _decode_processes(
+            sources, decoder, workers, ordered, max_pending, use_mmap, kwargs
+        )
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(position: int, src: DecodeSource) -> "Future[DecodeResult]":
+            return executor.submit(
+                _decode_item, position, src, decoder, resolved, use_mmap, kwargs
+            )
+
+        for _, future in _schedule(sources, submit, max_pending, ordered):
+            yield future.result()
+
+
+def _decode_pixel_data_item(
+    position: int,
+    src: DecodeSource,
+    transfer_syntax_uid: str,
+    decoder: str,
+    kwargs: Dict[str, Any],
+) -> DecodeResult:
+    """Return the result of decoding the *Pixel Data* frame `src`."""
+    try:
+        frame = decode_pixel_data(src, transfer_syntax_uid, decoder, **kwargs)
+    except Exception as exc:
+        return DecodeResult(position, None, exc)
+
+    if not isinstance(frame, np.ndarray):
+        frame = np.frombuffer(frame, dtype="u1")
+
+    return DecodeResult(position, frame, None)
+
+
+def decode_pixel_data_many(
+    frames: Iterable[DecodeSource],
+    transfer_syntax_uid: str,
+    decoder: str = "",
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    max_pending: Optional[int] = None,
+    **kwargs: Any,
+) -> Iterator[DecodeResult]:
+    """Yield the decoded frames of DICOM *Pixel Data*.
+
+    .. versionadded:: 2.2
+
+    Each frame is decoded with :func:`~pylibjpeg.utils.decode_pixel_data`
+    by a pool of threads, with only a bounded number of frames decoded
+    ahead of the results being consumed. The frames of encapsulated *Pixel
+    Data* are available from :class:`~pylibjpeg.encaps.EncapsulatedFrames`.
+
+    Parameters
+    ----------
+    frames : iterable of str, file-like, os.PathLike, or bytes-like
+        The encoded frames to decode.
+    transfer_syntax_uid : str
+        The *Transfer Syntax UID* of the encoded data.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then all the available decoders for `transfer_syntax_uid` will be
+        tried.
+    workers : int, optional
+        The number of worker threads to use, default is the number of CPUs.
+    ordered : bool, optional
+        If ``True`` (default) then yield the results in the same order as
+        `frames`, otherwise yield them as they're completed.
+    max_pending : int, optional
+        The maximum number of frames that are being decoded or waiting to be
+        yielded at any one time, default is twice the number of `workers`.
+    kwargs : dict
+        A ``dict`` containing the keyword parameters to pass to the decoder,
+        as described in the :doc:`plugin specification </plugins>`.
+
+    Yields
+    ------
+    DecodeResult
+        The result for each frame, containing the position of the frame and
+        either the decoded frame or the exception raised while decoding it.
+        Frames decoded to a :class:`bytearray` are returned as a 1D
+        ``uint8`` array that shares its memory.
+
+    Raises
+    ------
+    ValueError
+        If no decoders are available for `transfer_syntax_uid`.
+    """
+    workers = workers or _default_workers()
+    if workers < 1:
+        raise ValueError("'workers' must be at least 1")
+
+    max_pending = max_pending or 2 * workers
+    if max_pending < 1:
+        raise ValueError("'max_pending' must be at least 1")
+
+    decoders = cast(
+        Dict[str, Dict[str, Decoder]], get_pixel_data_decoders(Version.v2)
+    ).get(transfer_syntax_uid, {})
+    if not decoders or (decoder and decoder not in decoders):
+        raise ValueError(
+            "No pixel data decoders are available for the transfer syntax "
+            f"'{transfer_syntax_uid}'"
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(position: int, src: DecodeSource) -> "Future[DecodeResult]":
+            return executor.submit(
+                _decode_pixel_data_item,
+                position,
+                src,
+                transfer_syntax_uid,
+                decoder,
+                kwargs,
+            )
+
+        for _, future in _schedule(frames, submit, max_pending, ordered):
+            yield future.result()
+
+
+def decode_stack(
+    sources: Sequence[DecodeSource],
+    decoder: str = "",
+    out: Optional[np.ndarray] = None,
+    mmap_path: Optional[Union[str, "os.PathLike[str]"]] = None,
+    workers: Optional[int] = None,
+    **kwargs: Any,
+) -> np.ndarray:
+    """Return the JPEG images in `sources` decoded into a single array.
+
+    .. versionadded:: 2.2
+
+    The output array is allocated once, with shape (frames, rows, columns)
+    or (frames, rows, columns, samples) and the shape and dtype found from
+    the header of the first image, then a pool of threads decodes each image
+    directly into its part of the array. This avoids decoding each image
+    separately and then stacking them, which keeps two copies of the images
+    in memory. If the header can't be read, or doesn't match the decoded
+    first image, then the first image is decoded to find the shape and
+    dtype instead.
+
+    Parameters
+    ----------
+    sources : sequence of str, file-like, os.PathLike, or bytes-like
+        The data to decode, each item may be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data. All the images must have the
+        same shape and dtype once decoded.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available decoders for the format of each item will be
+        tried.
+    out : numpy.ndarray, optional
+        A C-contiguous and writeable array to decode into, with one item
+        along the first axis for each of `sources`.
+    mmap_path : str or os.PathLike, optional
+        If used then decode into a :class:`numpy.memmap` created at this
+        path, rather than into memory. Can't be used with `out`.
+    workers : int, optional
+        The number of worker threads to use, default is the number of CPUs.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Returns
+    -------
+    numpy.ndarray
+        The decoded images, either `out`, a :class:`numpy.memmap` if
+        `mmap_path` is used, or a new array.
+
+    Raises
+    ------
+    RuntimeError
+        If no decoders are available.
+    ValueError
+        If any of the images couldn't be decoded or don't match the output
+        array.
+    """
+    _check_decoders()
+
+    workers = workers or _default_workers()
+    if workers < 1:
+        raise ValueError("'workers' must be at least 1")
+
+    if not sources:
+        raise ValueError("'sources' must contain at least one item")
+
+    if out is not None:
+        if mmap_path is not None:
+            raise ValueError("'out' and 'mmap_path' can't be used together")
+
+        _check_out(out)
+        if out.ndim < 3 or out.shape[0] != len(sources):
+            raise ValueError(
+                f"'out' must have an item for each of the {len(sources)} sources "
+                "along its first axis"
+            )
+
+    resolved = _resolve_decoders()
+    data = _read_source(sources[0])
+    if out is not None:
+        _decode_data(data, decoder, resolved, out=out[0], **kwargs)
+    else:
+        out = _allocate_from_header(data, len(sources), mmap_path)
+        if out is not None:
+            try:
+                _decode_data(data, decoder, resolved, out=out[0], **kwargs)
+            except ValueError as exc:
+                # Raised by _copy_image() if the image doesn't match `out`
+                if not str(exc).startswith("The decoded image has shape"):
+                    raise
+
+                LOGGER.debug(f"The first image doesn't match its header: {exc}")
+                out = None
+
+        if out is None:
+            first = _decode_data(data, decoder, resolved, **kwargs)
+            out = _allocate((len(sources), *first.shape), first.dtype, mmap_path)
+            out[0] = first
+            del first
+
+    del data
+
+    def decode_item(idx: int) -> None:
+        _decode_data(
+            _read_source(sources[idx]), decoder, resolved, out=out[idx], **kwargs
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Raise the first exception, if any
+        list(executor.map(decode_item, range(1, len(sources))))
+
+    if isinstance(out, np.memmap):
+        out.flush()
+
+    return out
+
+
+def _allocate_from_header(
+    data: Any,
+    nr_items: int,
+    mmap_path: Optional[Union[str, "os.PathLike[str]"]],
+) -> Optional[np.ndarray]:
+    """Return a new array for `nr_items` images like the encoded image in
+    `data`, or ``None`` if its header can't be used.
+    """
+    try:
+        info = image_info(data)
+    except ValueError as exc:
+        LOGGER.debug(f"Unable to read the header of the first image: {exc}")
+        return None
+
+    if not info.rows:
+        LOGGER.debug("The number of rows in the first image is set by a DNL marker")
+        return None
+
+    shape: Tuple[int, ...] = (nr_items, info.rows, info.columns)
+    if info.components > 1:
+        shape += (info.components,)
+
+    return _allocate(shape, info.dtype, mmap_path)
+
+
+def _allocate(
+    shape: Tuple[int, ...],
+    dtype: "np.dtype[Any]",
+    mmap_path: Optional[Union[str, "os.PathLike[str]"]],
+) -> np.ndarray:
+    """Return a new array in memory or memory-mapped at `mmap_path`."""
+    if mmap_path is None:
+        return np.empty(shape, dtype=dtype)
+
+    return np.memmap(mmap_path, dtype=dtype, mode="w+", shape=shape)
+
+
+class EncodeResult(NamedTuple):
+    """The result of encoding one of the frames passed to :func:`encode_many`.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    position : int
+        The index of the frame in the `frames` passed to :func:`encode_many`.
+    data : bytes | bytearray | None
+        The encoded frame, or ``None`` if encoding failed.
+    error : Exception | None
+        The exception raised while encoding the frame, or ``None`` if encoding
+        was successful.
+    nbytes : int
+        The length of the encoded frame in bytes, or ``0`` if encoding failed.
+    elapsed : float
+        The time spent encoding the frame, in seconds.
+    """
+
+    position: int
+    data: Optional[Union[bytes, bytearray]]
+    error: Optional[Exception]
+    nbytes: int
+    elapsed: float
+
+
+def _encode_item(
+    position: int,
+    arr: np.ndarray,
+    encoders: Dict[str, Encoder],
+    kwargs: Dict[str, Any],
+) -> EncodeResult:
+    """Return the result of encoding `arr`."""
+    start = time.perf_counter()
+    try:
+        data = _encode_data(arr, encoders, **kwargs)
+    except Exception as exc:
+        return EncodeResult(position, None, exc, 0, time.perf_counter() - start)
+
+    return EncodeResult(position, data, None, len(data), time.perf_counter() - start)
+
+
+def encode_many(
+    frames: Iterable[np.ndarray],
+    encoder: str = "",
+    encoder_type: str = "",
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    max_pending: Optional[int] = None,
+    **kwargs: Any,
+) -> Iterator[EncodeResult]:
+    """Yield the encoded `frames`.
+
+    .. versionadded:: 2.2
+
+    The encoders are resolved once, then the frames are encoded by a pool
+    of threads. Only a bounded number of frames are encoded ahead of the
+    results being consumed.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray or iterable of numpy.ndarray
+        The image data to encode. If an ``ndarray`` then each item along
+        the first axis will be encoded as a separate frame.
+    encoder : str, optional
+        The name of the plugin to use when encoding the data.
+    encoder_type : str, optional
+        The format to encode to, one of the keys of
+        :data:`~pylibjpeg.utils.ENCODER_ENTRY_POINTS`, such as
+        ``"JPEG 2000"``. If used without `encoder` then only the encoders for
+        the format will be tried.
+    workers : int, optional
+        The number of worker threads to use, default is the number of CPUs.
+    ordered : bool, optional
+        If ``True`` (default) then yield the results in the same order as
+        `frames`, otherwise yield them as they're completed.
+    max_pending : int, optional
+        The maximum number of frames that are being encoded or waiting to be
+        yielded at any one time, default is twice the number of `workers`.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the encoder.
+
+    Yields
+    ------
+    EncodeResult
+        The result for each frame, containing the position of the frame,
+        either the encoded data or the exception raised while encoding it,
+        and the size of the encoded data and time spent encoding.
+
+    Raises
+    ------
+    RuntimeError
+        If no encoders are available for `encoder_type`.
+    ValueError
+        If `encoder_type` is unknown or the `encoder` plugin is not
+        available.
+    """
+    workers = workers or _default_workers()
+    if workers < 1:
+        raise ValueError("'workers' must be at least 1")
+
+    max_pending = max_pending or 2 * workers
+    if max_pending < 1:
+        raise ValueError("'max_pending' must be at least 1")
+
+    encoders = _resolve_encoders(encoder, encoder_type)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(position: int, arr: np.ndarray) -> "Future[EncodeResult]":
+            return executor.submit(_encode_item, position, arr, encoders, kwargs)
+
+        for _, future in _schedule(frames, submit, max_pending, ordered):
+            yield future.result()
+
+
+# The decoders available to a worker process
+_WORKER_DECODERS: Dict[str, Dict[str, Decoder]] = {}
+
+
+class _SharedBlock(NamedTuple):
+    """The shape and dtype of an array written to shared memory."""
+
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class _SharedMemoryBuffer(np.ndarray):
+    """A 'uint8' ndarray over a shared memory block that keeps it open.
+
+    NumPy doesn't hold a buffer export for the memory-mapped block, so the
+    block must not be closed while any views of it exist. Views that aren't
+    of this type always keep a reference to it as their base, so the block
+    is only closed (and its memory released) after the last view is gone.
+    """
+
+    _shm: SharedMemory
+
+
+def _init_worker() -> None:
+    """Load the decoders for a new worker process."""
+    _WORKER_DECODERS.update(_resolve_decoders())
+
+
+def _decode_shared(
+    position: int,
+    src: DecodeSource,
+    decoder: str,
+    name: str,
+    use_mmap: bool,
+    kwargs: Dict[str, Any],
+) -> Union[DecodeResult, _SharedBlock]:
+    """Decode `src` into a new shared memory block named `name`."""
+    try:
+        data = _read_source(src, use_mmap)
+        arr = _decode_data(data, decoder, _WORKER_DECODERS, **kwargs)
+    except Exception as exc:
+        return DecodeResult(position, None, exc)
+
+    if not arr.nbytes:
+        return DecodeResult(position, arr, None)
+
+    shm = SharedMemory(name=name, create=True, size=arr.nbytes)
+    try:
+        out: np.ndarray = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+        out[...] = arr
+        del out
+    finally:
+        shm.close()
+
+    return _SharedBlock(arr.shape, arr.dtype.str)
+
+
+def _attach(name: str, block: _SharedBlock) -> np.ndarray:
+    """Return an ndarray view of the shared memory block `name`."""
+    shm = SharedMemory(name=name)
+    # Remove the name now, the memory is freed once the block is closed
+    shm.unlink()
+
+    buffer = np.ndarray.__new__(
+        _SharedMemoryBuffer, (shm.size,), dtype="u1", buffer=shm.buf
+    )
+    buffer._shm = shm
+
+    dtype = np.dtype(block.dtype)
+    nbytes = prod(block.shape) * dtype.itemsize
+
+    arr = buffer[:nbytes].view(np.ndarray).view(dtype)
+
+    return cast(np.ndarray, arr.reshape(block.shape))
+
+
+def _unlink(name: str) -> None:
+    """Remove the shared memory block `name`, if it exists."""
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+
+    shm.close()
+    shm.unlink()
+
+
+def _decode_processes(
+    sources: Iterable[DecodeSource],
+    decoder: str,
+    workers: int,
+    ordered: bool,
+    max_pending: int,
+    use_mmap: bool,
+    kwargs: Dict[str, Any],
+) -> Iterator[DecodeResult]:
+    """Yield the decoded `sources` using a pool of processes."""
+    # Keep the names short, macOS limits them to 31 characters
+    prefix = f"plj{secrets.token_hex(4)}_"
+    # The shared memory blocks that haven't been attached to yet
+    names: Dict[int, str] = {}
+
+    def submit(position: int, src: DecodeSource) -> "Future[Any]":
+        # File-likes, memoryviews and maps can't be sent to another process
+        if isinstance(src, (memoryview, mmap.mmap)):
+            src = _as_view(src).tobytes()
+        elif hasattr(src, "read"):
+            src = src.read()
+
+        names[position] = f"{prefix}{position}"
+        return executor.submit(
+            _decode_shared,
+            position,
+            src,
+            decoder,
+            names[position],
+            use_mmap,
+            kwargs,
+        )
+
+    # Workers must share our resource tracker, otherwise blocks created by a
+    #   worker and unlinked by us are reported as leaked by the worker's tracker
+    resource_tracker.ensure_running()
+    executor: Executor = ProcessPoolExecutor(workers, initializer=_init_worker)
+    try:
+        with executor:
+            try:
+                for position, future in _schedule(
+                    sources, submit, max_pending, ordered
+                ):
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as exc:
+                        # Such as an unpicklable exception raised by a plugin
+                        result = DecodeResult(position, None, exc)
+
+                    name = names.pop(position)
+                    if isinstance(result, _SharedBlock):
+                        result = DecodeResult(position, _attach(name, result), None)
+
+                    yield result
+            except BrokenProcessPool as exc:
+                LOGGER.error("A worker process terminated abruptly")
+                # Remove any blocks created by the in-flight items
+                for position in sorted(names):
+                    _unlink(names.pop(position))
+                    yield DecodeResult(position, None, exc)
+
+                raise
+    finally:
+        # Remove any blocks that were created but won't be yielded
+        for name in names.values():
+            _unlink(name)
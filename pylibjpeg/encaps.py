@@ -0,0 +1,511 @@
+"""Access to the frames in encapsulated DICOM *Pixel Data*.
+
+.. versionadded:: 2.2
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+from struct import pack, unpack_from
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Sized,
+    Tuple,
+    Union,
+    cast,
+)
+
+import numpy as np
+
+from pylibjpeg.batch import _default_workers, _schedule
+from pylibjpeg.utils import (
+    Buffer,
+    Encoder,
+    Version,
+    _as_view,
+    get_pixel_data_encoders,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The (FFFE,E000) Item and (FFFE,E0DD) Sequence Delimitation Item tags as
+#   (group, element)
+ITEM_TAG = (0xFFFE, 0xE000)
+SEQUENCE_DELIMITER_TAG = (0xFFFE, 0xE0DD)
+
+# The markers at the end of a frame of JPEG, JPEG-LS and JPEG 2000 data,
+#   the EOI and EOC markers are both 0xFFD9
+_END_MARKER = b"\xFF\xD9"
+
+OffsetTable = Union[bytes, bytearray, memoryview, Sequence[int]]
+
+
+class OffsetTables(NamedTuple):
+    """The offset tables for *Pixel Data* written by
+    :func:`encapsulate_frames`.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    basic_offsets : list of int
+        The offset to each frame's item tag from the start of the first
+        fragment's item tag, as used by the Basic Offset Table.
+    extended_offsets : bytes
+        The value for the *Extended Offset Table* element, the same offsets
+        encoded as little endian 64-bit integers.
+    extended_lengths : bytes
+        The value for the *Extended Offset Table Lengths* element, the length
+        of each encoded frame, without padding, encoded as little endian
+        64-bit integers.
+    nbytes : int
+        The total number of bytes written.
+    """
+
+    basic_offsets: List[int]
+    extended_offsets: bytes
+    extended_lengths: bytes
+    nbytes: int
+
+
+class EncapsulatedFrames:
+    """Random access to the frames in encapsulated *Pixel Data*.
+
+    .. versionadded:: 2.2
+
+    The *Pixel Data* is split into its Basic Offset Table and fragments by
+    parsing the item tags, then the fragments for each frame are found
+    using, in order of preference:
+
+    * The *Extended Offset Table* and *Extended Offset Table Lengths*, if
+      supplied, in which case only the item for the requested frame is
+      parsed.
+    * The Basic Offset Table, if not empty.
+    * One frame per fragment, if there are `number_of_frames` fragments, or
+      one frame for all the fragments, if `number_of_frames` is 1.
+    * Otherwise the frames are found by scanning for the fragments that end
+      with a JPEG EOI or JPEG 2000 EOC marker.
+
+    Frames contained in a single fragment are returned as a
+    :class:`memoryview` of the *Pixel Data* without copying, frames spread
+    over multiple fragments have their fragments joined.
+
+    Examples
+    --------
+
+    Decode the frames in a multi-frame dataset using a pool of threads::
+
+        from pydicom import dcmread
+        from pylibjpeg.batch import decode_pixel_data_many
+        from pylibjpeg.encaps import EncapsulatedFrames
+
+        ds = dcmread("path/to/file.dcm")
+        frames = EncapsulatedFrames(ds.PixelData, ds.get("NumberOfFrames", 1))
+        uid = ds.file_meta.TransferSyntaxUID
+        for result in decode_pixel_data_many(frames, uid):
+            ...
+    """
+
+    def __init__(
+        self,
+        buffer: Buffer,
+        number_of_frames: Optional[int] = None,
+        extended_offsets: Optional[OffsetTable] = None,
+        extended_lengths: Optional[OffsetTable] = None,
+    ) -> None:
+        """Create a new index of the frames.
+
+        Parameters
+        ----------
+        buffer : bytes-like
+            The encapsulated *Pixel Data*, starting with the item tag of the
+            Basic Offset Table.
+        number_of_frames : int, optional
+            The number of frames in the *Pixel Data*, as given by the
+            *Number of Frames* element. If not used then it will be found
+            from the offset tables or by scanning the fragments.
+        extended_offsets : bytes-like or list of int, optional
+            The value of the *Extended Offset Table* element, either as the
+            encoded little endian 64-bit offsets or a list of offsets. Each
+            offset is from the start of the first fragment's item tag to the
+            item tag of the fragment containing the frame.
+        extended_lengths : bytes-like or list of int, optional
+            The value of the *Extended Offset Table Lengths* element, in the
+            same form as `extended_offsets`. If not used then the lengths of
+            the frames are the lengths of their fragments.
+
+        Raises
+        ------
+        ValueError
+            If the *Pixel Data* or offset tables are invalid, or the number of
+            frames found doesn't match `number_of_frames`.
+        """
+        self._view = _as_view(buffer)
+        if number_of_frames is not None and number_of_frames < 1:
+            raise ValueError("'number_of_frames' must be at least 1")
+
+        length = self._item(0, "Basic Offset Table")
+        if length % 4:
+            raise ValueError(
+                f"The length of the Basic Offset Table, {length}, isn't a "
+                "multiple of 4"
+            )
+
+        self.basic_offsets = list(unpack_from(f"<{length // 4}L", self._view, 8))
+        # The offset to the item tag of the first fragment
+        self._first = 8 + length
+        self._requested = number_of_frames
+        self._fragments: Optional[List[Tuple[int, int]]] = None
+        self._frames: Optional[List[Tuple[int, int]]] = None
+
+        self._extended: Optional[List[int]] = None
+        self._lengths: Optional[List[int]] = None
+        if extended_offsets is not None:
+            self._extended = _offsets(extended_offsets)
+            if extended_lengths is not None:
+                self._lengths = _offsets(extended_lengths)
+                if len(self._lengths) != len(self._extended):
+                    raise ValueError(
+                        "The Extended Offset Table and Extended Offset Table "
+                        "Lengths have different numbers of values"
+                    )
+
+            nr_frames = len(self._extended)
+        else:
+            nr_frames = len(self._index())
+
+        if number_of_frames is not None and nr_frames != number_of_frames:
+            raise ValueError(
+                f"Found {nr_frames} frames in the Pixel Data but "
+                f"'number_of_frames' is {number_of_frames}"
+            )
+
+        self.number_of_frames = number_of_frames or nr_frames
+
+    def __getitem__(self, index: int) -> memoryview:
+        """Return the frame at `index`."""
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"Frame index {index} is out of range")
+
+        index %= len(self)
+        if self._extended is not None:
+            start = self._first + self._extended[index]
+            length = self._item(start, f"frame {index}")
+            if self._lengths is not None:
+                if self._lengths[index] > length:
+                    raise ValueError(
+                        f"The length of frame {index} in the Extended Offset "
+                        "Table Lengths is larger than its fragment"
+                    )
+
+                length = self._lengths[index]
+
+            return self._view[start + 8 : start + 8 + length]
+
+        fragments = self._fragment_items()
+        first, stop = self._index()[index]
+        if stop - first == 1:
+            offset, length = fragments[first]
+            return self._view[offset : offset + length]
+
+        return memoryview(
+            b"".join(
+                self._view[offset : offset + length]
+                for offset, length in fragments[first:stop]
+            )
+        )
+
+    def __iter__(self) -> Iterator[memoryview]:
+        """Yield the frames in order."""
+        for index in range(len(self)):
+            yield self[index]
+
+    def __len__(self) -> int:
+        """Return the number of frames."""
+        return self.number_of_frames
+
+    @property
+    def nr_fragments(self) -> int:
+        """Return the number of fragments in the *Pixel Data*."""
+        return len(self._fragment_items())
+
+    def _fragment_items(self) -> List[Tuple[int, int]]:
+        """Return the (offset, length) of the data for each fragment."""
+        if self._fragments is None:
+            self._fragments = []
+            offset = self._first
+            end = len(self._view)
+            while offset + 8 <= end:
+                tag = unpack_from("<HH", self._view, offset)
+                if tag == SEQUENCE_DELIMITER_TAG:
+                    break
+
+                length = self._item(offset, f"fragment {len(self._fragments)}")
+                self._fragments.append((offset + 8, length))
+                offset += 8 + length
+
+        return self._fragments
+
+    def _index(self) -> List[Tuple[int, int]]:
+        """Return the [start, stop) indices of the fragments for each frame."""
+        if self._frames is not None:
+            return self._frames
+
+        fragments = self._fragment_items()
+        if not fragments:
+            raise ValueError("The Pixel Data contains no fragments")
+
+        nr_fragments = len(fragments)
+        if self.basic_offsets:
+            # The offset to each fragment's item tag from the first fragment
+            starts = [offset - 8 - self._first for offset, _ in fragments]
+            indices = []
+            for offset in self.basic_offsets:
+                if offset not in starts:
+                    raise ValueError(
+                        f"The Basic Offset Table offset {offset} doesn't match "
+                        "the start of a fragment"
+                    )
+
+                indices.append(starts.index(offset))
+
+            bounds = indices + [nr_fragments]
+            self._frames = list(zip(bounds[:-1], bounds[1:]))
+            return self._frames
+
+        if self._requested == nr_fragments:
+            self._frames = [(idx, idx + 1) for idx in range(nr_fragments)]
+        elif self._requested == 1:
+            self._frames = [(0, nr_fragments)]
+        else:
+            LOGGER.debug("Finding the frames by scanning for the end markers")
+            self._frames = []
+            start = 0
+            for idx, (offset, length) in enumerate(fragments):
+                data = self._view[offset : offset + length]
+                # Allow for trailing padding
+                if data[-2:] == _END_MARKER or data[-3:-1] == _END_MARKER:
+                    self._frames.append((start, idx + 1))
+                    start = idx + 1
+
+            if start < nr_fragments:
+                if self._frames:
+                    raise ValueError(
+                        "The last fragments of the Pixel Data don't end with "
+                        "an EOI or EOC marker"
+                    )
+
+                # No end markers, such as with RLE Lossless
+                self._frames = [(idx, idx + 1) for idx in range(nr_fragments)]
+
+        return self._frames
+
+    def _item(self, offset: int, name: str) -> int:
+        """Return the length of the item at `offset`."""
+        if offset + 8 > len(self._view):
+            raise ValueError(f"The item tag for the {name} is missing")
+
+        group, element, length = unpack_from("<HHL", self._view, offset)
+        if (group, element) != ITEM_TAG:
+            raise ValueError(
+                f"Expected the item tag for the {name} at offset {offset} but "
+                f"found ({group:04X},{element:04X})"
+            )
+
+        if length == 0xFFFFFFFF:
+            raise ValueError(f"The item for the {name} has an undefined length")
+
+        if offset + 8 + length > len(self._view):
+            raise ValueError(
+                f"The item for the {name} at offset {offset} extends past the "
+                "end of the Pixel Data"
+            )
+
+        return int(length)
+
+
+def encapsulate_frames(
+    frames: Iterable[Union[np.ndarray, Buffer]],
+    transfer_syntax_uid: str,
+    fp: BinaryIO,
+    encoder: str = "",
+    basic_offsets: bool = False,
+    workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    **kwargs: Any,
+) -> OffsetTables:
+    """Encode `frames` and write them to `fp` as encapsulated *Pixel Data*.
+
+    .. versionadded:: 2.2
+
+    The frames are encoded with the pixel data encoders for
+    `transfer_syntax_uid` by a pool of threads and written in order as one
+    fragment per frame, padded to an even length, followed by a Sequence
+    Delimitation Item. Only a bounded number of frames are encoded ahead of
+    being written, so `frames` may be a lazy iterable of any length.
+
+    Parameters
+    ----------
+    frames : iterable of numpy.ndarray or bytes-like
+        The unencoded frames, in the form described by the
+        :doc:`plugin specification </plugins>`.
+    transfer_syntax_uid : str
+        The *Transfer Syntax UID* to encode to.
+    fp : file-like
+        The file-like to write the *Pixel Data* value to, starting with the
+        Basic Offset Table item.
+    encoder : str, optional
+        The name of the plugin to use when encoding the data. If not used
+        then all the available encoders for `transfer_syntax_uid` will be
+        tried.
+    basic_offsets : bool, optional
+        If ``False`` (default) then write an empty Basic Offset Table, as
+        required when the *Extended Offset Table* is used. If ``True`` then
+        write the Basic Offset Table, which requires that `frames` has a
+        length, `fp` is seekable and the offsets fit in 32 bits.
+    workers : int, optional
+        The number of worker threads to use, default is the number of CPUs.
+    max_pending : int, optional
+        The maximum number of frames that are being encoded or waiting to be
+        written at any one time, default is twice the number of `workers`.
+    kwargs : dict
+        A ``dict`` containing the keyword parameters to pass to the encoder,
+        as described in the :doc:`plugin specification </plugins>`. The
+        ``"number_of_frames"`` parameter is always ``1``.
+
+    Returns
+    -------
+    OffsetTables
+        The offset tables for the written frames.
+
+    Raises
+    ------
+    ValueError
+        If no encoders are available for `transfer_syntax_uid`, if the Basic
+        Offset Table can't be written or if a frame couldn't be encoded.
+    """
+    workers = workers or _default_workers()
+    if workers < 1:
+        raise ValueError("'workers' must be at least 1")
+
+    max_pending = max_pending or 2 * workers
+    if max_pending < 1:
+        raise ValueError("'max_pending' must be at least 1")
+
+    encoders = cast(
+        Dict[str, Dict[str, Encoder]], get_pixel_data_encoders(Version.v2)
+    ).get(transfer_syntax_uid, {})
+    if encoder:
+        encoders = {encoder: encoders[encoder]} if encoder in encoders else {}
+
+    if not encoders:
+        raise ValueError(
+            "No pixel data encoders are available for the transfer syntax "
+            f"'{transfer_syntax_uid}'"
+        )
+
+    nr_offsets = 0
+    if basic_offsets:
+        if not isinstance(frames, Sized):
+            raise ValueError(
+                "Writing the Basic Offset Table requires 'frames' to have a length"
+            )
+
+        if not fp.seekable():
+            raise ValueError("Writing the Basic Offset Table requires a seekable 'fp'")
+
+        nr_offsets = len(frames)
+
+    kwargs["transfer_syntax_uid"] = transfer_syntax_uid
+    kwargs["number_of_frames"] = 1
+
+    start = fp.tell() if basic_offsets else 0
+    # Reserve space for the Basic Offset Table
+    fp.write(pack("<HHL", *ITEM_TAG, 4 * nr_offsets) + bytes(4 * nr_offsets))
+
+    offsets: List[int] = []
+    lengths: List[int] = []
+    offset = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(position: int, frame: Any) -> "Future[bytes]":
+            return executor.submit(_encode_frame, frame, encoders, kwargs)
+
+        for _, future in _schedule(frames, submit, max_pending, True):
+            data = future.result()
+            offsets.append(offset)
+            lengths.append(len(data))
+            padding = b"\x00" if len(data) % 2 else b""
+            fp.write(pack("<HHL", *ITEM_TAG, len(data) + len(padding)))
+            fp.write(data)
+            fp.write(padding)
+            offset += 8 + len(data) + len(padding)
+
+    fp.write(pack("<HHL", *SEQUENCE_DELIMITER_TAG, 0))
+    if basic_offsets:
+        if len(offsets) != nr_offsets:
+            raise ValueError(
+                f"'frames' has a length of {nr_offsets} but contained "
+                f"{len(offsets)} frames"
+            )
+
+        if offsets and offsets[-1] > 0xFFFFFFFF:
+            raise ValueError(
+                "The offsets are too large for the Basic Offset Table, use the "
+                "Extended Offset Table instead"
+            )
+
+        end = fp.tell()
+        fp.seek(start + 8)
+        fp.write(pack(f"<{nr_offsets}L", *offsets))
+        fp.seek(end)
+
+    return OffsetTables(
+        offsets,
+        pack(f"<{len(offsets)}Q", *offsets),
+        pack(f"<{len(lengths)}Q", *lengths),
+        8 + 4 * nr_offsets + offset + 8,
+    )
+
+
+def _encode_frame(
+    frame: Union[np.ndarray, Buffer],
+    encoders: Dict[str, Encoder],
+    kwargs: Dict[str, Any],
+) -> bytes:
+    """Return the encoded `frame`."""
+    if isinstance(frame, np.ndarray):
+        src = frame.tobytes()
+    else:
+        src = _as_view(frame).tobytes()
+
+    for name, func in encoders.items():
+        try:
+            return bytes(func(src, **kwargs))
+        except Exception as exc:
+            LOGGER.debug(f"Encoding with the {name} plugin failed: {exc}")
+            error = exc
+
+    raise ValueError("Unable to encode the frame with the available plugins") from error
+
+
+def _offsets(table: Any) -> List[int]:
+    """Return the offsets in the offset table `table`."""
+    if isinstance(table, (bytes, bytearray, memoryview)):
+        view = _as_view(table)
+        if len(view) % 8:
+            raise ValueError(
+                "The length of an Extended Offset Table must be a multiple of 8"
+            )
+
+        return list(unpack_from(f"<{len(view) // 8}Q", view))
+
+    return [int(x) for x in table]
@@ -0,0 +1,393 @@
+"""Read image information from the headers of encoded data.
+
+.. versionadded:: 2.2
+"""
+
+import io
+import logging
+import os
+from pathlib import Path
+from struct import unpack
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+    cast,
+)
+
+import numpy as np
+
+from pylibjpeg.utils import (
+    DecodeSource,
+    _SOF_MARKERS,
+    _as_view,
+    _get_plugins,
+    _sniff,
+    _sniff_file,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ImageInfo(NamedTuple):
+    """Information about an encoded image, as returned by :func:`image_info`.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    format : str
+        The format of the encoded image, one of the keys of
+        :data:`~pylibjpeg.utils.DECODER_ENTRY_POINTS`.
+    rows : int
+        The number of rows of pixels in the image. May be ``0`` for 10918
+        JPEG images where the number of rows is defined by a DNL marker
+        after the first scan.
+    columns : int
+        The number of columns of pixels in the image.
+    components : int
+        The number of components (samples per pixel) in the image.
+    precision : int
+        The number of bits per sample, the maximum of all components if they
+        differ.
+    process : str
+        The coding process, such as the name of the SOFn marker for 10918
+        JPEG (``"SOF0"`` to ``"SOF15"``) and JPEG-LS (``"SOF55"``), or
+        ``"J2K"`` or ``"HTJ2K"`` for JPEG 2000.
+    nbytes : int
+        The estimated size of the decoded image in bytes, assuming the
+        components aren't subsampled and each sample is stored using the
+        smallest of 1, 2 or 4 bytes that fits the `precision`.
+    signed : bool
+        ``True`` if the samples are signed integers, which is only possible
+        for JPEG 2000, ``False`` otherwise (default).
+    """
+
+    format: str
+    rows: int
+    columns: int
+    components: int
+    precision: int
+    process: str
+    nbytes: int
+    signed: bool = False
+
+    @property
+    def dtype(self) -> "np.dtype[Any]":
+        """Return the expected :class:`numpy.dtype` of the decoded image.
+
+        Each sample is assumed to be stored using the smallest of 1, 2 or 4
+        bytes that fits the `precision`, as with `nbytes`.
+        """
+        kind = "i" if self.signed else "u"
+
+        return np.dtype(f"{kind}{_itemsize(self.precision)}")
+
+
+class InfoReader(Protocol):
+    def __call__(self, src: BinaryIO, **kwargs: Any) -> ImageInfo:
+        ...  # pragma: no cover
+
+
+INFO_ENTRY_POINTS = {
+    "JPEG": "pylibjpeg.jpeg_info_readers",
+    "JPEG XT": "pylibjpeg.jpeg_xt_info_readers",
+    "JPEG-LS": "pylibjpeg.jpeg_ls_info_readers",
+    "JPEG 2000": "pylibjpeg.jpeg_2000_info_readers",
+    "JPEG XR": "pylibjpeg.jpeg_xr_info_readers",
+    "JPEG XS": "pylibjpeg.jpeg_xs_info_readers",
+    "JPEG XL": "pylibjpeg.jpeg_xl_info_readers",
+}
+
+
+def image_info(src: DecodeSource, **kwargs: Any) -> ImageInfo:
+    """Return information about the encoded image in `src` without decoding.
+
+    .. versionadded:: 2.2
+
+    Only the headers of the encoded data are read, stopping at the first
+    SOFn marker segment for 10918 JPEG and JPEG XT, the SOF55 marker segment
+    for JPEG-LS and the SIZ marker segment for JPEG 2000. Other formats
+    require a plugin that has registered an information reader with the
+    corresponding entry point in :data:`INFO_ENTRY_POINTS`.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The encoded image. May be a path to a file (as ``str`` or path-like),
+        a file-like, or an object supporting the buffer protocol containing
+        the encoded binary data. File-likes will be returned to their
+        original position.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to a plugin's
+        information reader.
+
+    Returns
+    -------
+    ImageInfo
+        The information about the image.
+
+    Raises
+    ------
+    ValueError
+        If the format of the data can't be identified or its headers can't
+        be parsed, or if no information reader is available for the format.
+    """
+    if isinstance(src, (str, os.PathLike)):
+        with Path(src).open("rb") as f:
+            return _image_info(_Source(f), **kwargs)
+
+    if hasattr(src, "read"):
+        return _image_info(_Source(cast(BinaryIO, src)), **kwargs)
+
+    return _image_info(_Source(_as_view(src)), **kwargs)
+
+
+def _image_info(src: "_Source", **kwargs: Any) -> ImageInfo:
+    """Return information about the encoded image in `src`."""
+    fmt = src.format()
+    if fmt in ("JPEG", "JPEG XT", "JPEG-LS"):
+        return _info_10918(src, fmt)
+
+    if fmt == "JPEG 2000":
+        return _info_15444(src)
+
+    if not fmt:
+        raise ValueError("Unable to identify the format of the encoded data")
+
+    readers = cast(Dict[str, InfoReader], _get_plugins(INFO_ENTRY_POINTS, fmt))
+    if not readers:
+        raise ValueError(
+            f"No information readers are available for {fmt} - have you "
+            "installed the plugin?"
+        )
+
+    for name, reader in readers.items():
+        try:
+            return reader(src.fileobj(), **kwargs)
+        except Exception as exc:
+            LOGGER.debug(f"Reading the image information with {name} failed")
+            LOGGER.exception(exc)
+
+    raise ValueError(
+        "Unable to read the image information with the available plugins"
+    )
+
+
+class _Source:
+    """Random access to encoded data in a buffer or file-like.
+
+    File-likes are read from their current position and returned to it
+    afterwards.
+    """
+
+    def __init__(self, src: Union[memoryview, BinaryIO]) -> None:
+        self._view: Optional[memoryview] = None
+        self._file: Optional[BinaryIO] = None
+        if isinstance(src, memoryview):
+            self._view = src
+        else:
+            self._file = src
+            self._start = src.tell()
+
+    def format(self) -> str:
+        """Return the format of the encoded data."""
+        if self._view is not None:
+            return cast(str, _sniff(self._view, complete=True))
+
+        try:
+            return _sniff_file(cast(BinaryIO, self._file))
+        finally:
+            self._reset()
+
+    def fileobj(self) -> BinaryIO:
+        """Return a file-like positioned at the start of the encoded data."""
+        if self._view is not None:
+            return io.BytesIO(self._view)
+
+        self._reset()
+
+        return cast(BinaryIO, self._file)
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Return up to `length` bytes starting at `offset`."""
+        if self._view is not None:
+            return bytes(self._view[offset : offset + length])
+
+        f = cast(BinaryIO, self._file)
+        try:
+            f.seek(self._start + offset)
+            return f.read(length)
+        finally:
+            self._reset()
+
+    def read_exact(self, offset: int, length: int) -> bytes:
+        """Return `length` bytes starting at `offset`."""
+        data = self.read(offset, length)
+        if len(data) != length:
+            raise ValueError(
+                f"Unexpected end of data when reading {length} bytes at "
+                f"offset {offset}"
+            )
+
+        return data
+
+    def _reset(self) -> None:
+        """Return the file-like to its original position."""
+        cast(BinaryIO, self._file).seek(self._start)
+
+
+def _itemsize(precision: int) -> int:
+    """Return the number of bytes used to store a sample with `precision`."""
+    return 1 if precision <= 8 else 2 if precision <= 16 else 4
+
+
+def _nbytes(rows: int, columns: int, components: int, precision: int) -> int:
+    """Return the estimated size of the decoded image in bytes."""
+    return rows * columns * components * _itemsize(precision)
+
+
+def _info_10918(src: _Source, fmt: str) -> ImageInfo:
+    """Return the image information from a 10918 JPEG or JPEG-LS SOFn segment.
+
+    Parameters
+    ----------
+    src : _Source
+        The encoded data, starting with an SOI marker.
+    fmt : str
+        The format of the encoded data, as identified by sniffing.
+    """
+    # The image size for hierarchical processes from the DHP segment
+    dimensions: Optional[Tuple[int, int]] = None
+    offset = 2
+    while True:
+        marker = src.read(offset, 2)
+        if len(marker) < 2:
+            raise ValueError("No SOFn marker found in the JPEG data")
+
+        if marker[0] != 0xFF:
+            raise ValueError(
+                f"Expected a marker at offset {offset}, found 0x{marker.hex().upper()}"
+            )
+
+        code = marker[1]
+        if code == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            # Standalone markers: TEM and RSTn
+            offset += 2
+            continue
+
+        if code == 0xDA:
+            raise ValueError("No SOFn marker found before the first scan")
+
+        if code == 0xD9:
+            raise ValueError("No SOFn marker found in the JPEG data")
+
+        (length,) = unpack(">H", src.read_exact(offset + 2, 2))
+        if code in _SOF_MARKERS or code in (0xDE, 0xF7):
+            # P, Y, X, Nf
+            header = src.read_exact(offset + 4, 6)
+            precision, rows, columns, components = unpack(">BHHB", header)
+            if code == 0xDE:
+                dimensions = (rows, columns)
+                offset += 2 + length
+                continue
+
+            if dimensions is not None:
+                rows, columns = dimensions
+
+            process = "SOF55" if code == 0xF7 else f"SOF{code - 0xC0}"
+            return ImageInfo(
+                fmt,
+                rows,
+                columns,
+                components,
+                precision,
+                process,
+                _nbytes(rows, columns, components, precision),
+                False,
+            )
+
+        offset += 2 + length
+
+
+def _info_15444(src: _Source) -> ImageInfo:
+    """Return the image information from a JPEG 2000 SIZ segment.
+
+    Parameters
+    ----------
+    src : _Source
+        The encoded data, either a codestream or a JP2/JPH file.
+    """
+    offset = 0 if src.read(0, 2) == b"\xff\x4f" else _find_codestream(src)
+    if src.read(offset, 4) != b"\xff\x4f\xff\x51":
+        raise ValueError("No SIZ marker found in the JPEG 2000 codestream")
+
+    # Lsiz, Rsiz, Xsiz, Ysiz, XOsiz, YOsiz, XTsiz, YTsiz, XTOsiz, YTOsiz, Csiz
+    siz = unpack(">HHIIIIIIIIH", src.read_exact(offset + 4, 38))
+    rsiz, xsiz, ysiz, xosiz, yosiz = siz[1:6]
+    components = siz[10]
+    # Ssiz, XRsiz, YRsiz for each component
+    ssiz = src.read_exact(offset + 42, 3 * components)[::3]
+    precision = max((x & 0x7F) + 1 for x in ssiz) if ssiz else 0
+    # Ssiz bit 7 indicates signed samples
+    signed = any(x & 0x80 for x in ssiz)
+
+    rows = ysiz - yosiz
+    columns = xsiz - xosiz
+    # Rsiz bit 14 indicates Part 15 HTJ2K capabilities
+    process = "HTJ2K" if rsiz & 0x4000 else "J2K"
+
+    return ImageInfo(
+        "JPEG 2000",
+        rows,
+        columns,
+        components,
+        precision,
+        process,
+        _nbytes(rows, columns, components, precision),
+        signed,
+    )
+
+
+def _find_codestream(src: _Source) -> int:
+    """Return the offset to the codestream in the contiguous codestream box.
+
+    Parameters
+    ----------
+    src : _Source
+        The encoded JP2 or JPH data.
+    """
+    offset = 0
+    while True:
+        header = src.read(offset, 8)
+        if len(header) < 8:
+            raise ValueError("No contiguous codestream box found in the JP2 data")
+
+        length, box_type = unpack(">I4s", header)
+        header_length = 8
+        if length == 1:
+            (length,) = unpack(">Q", src.read_exact(offset + 8, 8))
+            header_length = 16
+
+        if box_type == b"jp2c":
+            return offset + header_length
+
+        if length == 0:
+            # The last box in the file
+            raise ValueError("No contiguous codestream box found in the JP2 data")
+
+        if length < header_length:
+            raise ValueError(f"Invalid box length {length} at offset {offset}")
+
+        offset += length
@@ -0,0 +1,276 @@
+"""Deferred decoding of encoded images.
+
+.. versionadded:: 2.2
+"""
+
+import logging
+import threading
+from typing import Any, BinaryIO, Optional, Tuple, cast
+
+import numpy as np
+
+from pylibjpeg.info import ImageInfo, image_info
+from pylibjpeg.utils import DecodeSource, _check_decoders, _decode_data, _read_source
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The memory policies for the decoded pixels
+POLICIES = ("keep", "release")
+
+
+class LazyImage:
+    """An encoded image that's only decoded when its pixels are accessed.
+
+    .. versionadded:: 2.2
+
+    The :attr:`shape`, :attr:`dtype` and :attr:`nbytes` are read from the
+    header of the encoded image using :func:`~pylibjpeg.image_info`, and the
+    image is decoded the first time it's converted to an array with
+    :func:`numpy.asarray` or indexed. If the header can't be used, such as
+    for 10918 JPEG images where the number of rows is set by a DNL marker,
+    then the image is decoded to find them instead.
+
+    Use :func:`~pylibjpeg.open` to create a :class:`LazyImage`.
+
+    Examples
+    --------
+
+    >>> from pylibjpeg import open
+    >>> images = [open(path) for path in paths]
+    >>> large = [im for im in images if im.shape[0] > 1024]
+    >>> arr = large[0][:256, :256]
+    """
+
+    def __init__(
+        self,
+        src: DecodeSource,
+        decoder: str = "",
+        policy: str = "keep",
+        use_mmap: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        """Create a new :class:`LazyImage`.
+
+        Parameters
+        ----------
+        src : str, file-like, os.PathLike, or bytes-like
+            The encoded image, see :func:`~pylibjpeg.open`.
+        decoder : str, optional
+            The name of the plugin to use when decoding the image.
+        policy : str, optional
+            The memory policy for the decoded pixels, see
+            :func:`~pylibjpeg.open`.
+        use_mmap : bool, optional
+            If ``True`` and `src` is a path then memory-map the file when
+            decoding rather than reading it, default ``False``.
+        kwargs : dict
+            A ``dict`` containing keyword parameters to pass to the decoder.
+        """
+        if policy not in POLICIES:
+            raise ValueError(
+                f"Invalid 'policy' value '{policy}', must be one of "
+                f"{', '.join(POLICIES)}"
+            )
+
+        self._src = src
+        # File-likes are read from their current position when decoding
+        self._position: Optional[int] = None
+        if hasattr(src, "read"):
+            self._position = cast(BinaryIO, src).tell()
+
+        self._decoder = decoder
+        self._policy = policy
+        self._use_mmap = use_mmap
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._arr: Optional[np.ndarray] = None
+        self._info: Optional[ImageInfo] = None
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._dtype: Optional["np.dtype[Any]"] = None
+
+        try:
+            self._info = image_info(src)
+        except ValueError as exc:
+            LOGGER.debug(f"Unable to read the header of the image: {exc}")
+            return
+
+        if not self._info.rows:
+            LOGGER.debug("The number of rows in the image is set by a DNL marker")
+            return
+
+        self._shape = (self._info.rows, self._info.columns)
+        if self._info.components > 1:
+            self._shape += (self._info.components,)
+
+        self._dtype = self._info.dtype
+
+    def __array__(
+        self, dtype: Optional["np.dtype[Any]"] = None, copy: Optional[bool] = None
+    ) -> np.ndarray:
+        """Return the decoded image as a :class:`numpy.ndarray`.
+
+        Raises
+        ------
+        ValueError
+            If `copy` is ``False`` and `dtype` requires the image to be
+            converted.
+        """
+        arr = self._pixels()
+        if dtype is not None and arr.dtype != dtype:
+            if copy is False:
+                raise ValueError(
+                    f"Unable to return the image as '{np.dtype(dtype)}' "
+                    "without a copy"
+                )
+
+            return arr.astype(dtype)
+
+        return arr.copy() if copy else arr
+
+    def __getitem__(self, key: Any) -> Any:
+        """Return the pixels of the decoded image at `key`."""
+        return self._pixels()[key]
+
+    def __len__(self) -> int:
+        """Return the number of rows of pixels in the image."""
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        """Return a string representation of the image."""
+        state = "decoded" if self.is_decoded else "encoded"
+        return f"<LazyImage shape={self.shape} dtype={self.dtype} {state}>"
+
+    @property
+    def dtype(self) -> "np.dtype[Any]":
+        """Return the dtype of the decoded image."""
+        if self._dtype is None:
+            self._pixels()
+
+        return cast("np.dtype[Any]", self._dtype)
+
+    @property
+    def info(self) -> Optional[ImageInfo]:
+        """Return the information from the header of the encoded image, or
+        ``None`` if it couldn't be read.
+        """
+        return self._info
+
+    @property
+    def is_decoded(self) -> bool:
+        """Return ``True`` if the decoded pixels are currently held."""
+        return self._arr is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Return the size of the decoded image in bytes."""
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @property
+    def ndim(self) -> int:
+        """Return the number of dimensions of the decoded image."""
+        return len(self.shape)
+
+    def release(self) -> None:
+        """Release the decoded pixels, they will be decoded again on the next
+        access.
+        """
+        with self._lock:
+            self._arr = None
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """Return the shape of the decoded image."""
+        if self._shape is None:
+            self._pixels()
+
+        return cast(Tuple[int, ...], self._shape)
+
+    def _decode(self) -> np.ndarray:
+        """Return the decoded image."""
+        _check_decoders()
+        if self._position is None:
+            data = _read_source(self._src, self._use_mmap)
+        else:
+            fp = cast(BinaryIO, self._src)
+            fp.seek(self._position)
+            data = fp.read()
+
+        return _decode_data(data, self._decoder, **self._kwargs)
+
+    def _pixels(self) -> np.ndarray:
+        """Return the decoded image, decoding it if required."""
+        with self._lock:
+            arr = self._arr
+            if arr is None:
+                arr = self._decode()
+                self._update(arr)
+                if self._policy == "keep":
+                    self._arr = arr
+
+        return arr
+
+    def _update(self, arr: np.ndarray) -> None:
+        """Set the shape and dtype of the image from the decoded `arr`."""
+        if self._shape is not None and arr.shape != self._shape:
+            LOGGER.debug(
+                f"The decoded image has shape {arr.shape} but the header "
+                f"gives {self._shape}"
+            )
+
+        self._shape = arr.shape
+        self._dtype = arr.dtype
+
+
+def open(
+    src: DecodeSource,
+    decoder: str = "",
+    policy: str = "keep",
+    use_mmap: bool = False,
+    **kwargs: Any,
+) -> LazyImage:
+    """Return a :class:`LazyImage` that decodes `src` when it's accessed.
+
+    .. versionadded:: 2.2
+
+    Only the header of the encoded image is read, making it cheap to open
+    a large number of images to find their shapes or select a subset of
+    them.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The encoded image. May be a path to a file (as ``str`` or path-like),
+        a file-like, or an object supporting the buffer protocol containing
+        the encoded binary data. Files are read when the image is decoded,
+        and file-likes from their position when :func:`open` was called, so
+        they must remain open until then.
+    decoder : str, optional
+        The name of the plugin to use when decoding the image. If not used
+        then the available decoders for the format of the data will be
+        tried.
+    policy : str, optional
+        The memory policy for the decoded pixels, one of:
+
+        * ``"keep"`` (default): the pixels are kept after the first access
+          until :meth:`LazyImage.release` is called.
+        * ``"release"``: the pixels are released after each access, so the
+          image is decoded every time it's accessed and only the arrays
+          returned use memory.
+    use_mmap : bool, optional
+        If ``True`` and `src` is a path then memory-map the file when
+        decoding rather than reading it, default ``False``.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Returns
+    -------
+    LazyImage
+        The lazily decoded image.
+
+    Raises
+    ------
+    ValueError
+        If `policy` is invalid.
+    """
+    return LazyImage(src, decoder, policy, use_mmap, **kwargs)
@@ -0,0 +1,339 @@
+"""Decoding of parts of 10918 JPEG images.
+
+The functions here use the structure of the encoded data, as found by
+:mod:`pylibjpeg.tools.s10918`, to build smaller stand-alone JPEGs that are
+then decoded by the installed plugins.
+
+.. versionadded:: 2.2
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from typing import Any, Optional
+
+import numpy as np
+
+from pylibjpeg.batch import _default_workers
+from pylibjpeg.tools.s10918 import (
+    get_frames,
+    restart_region,
+    restart_strips,
+    truncate_frames,
+    truncate_scans,
+)
+from pylibjpeg.utils import (
+    DecodeSource,
+    _check_decoders,
+    _decode_data,
+    _read_source,
+    _resolve_decoders,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def decode_frames(
+    src: DecodeSource,
+    rows: int = 0,
+    columns: int = 0,
+    decoder: str = "",
+    **kwargs: Any,
+) -> np.ndarray:
+    """Return a lower resolution version of a hierarchical JPEG image decoded
+    from only some of its frames.
+
+    .. versionadded:: 2.2
+
+    Each frame of a hierarchical JPEG refines the image reconstructed from
+    the frames before it, usually at an increasing resolution. The frames up
+    to and including the first with at least `rows` rows and `columns`
+    columns are decoded using JPEG data built by
+    :func:`~pylibjpeg.tools.s10918.truncate_frames`, so by default only the
+    first, non-differential, frame is decoded. The frames in a hierarchical
+    JPEG, with their sizes and the references between them, are available
+    from :func:`~pylibjpeg.tools.s10918.get_frames`.
+
+    If no frame is large enough then all the frames are decoded. Images that
+    aren't hierarchical are decoded in full, which is logged at the
+    ``DEBUG`` level.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The 10918 JPEG data to decode. May be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data.
+    rows : int, optional
+        The minimum number of rows in the decoded image, default ``0``.
+    columns : int, optional
+        The minimum number of columns in the decoded image, default ``0``.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available JPEG decoders will be tried.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ``ndarray`` containing the decoded image data.
+
+    Raises
+    ------
+    RuntimeError
+        If no decoders are available.
+    ValueError
+        If the data couldn't be decoded.
+    """
+    _check_decoders()
+
+    data = _read_source(src)
+    try:
+        frames = get_frames(data)
+        nr_frames = next(
+            (
+                idx
+                for idx, frame in enumerate(frames, 1)
+                if frame.rows >= rows and frame.columns >= columns
+            ),
+            len(frames),
+        )
+        data = truncate_frames(data, nr_frames)
+    except Exception as exc:
+        LOGGER.debug(f"Unable to decode only the first frames, decoding in full: {exc}")
+
+    return _decode_data(data, decoder, **kwargs)
+
+
+def decode_region(
+    src: DecodeSource,
+    rows: slice = slice(None),
+    cols: slice = slice(None),
+    decoder: str = "",
+    **kwargs: Any,
+) -> np.ndarray:
+    """Return part of a decoded JPEG image as a :class:`numpy.ndarray`.
+
+    .. versionadded:: 2.2
+
+    For JPEG images with restart intervals, only the restart intervals that
+    cover the region are decoded, using a JPEG built by
+    :func:`~pylibjpeg.tools.s10918.restart_region`. If the restart interval
+    divides the number of MCUs per line then this is limited to both the
+    `rows` and `cols` of the region, otherwise to its `rows`. Images that
+    can't be split at their restart markers, such as those without restart
+    intervals, are decoded in full and then cropped, which is logged at the
+    ``DEBUG`` level.
+
+    With chroma subsampled images the intervals next to the region are also
+    decoded, so the region is upsampled the same as the full image.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The 10918 JPEG data to decode. May be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data.
+    rows : slice, optional
+        The rows of the image to return, default all rows.
+    cols : slice, optional
+        The columns of the image to return, default all columns.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available JPEG decoders will be tried.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ``ndarray`` containing the decoded image data for the region, as
+        with ``decode(src)[rows, cols]``.
+
+    Raises
+    ------
+    RuntimeError
+        If no decoders are available.
+    ValueError
+        If the data couldn't be decoded.
+    """
+    _check_decoders()
+
+    data = _read_source(src)
+    try:
+        region = restart_region(data, rows, cols)
+    except Exception as exc:
+        LOGGER.debug(f"Unable to decode only the region, decoding in full: {exc}")
+        # Copy so the full image isn't kept alive by the returned view
+        return np.array(_decode_data(data, decoder, **kwargs)[rows, cols])
+
+    LOGGER.debug(
+        f"Decoding {region.rows} x {region.columns} samples at ({region.row}, "
+        f"{region.column}) using {len(region.data)} of {len(data)} bytes"
+    )
+
+    return _decode_data(region.data, decoder, **kwargs)[region.crop]
+
+
+def decode_scans(
+    src: DecodeSource, nr_scans: int, decoder: str = "", **kwargs: Any
+) -> np.ndarray:
+    """Return a preview of a progressive JPEG image decoded from only its
+    first `nr_scans` scans.
+
+    .. versionadded:: 2.2
+
+    Each scan of a progressive JPEG refines the image, so decoding only the
+    first few gives a lower quality image for a fraction of the entropy
+    decoding time. The number of bytes of the JPEG data needed for a given
+    number of scans is available from
+    :func:`~pylibjpeg.tools.s10918.get_scans`, which can be used to plan
+    partial reads of the data.
+
+    Images that aren't progressive, or that have no more than `nr_scans`
+    scans, are decoded in full, which is logged at the ``DEBUG`` level.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The 10918 JPEG data to decode. May be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data.
+    nr_scans : int
+        The number of scans to decode, must be at least 1.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available JPEG decoders will be tried.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ``ndarray`` containing the decoded image data.
+
+    Raises
+    ------
+    RuntimeError
+        If no decoders are available.
+    ValueError
+        If `nr_scans` is invalid or the data couldn't be decoded.
+    """
+    _check_decoders()
+
+    if nr_scans < 1:
+        raise ValueError("'nr_scans' must be at least 1")
+
+    data = _read_source(src)
+    try:
+        data = truncate_scans(data, nr_scans)
+    except Exception as exc:
+        LOGGER.debug(f"Unable to decode only the first scans, decoding in full: {exc}")
+
+    return _decode_data(data, decoder, **kwargs)
+
+
+def decode_strips(
+    src: DecodeSource,
+    decoder: str = "",
+    rows: int = 0,
+    workers: Optional[int] = None,
+    **kwargs: Any,
+) -> np.ndarray:
+    """Return the decoded JPEG image after decoding strips of it concurrently.
+
+    .. versionadded:: 2.2
+
+    JPEG images with restart intervals are split at the restart markers into
+    horizontal strips using :func:`~pylibjpeg.tools.s10918.restart_strips`,
+    with each strip being a stand-alone JPEG that's decoded by a pool of
+    threads directly into its rows of the output array. This lets a single
+    large image be decoded using multiple cores with plugins that release
+    the GIL while decoding.
+
+    Images that can't be split, such as those without restart intervals or
+    using a progressive or hierarchical process, are decoded in full as with
+    :func:`~pylibjpeg.decode`.
+
+    With chroma subsampled images each strip is decoded together with the
+    rows next to it, so it's upsampled the same as the full image, and then
+    copied into the output array.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The 10918 JPEG data to decode. May be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then the available JPEG decoders will be tried.
+    rows : int, optional
+        The minimum number of rows in each strip, default ``0`` to use one
+        strip per `workers` or the smallest strips possible, whichever is
+        larger.
+    workers : int, optional
+        The number of threads to use, default is the number of CPUs.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ``ndarray`` containing the decoded image data.
+
+    Raises
+    ------
+    RuntimeError
+        If no decoders are available.
+    ValueError
+        If the data couldn't be decoded.
+    """
+    _check_decoders()
+
+    workers = workers or _default_workers()
+    if workers < 1:
+        raise ValueError("'workers' must be at least 1")
+
+    data = _read_source(src)
+    resolved = _resolve_decoders()
+    try:
+        strips = restart_strips(data, rows)
+    except Exception as exc:
+        LOGGER.debug(f"Unable to split the image into strips: {exc}")
+        return _decode_data(data, decoder, resolved, **kwargs)
+
+    if not rows and len(strips) > workers:
+        # Use one strip per worker
+        height = strips[-1].row + strips[-1].rows
+        strips = restart_strips(data, -(-height // workers))
+
+    if len(strips) < 2:
+        LOGGER.debug("The image is too small to be split into strips")
+        return _decode_data(data, decoder, resolved, **kwargs)
+
+    # The first strip gives the shape and dtype of the output
+    first = _decode_data(strips[0].data, decoder, resolved, **kwargs)
+    shape = (strips[-1].row + strips[-1].rows, *first.shape[1:])
+    out = np.empty(shape, dtype=first.dtype)
+    out[: strips[0].rows] = first[: strips[0].rows]
+    del first
+
+    def decode_strip(idx: int) -> None:
+        strip = strips[idx]
+        rows = out[strip.row : strip.row + strip.rows]
+        if strip.overlap == (0, 0):
+            _decode_data(strip.data, decoder, resolved, out=rows, **kwargs)
+            return
+
+        # Crop the rows of the neighbouring strips
+        above = strip.overlap[0]
+        arr = _decode_data(strip.data, decoder, resolved, **kwargs)
+        rows[...] = arr[above : above + strip.rows]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Raise the first exception, if any
+        list(executor.map(decode_strip, range(1, len(strips))))
+
+    return out
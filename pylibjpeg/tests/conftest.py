@@ -0,0 +1,33 @@
+"""Shared fixtures for the tests."""
+
+from importlib import metadata
+
+import pytest
+
+from pylibjpeg.utils import REGISTRY
+
+
+@pytest.fixture
+def plugins(monkeypatch):
+    """Return a function that replaces the installed plugins.
+
+    The function takes a dict of ``{entry point: {name: function}}`` and
+    registers the functions as the only available plugins.
+    """
+
+    def register(groups):
+        entry_points = {}
+        loaded = {}
+        for group, funcs in groups.items():
+            eps = []
+            for name, func in funcs.items():
+                ep = metadata.EntryPoint(name=name, value=f"{name}:func", group=group)
+                eps.append(ep)
+                loaded[ep] = func
+
+            entry_points[group] = tuple(eps)
+
+        monkeypatch.setattr(REGISTRY, "_groups", entry_points)
+        monkeypatch.setattr(REGISTRY, "_loaded", loaded)
+
+    return register
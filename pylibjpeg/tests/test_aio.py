@@ -0,0 +1,208 @@
+"""Tests for the asyncio interface."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from pylibjpeg import aio
+
+J2K = b"\xff\x4f\xff\x51"
+
+
+def j2k_decoder(src, **kwargs):
+    """A fake JPEG 2000 decoder."""
+    if src[4:5] == b"\x00":
+        raise ValueError("Bad data")
+
+    return np.full((2, 2), src[4], dtype="u1")
+
+
+def encoder(arr, **kwargs):
+    """A fake JPEG 2000 encoder."""
+    return J2K + bytes([arr[0, 0]])
+
+
+@pytest.fixture
+def concurrency():
+    """Restore the concurrency limit after the test."""
+    original = aio.get_concurrency()
+    yield
+    aio.set_concurrency(original)
+
+
+class TestDecode:
+    """Tests for aio.decode()."""
+
+    def test_no_decoders_raises(self, plugins):
+        """Test an exception is raised if no decoders are available."""
+        plugins({})
+        msg = r"No JPEG decoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            asyncio.run(aio.decode(J2K))
+
+    def test_decode(self, plugins, tmp_path):
+        """Test decoding."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        fpath = tmp_path / "test.j2k"
+        fpath.write_bytes(J2K + b"\x02")
+
+        async def main():
+            return [
+                await aio.decode(J2K + b"\x01"),
+                await aio.decode(fpath, decoder="foo"),
+            ]
+
+        arr, arr2 = asyncio.run(main())
+        assert np.array_equal(arr, np.ones((2, 2)))
+        assert np.array_equal(arr2, np.full((2, 2), 2))
+
+    def test_decode_failure(self, plugins):
+        """Test failure to decode."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        with pytest.raises(ValueError, match=r"Unable to decode"):
+            asyncio.run(aio.decode(J2K + b"\x00"))
+
+    def test_cancel_drops_queued(self, plugins, concurrency):
+        """Test cancelling tasks waiting for a worker drops their work."""
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def decoder(src, **kwargs):
+            calls.append(None)
+            started.set()
+            release.wait(5)
+            return np.zeros((1,))
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": decoder}})
+        aio.set_concurrency(1)
+
+        async def main():
+            tasks = [asyncio.create_task(aio.decode(J2K)) for _ in range(4)]
+            while not started.is_set():
+                await asyncio.sleep(0.001)
+
+            for task in tasks[1:]:
+                task.cancel()
+
+            release.set()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+        results = asyncio.run(main())
+        assert isinstance(results[0], np.ndarray)
+        for result in results[1:]:
+            assert isinstance(result, asyncio.CancelledError)
+
+        assert len(calls) == 1
+
+    def test_concurrency_limit(self, plugins, concurrency):
+        """Test the number of running jobs is limited."""
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def decoder(src, **kwargs):
+            with lock:
+                active.append(None)
+                peak.append(len(active))
+
+            threading.Event().wait(0.005)
+            with lock:
+                active.pop()
+
+            return np.zeros((1,))
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": decoder}})
+        aio.set_concurrency(2)
+        assert aio.get_concurrency() == 2
+
+        async def main():
+            return await asyncio.gather(*[aio.decode(J2K) for _ in range(10)])
+
+        asyncio.run(main())
+        assert max(peak) <= 2
+
+    def test_invalid_concurrency_raises(self):
+        """Test an invalid concurrency limit raises."""
+        with pytest.raises(ValueError, match="'limit' must be at least 1"):
+            aio.set_concurrency(0)
+
+
+class TestDecodeMany:
+    """Tests for aio.decode_many()."""
+
+    def test_ordered(self, plugins):
+        """Test decoding with ordered results."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        sources = [J2K + bytes([ii]) for ii in range(30)]
+
+        async def main():
+            return [x async for x in aio.decode_many(sources, max_pending=3)]
+
+        results = asyncio.run(main())
+        assert [r.position for r in results] == list(range(30))
+        assert isinstance(results[0].error, ValueError)
+        for ii, result in enumerate(results[1:], 1):
+            assert result.arr[0, 0] == ii
+
+    def test_unordered_async_sources(self, plugins):
+        """Test decoding an async iterable with unordered results."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+
+        async def sources():
+            for ii in range(1, 30):
+                yield J2K + bytes([ii])
+
+        async def main():
+            return [x async for x in aio.decode_many(sources(), ordered=False)]
+
+        results = asyncio.run(main())
+        assert sorted(r.position for r in results) == list(range(29))
+        for result in results:
+            assert result.arr[0, 0] == result.position + 1
+
+    def test_close_early(self, plugins):
+        """Test closing the generator early cancels the pending work."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        consumed = []
+
+        def sources():
+            for ii in range(1, 100):
+                consumed.append(ii)
+                yield J2K + bytes([ii])
+
+        async def main():
+            gen = aio.decode_many(sources(), max_pending=2)
+            result = await gen.__anext__()
+            await gen.aclose()
+            return result
+
+        assert asyncio.run(main()).position == 0
+        assert len(consumed) <= 3
+
+    def test_invalid_max_pending_raises(self, plugins):
+        """Test an invalid max_pending raises."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+
+        async def main():
+            return [x async for x in aio.decode_many([J2K], max_pending=-1)]
+
+        with pytest.raises(ValueError, match="'max_pending' must be at least 1"):
+            asyncio.run(main())
+
+
+class TestEncode:
+    """Tests for aio.encode()."""
+
+    def test_encode(self, plugins):
+        """Test encoding."""
+        plugins({"pylibjpeg.jpeg_2000_encoders": {"foo": encoder}})
+        arr = np.full((2, 2), 3, dtype="u1")
+        assert asyncio.run(aio.encode(arr)) == J2K + b"\x03"
+        assert asyncio.run(aio.encode(arr, encoder="foo")) == J2K + b"\x03"
+        assert asyncio.run(aio.encode(arr, encoder_type="JPEG 2000")) == J2K + b"\x03"
+
+        with pytest.raises(RuntimeError, match="No JPEG-LS encoders are available"):
+            asyncio.run(aio.encode(arr, encoder_type="JPEG-LS"))
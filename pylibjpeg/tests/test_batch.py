@@ -0,0 +1,487 @@
+"""Tests for decoding and encoding multiple images."""
+
+from concurrent.futures.process import BrokenProcessPool
+import gc
+from io import BytesIO
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from pylibjpeg import decode, decode_many, decode_stack, encode_many
+from pylibjpeg.batch import (
+    DecodeResult,
+    EncodeResult,
+    _SharedMemoryBuffer,
+    decode_pixel_data_many,
+)
+
+J2K = b"\xff\x4f\xff\x51"
+
+
+def j2k_decoder(src, **kwargs):
+    """A fake JPEG 2000 decoder."""
+    if src[4:5] == b"\x00":
+        raise ValueError("Bad data")
+
+    return np.full((2, 2), src[4], dtype="u1")
+
+
+class TestDecodeMany:
+    """Tests for decode_many()."""
+
+    def test_no_decoders_raises(self, plugins):
+        """Test an exception is raised if no decoders are available."""
+        plugins({})
+        msg = r"No JPEG decoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            next(decode_many([J2K]))
+
+    def test_unknown_decoder_raises(self, plugins):
+        """Test an exception is raised if the decoder isn't available."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        msg = r"The 'bar' decoder is not available"
+        with pytest.raises(ValueError, match=msg):
+            next(decode_many([J2K], decoder="bar"))
+
+    def test_ordered(self, plugins):
+        """Test decoding with ordered results."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        sources = [J2K + bytes([ii]) for ii in range(1, 50)]
+        results = list(decode_many(sources, workers=4))
+        assert [r.position for r in results] == list(range(49))
+        for ii, result in enumerate(results, 1):
+            assert isinstance(result, DecodeResult)
+            assert result.error is None
+            assert np.array_equal(result.arr, np.full((2, 2), ii))
+
+    def test_unordered(self, plugins):
+        """Test decoding with unordered results."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        sources = [J2K + bytes([ii]) for ii in range(1, 50)]
+        results = list(decode_many(sources, workers=4, ordered=False))
+        assert sorted(r.position for r in results) == list(range(49))
+        for result in results:
+            assert result.arr[0, 0] == result.position + 1
+
+    def test_errors(self, plugins, tmp_path):
+        """Test failures are returned per item."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        sources = [J2K + b"\x01", J2K + b"\x00", tmp_path / "missing", J2K + b"\x02"]
+        results = list(decode_many(sources, decoder="foo"))
+        assert results[0].arr[0, 0] == 1
+        assert results[1].arr is None
+        assert isinstance(results[1].error, ValueError)
+        assert isinstance(results[2].error, FileNotFoundError)
+        assert results[3].arr[0, 0] == 2
+
+    def test_sources(self, plugins, tmp_path):
+        """Test decoding from paths and file-likes."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        fpath = tmp_path / "test.j2k"
+        fpath.write_bytes(J2K + b"\x03")
+        with open(fpath, "rb") as f:
+            results = list(decode_many([fpath, str(fpath), f]))
+
+        assert [r.arr[0, 0] for r in results] == [3, 3, 3]
+
+    def test_bounded(self, plugins):
+        """Test the number of items being decoded is bounded."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        consumed = []
+
+        def sources():
+            for ii in range(1, 100):
+                consumed.append(ii)
+                yield J2K + bytes([ii])
+
+        gen = decode_many(sources(), workers=2, max_pending=3)
+        next(gen)
+        assert len(consumed) <= 4
+        gen.close()
+
+    def test_parallel(self, plugins):
+        """Test items are decoded concurrently."""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def decoder(src, **kwargs):
+            with lock:
+                active.append(None)
+                peak.append(len(active))
+
+            time.sleep(0.01)
+            with lock:
+                active.pop()
+
+            return np.zeros((1,))
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": decoder}})
+        list(decode_many([J2K] * 16, workers=4))
+        assert max(peak) > 1
+
+    def test_invalid_workers_raises(self, plugins):
+        """Test invalid workers and max_pending values raise."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        with pytest.raises(ValueError, match="'workers' must be at least 1"):
+            next(decode_many([J2K], workers=-1))
+
+        with pytest.raises(ValueError, match="'max_pending' must be at least 1"):
+            next(decode_many([J2K], max_pending=-1))
+
+
+def crash_decoder(src, **kwargs):
+    """A fake JPEG 2000 decoder that crashes the worker process."""
+    if src[4:5] == b"\x00":
+        os._exit(1)
+
+    return np.full((2, 3), src[4], dtype="<u2")
+
+
+# Fake plugins are only inherited by worker processes when forking
+IS_FORK = multiprocessing.get_start_method() == "fork"
+
+
+@pytest.mark.skipif(not IS_FORK, reason="Requires the 'fork' start method")
+class TestDecodeManyProcess:
+    """Tests for decode_many() with mode='process'."""
+
+    def test_invalid_mode_raises(self, plugins):
+        """Test an invalid mode raises."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        with pytest.raises(ValueError, match="Invalid 'mode' value 'foo'"):
+            next(decode_many([J2K], mode="foo"))
+
+    def test_decode(self, plugins):
+        """Test decoding using processes."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": crash_decoder}})
+        sources = [J2K + bytes([ii]) for ii in range(1, 20)]
+        results = list(decode_many(sources, workers=2, mode="process"))
+        assert [r.position for r in results] == list(range(19))
+        for ii, result in enumerate(results, 1):
+            assert result.error is None
+            assert result.arr.dtype == "<u2"
+            assert result.arr.shape == (2, 3)
+            assert np.array_equal(result.arr, np.full((2, 3), ii))
+
+    def test_zero_copy(self, plugins):
+        """Test the results are views of shared memory."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": crash_decoder}})
+        results = list(decode_many([J2K + b"\x01"], mode="process"))
+        arr = results[0].arr
+        assert not arr.flags.owndata
+        base = arr
+        while not isinstance(base, _SharedMemoryBuffer):
+            base = base.base
+
+        # The block stays open while any views exist
+        view = arr[1:]
+        del arr, results, base
+        gc.collect()
+        assert np.array_equal(view, np.ones((1, 3)))
+
+    def test_errors(self, plugins, tmp_path):
+        """Test failures are returned per item."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        fpath = tmp_path / "test.j2k"
+        fpath.write_bytes(J2K + b"\x03")
+        with open(fpath, "rb") as f:
+            sources = [J2K + b"\x00", tmp_path / "missing", fpath, f]
+            results = list(decode_many(sources, mode="process", ordered=False))
+
+        results = sorted(results, key=lambda x: x.position)
+        assert isinstance(results[0].error, ValueError)
+        assert isinstance(results[1].error, FileNotFoundError)
+        assert results[2].arr[0, 0] == 3
+        assert results[3].arr[0, 0] == 3
+
+    def test_worker_crash(self, plugins):
+        """Test a crashed worker process is handled."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": crash_decoder}})
+        sources = [J2K + b"\x01"] * 4 + [J2K + b"\x00"] + [J2K + b"\x01"] * 20
+        results = []
+        with pytest.raises(BrokenProcessPool):
+            for result in decode_many(sources, workers=2, mode="process"):
+                results.append(result)
+
+        # Items queued at the time of the crash may also fail
+        assert [r.position for r in results] == list(range(len(results)))
+        assert isinstance(results[4].error, BrokenProcessPool)
+        for result in results:
+            if result.error is None:
+                assert result.arr[0, 0] == 1
+            else:
+                assert isinstance(result.error, BrokenProcessPool)
+
+    def test_close_early(self, plugins):
+        """Test closing the generator early."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": crash_decoder}})
+        gen = decode_many([J2K + b"\x01"] * 20, workers=2, mode="process")
+        assert next(gen).error is None
+        gen.close()
+
+
+class TestDecodePixelDataMany:
+    """Tests for decode_pixel_data_many()."""
+
+    uid = "1.2.840.10008.1.2.4.90"
+
+    def test_no_decoders_raises(self, plugins):
+        """Test an exception is raised if no decoders are available."""
+        plugins({"pylibjpeg.pixel_data_decoders": {self.uid: j2k_decoder}})
+        msg = "No pixel data decoders are available for the transfer syntax '1.2.3'"
+        with pytest.raises(ValueError, match=msg):
+            next(decode_pixel_data_many([J2K], "1.2.3"))
+
+        with pytest.raises(ValueError, match="No pixel data decoders"):
+            next(decode_pixel_data_many([J2K], self.uid, decoder="bar"))
+
+        with pytest.raises(ValueError, match="'workers' must be at least 1"):
+            next(decode_pixel_data_many([J2K], self.uid, workers=-1))
+
+        with pytest.raises(ValueError, match="'max_pending' must be at least 1"):
+            next(decode_pixel_data_many([J2K], self.uid, max_pending=-1))
+
+    def test_decode(self, plugins):
+        """Test decoding frames."""
+        received = []
+
+        def decoder(src, **kwargs):
+            received.append(kwargs)
+            return j2k_decoder(src)
+
+        plugins({"pylibjpeg.pixel_data_decoders": {self.uid: decoder}})
+        frames = [J2K + bytes([idx]) for idx in range(10)]
+        results = list(decode_pixel_data_many(frames, self.uid, workers=2, rows=2))
+        assert [r.position for r in results] == list(range(10))
+        assert results[0].arr is None
+        assert "Unable to decode the data" in str(results[0].error)
+        assert [r.arr[0, 0] for r in results[1:]] == list(range(1, 10))
+        assert received[0] == {"transfer_syntax_uid": self.uid, "rows": 2}
+
+    def test_bytearray(self, plugins):
+        """Test frames decoded to a bytearray are returned as arrays."""
+        frame = bytearray(b"\x01\x02")
+        decoder = lambda src, **kwargs: frame  # noqa: E731
+        plugins({"pylibjpeg.pixel_data_decoders": {self.uid: decoder}})
+        result = next(decode_pixel_data_many([J2K], self.uid))
+        assert result.arr.tolist() == [1, 2]
+        assert np.shares_memory(result.arr, np.frombuffer(frame, dtype="u1"))
+
+
+# A JPEG header for a 2 x 3 grayscale image, without any scan data
+JPEG = (
+    b"\xFF\xD8\xFF\xC0\x00\x0B\x08\x00\x02\x00\x03\x01\x01\x11\x00"
+    b"\xFF\xDA\x00\x08\x01\x01\x00\x00\x3F\x00"
+)
+
+
+# 2 x 3, signed 16-bit, 1 component JPEG 2000 codestream header
+J2K_SIGNED = (
+    b"\xff\x4f\xff\x51\x00\x29\x00\x00"
+    b"\x00\x00\x00\x03\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x00\x00\x03\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x8f\x01\x01"
+)
+
+
+def jpeg_decoder(src, out=None, **kwargs):
+    """A fake JPEG decoder that can decode into `out`."""
+    if out is None:
+        out = np.empty((2, 3), dtype="u1")
+
+    out[...] = src[-1]
+    return out
+
+
+jpeg_decoder.supports_out = True
+
+
+class TestDecodeStack:
+    """Tests for decode_stack()."""
+
+    def test_invalid_raises(self, plugins):
+        """Test invalid parameters raise an exception."""
+        plugins({})
+        with pytest.raises(RuntimeError, match="No JPEG decoders are available"):
+            decode_stack([J2K])
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        with pytest.raises(ValueError, match="'workers' must be at least 1"):
+            decode_stack([J2K], workers=-1)
+
+        with pytest.raises(ValueError, match="'sources' must contain at least one"):
+            decode_stack([])
+
+        out = np.empty((2, 2, 2), dtype="u1")
+        msg = "'out' and 'mmap_path' can't be used together"
+        with pytest.raises(ValueError, match=msg):
+            decode_stack([J2K] * 2, out=out, mmap_path="foo")
+
+        msg = "'out' must have an item for each of the 3 sources along its first"
+        with pytest.raises(ValueError, match=msg):
+            decode_stack([J2K] * 3, out=out)
+
+        with pytest.raises(ValueError, match="Unable to decode the data"):
+            decode_stack([J2K + b"\x01", J2K + b"\x00"])
+
+    def test_header(self, plugins):
+        """Test the output is allocated using the first image's header."""
+        calls = []
+
+        def decoder(src, out=None, **kwargs):
+            calls.append(out)
+            return jpeg_decoder(src, out)
+
+        decoder.supports_out = True
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": decoder}})
+        sources = [JPEG + bytes([idx]) for idx in range(20)]
+        arr = decode_stack(sources, workers=4)
+        assert arr.shape == (20, 2, 3)
+        assert arr.dtype == np.uint8
+        assert arr[:, 0, 0].tolist() == list(range(20))
+        # Every image is decoded directly into the output
+        assert all(out is not None for out in calls)
+
+    def test_header_mismatch(self, plugins):
+        """Test decoding the first image if it doesn't match its header."""
+
+        def decoder(src, **kwargs):
+            return np.full((2, 3, 2), src[-1], dtype="<i2")
+
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": decoder}})
+        arr = decode_stack([JPEG + b"\x01", JPEG + b"\x02"])
+        assert arr.shape == (2, 2, 3, 2)
+        assert arr.dtype == np.dtype("<i2")
+        assert arr[:, 0, 0, 0].tolist() == [1, 2]
+
+    def test_no_header(self, plugins):
+        """Test decoding the first image if its header can't be read."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        sources = [J2K + bytes([idx]) for idx in range(1, 11)]
+        arr = decode_stack(sources, workers=3)
+        assert arr.shape == (10, 2, 2)
+        assert arr[:, 1, 1].tolist() == list(range(1, 11))
+
+    def test_out(self, plugins, tmp_path):
+        """Test decoding into an existing array."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": jpeg_decoder}})
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(JPEG + b"\x07")
+        out = np.zeros((3, 2, 3), dtype="u1")
+        assert decode_stack([JPEG + b"\x05", fpath, str(fpath)], out=out) is out
+        assert out[:, 1, 2].tolist() == [5, 7, 7]
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": j2k_decoder}})
+        out = np.zeros((2, 3, 2), dtype="u1")
+        with pytest.raises(ValueError, match="but 'out' has shape"):
+            decode_stack([J2K + b"\x01"] * 2, out=out)
+
+    def test_mmap(self, plugins, tmp_path):
+        """Test decoding into a memory-mapped file."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": jpeg_decoder}})
+        fpath = tmp_path / "volume.raw"
+        sources = [JPEG + bytes([idx]) for idx in range(5)]
+        arr = decode_stack(sources, mmap_path=fpath)
+        assert isinstance(arr, np.memmap)
+        assert arr.shape == (5, 2, 3)
+        del arr
+
+        arr = np.fromfile(fpath, dtype="u1").reshape(5, 2, 3)
+        assert arr[:, 0, 0].tolist() == list(range(5))
+
+    def test_signed_mmap(self, plugins, tmp_path):
+        """Test the header gives the dtype of signed 16-bit images."""
+        calls = []
+
+        def decoder(src, **kwargs):
+            calls.append(src)
+            return np.full((2, 3), -src[-1], dtype="i2")
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": decoder}})
+        fpath = tmp_path / "volume.raw"
+        sources = [J2K_SIGNED + bytes([idx]) for idx in range(4)]
+        arr = decode_stack(sources, mmap_path=fpath)
+        assert arr.dtype == decode(sources[0]).dtype == np.int16
+        assert arr.shape == (4, 2, 3)
+        # The first image isn't decoded a second time
+        assert len(calls) == 5
+        del arr
+
+        assert os.path.getsize(fpath) == 4 * 2 * 3 * 2
+        arr = np.fromfile(fpath, dtype="i2").reshape(4, 2, 3)
+        assert arr[:, 0, 0].tolist() == [0, -1, -2, -3]
+
+    def test_libjpeg(self):
+        """Test decoding real JPEG images."""
+        Image = pytest.importorskip("PIL.Image")
+        pytest.importorskip("libjpeg")
+
+        sources = []
+        for idx in range(4):
+            arr = np.full((16, 24, 3), idx * 40, dtype="u1")
+            arr[:, :8] = 255 - idx
+            fp = BytesIO()
+            Image.fromarray(arr).save(fp, "JPEG")
+            sources.append(fp.getvalue())
+
+        arr = decode_stack(sources, decoder="libjpeg")
+        assert arr.shape == (4, 16, 24, 3)
+        expected = np.stack([decode(x, decoder="libjpeg") for x in sources])
+        assert np.array_equal(arr, expected)
+
+
+def j2k_encoder(arr, **kwargs):
+    """A fake JPEG 2000 encoder."""
+    if arr[0, 0] == 0:
+        raise ValueError("Bad frame")
+
+    return J2K + arr.tobytes()
+
+
+class TestEncodeMany:
+    """Tests for encode_many()."""
+
+    def test_no_encoders_raises(self, plugins):
+        """Test an exception is raised if no encoders are available."""
+        plugins({})
+        msg = r"No JPEG 2000 encoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            next(encode_many(np.ones((1, 2, 2)), encoder_type="JPEG 2000"))
+
+    def test_encode(self, plugins):
+        """Test encoding the frames of a multi-frame array."""
+        plugins({"pylibjpeg.jpeg_2000_encoders": {"foo": j2k_encoder}})
+        arr = np.arange(1, 21, dtype="u1").reshape(5, 2, 2)
+        results = list(encode_many(arr, encoder_type="JPEG 2000", workers=2))
+        assert [r.position for r in results] == list(range(5))
+        for frame, result in zip(arr, results):
+            assert isinstance(result, EncodeResult)
+            assert result.error is None
+            assert result.data == J2K + frame.tobytes()
+            assert result.nbytes == 8
+            assert result.elapsed >= 0
+
+    def test_unordered(self, plugins):
+        """Test encoding with unordered results."""
+        plugins({"pylibjpeg.jpeg_2000_encoders": {"foo": j2k_encoder}})
+        frames = [np.full((2, 2), ii, dtype="u1") for ii in range(1, 30)]
+        results = list(encode_many(frames, encoder="foo", ordered=False))
+        assert sorted(r.position for r in results) == list(range(29))
+        for result in results:
+            assert result.data[4] == result.position + 1
+
+    def test_errors(self, plugins):
+        """Test failures are returned per frame."""
+        plugins({"pylibjpeg.jpeg_2000_encoders": {"foo": j2k_encoder}})
+        arr = np.asarray([[[1]], [[0]], [[2]]], dtype="u1")
+        results = list(encode_many(arr))
+        assert results[0].data == J2K + b"\x01"
+        assert results[1].data is None
+        assert results[1].nbytes == 0
+        assert isinstance(results[1].error, ValueError)
+        assert results[2].data == J2K + b"\x02"
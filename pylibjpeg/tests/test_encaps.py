@@ -0,0 +1,277 @@
+"""Tests for the frames in encapsulated pixel data."""
+
+from io import BytesIO
+from struct import pack, unpack
+
+import numpy as np
+import pytest
+
+from pylibjpeg.batch import decode_pixel_data_many
+from pylibjpeg.encaps import EncapsulatedFrames, encapsulate_frames
+
+
+SEQUENCE_DELIMITER = b"\xFE\xFF\xDD\xE0\x00\x00\x00\x00"
+
+
+def item(value):
+    """Return an item containing `value`."""
+    return b"\xFE\xFF\x00\xE0" + pack("<L", len(value)) + value
+
+
+def encapsulate(fragments, offsets=()):
+    """Return encapsulated pixel data with a Basic Offset Table."""
+    bot = pack(f"<{len(offsets)}L", *offsets)
+    return item(bot) + b"".join(item(x) for x in fragments) + SEQUENCE_DELIMITER
+
+
+def frame(value, length=6):
+    """Return a fake JPEG frame."""
+    return b"\xFF\xD8" + bytes([value]) * (length - 4) + b"\xFF\xD9"
+
+
+class TestEncapsulatedFrames:
+    """Tests for EncapsulatedFrames."""
+
+    def test_fragment_per_frame(self):
+        """Test one fragment per frame without an offset table."""
+        data = encapsulate([frame(1), frame(2), frame(3)])
+        frames = EncapsulatedFrames(data)
+        assert len(frames) == 3
+        assert frames.nr_fragments == 3
+        assert frames.basic_offsets == []
+        assert [bytes(x) for x in frames] == [frame(1), frame(2), frame(3)]
+        assert bytes(frames[-1]) == frame(3)
+
+        # Frames are views of the pixel data
+        assert frames[1].obj is data
+        assert len(EncapsulatedFrames(data, number_of_frames=3)) == 3
+
+        with pytest.raises(IndexError, match="Frame index 3 is out of range"):
+            frames[3]
+
+        with pytest.raises(IndexError, match="Frame index -4 is out of range"):
+            frames[-4]
+
+    def test_basic_offsets(self):
+        """Test frames spread over fragments using the Basic Offset Table."""
+        fragments = [frame(1)[:2], frame(1)[2:], frame(2), b"\x00\x01", b"\x02\x03"]
+        data = encapsulate(fragments, [0, 22, 36])
+        frames = EncapsulatedFrames(data, number_of_frames=3)
+        assert frames.basic_offsets == [0, 22, 36]
+        assert frames.nr_fragments == 5
+        assert bytes(frames[0]) == frame(1)
+        assert frames[1].obj is data
+        assert bytes(frames[1]) == frame(2)
+        assert bytes(frames[2]) == b"\x00\x01\x02\x03"
+
+        msg = "The Basic Offset Table offset 20 doesn't match the start"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(encapsulate(fragments, [0, 20]))
+
+    def test_single_frame(self):
+        """Test all the fragments are one frame if there's only one."""
+        data = encapsulate([b"\x00\x01", b"\x02\x03", b"\x04\x05"])
+        frames = EncapsulatedFrames(data, number_of_frames=1)
+        assert [bytes(x) for x in frames] == [b"\x00\x01\x02\x03\x04\x05"]
+
+    def test_scan_markers(self):
+        """Test finding the frames by scanning for the end markers."""
+        j2k = b"\xFF\x4F\xFF\x51\x00\xFF\xD9\x00"
+        fragments = [frame(1)[:2], frame(1)[2:], j2k[:4], j2k[4:], frame(3)]
+        data = encapsulate(fragments)
+        frames = EncapsulatedFrames(data)
+        assert len(frames) == 3
+        assert [bytes(x) for x in frames] == [frame(1), j2k, frame(3)]
+        assert len(EncapsulatedFrames(data, number_of_frames=3)) == 3
+
+        msg = "Found 3 frames in the Pixel Data but 'number_of_frames' is 2"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(data, number_of_frames=2)
+
+        msg = "The last fragments of the Pixel Data don't end with an EOI or EOC"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(encapsulate(fragments[:-1] + [b"\x00\x01"]))
+
+    def test_no_markers(self):
+        """Test fragments without end markers are one frame each."""
+        data = encapsulate([b"\x00\x01", b"\x02\x03"])
+        frames = EncapsulatedFrames(data)
+        assert [bytes(x) for x in frames] == [b"\x00\x01", b"\x02\x03"]
+
+    def test_extended_offsets(self):
+        """Test using the Extended Offset Table."""
+        data = encapsulate([frame(1, 8), frame(2), frame(3, 10)])
+        offsets = [0, 16, 30]
+        frames = EncapsulatedFrames(data, extended_offsets=offsets)
+        assert len(frames) == 3
+        assert frames._fragments is None
+        assert bytes(frames[2]) == frame(3, 10)
+        assert frames._fragments is None
+        assert frames[0].obj is data
+
+        encoded = pack("<3Q", *offsets)
+        lengths = pack("<3Q", 7, 6, 10)
+        frames = EncapsulatedFrames(
+            data, 3, extended_offsets=encoded, extended_lengths=lengths
+        )
+        assert [bytes(x) for x in frames] == [frame(1, 8)[:7], frame(2), frame(3, 10)]
+
+        frames = EncapsulatedFrames(
+            data, extended_offsets=offsets, extended_lengths=[7, 6, 11]
+        )
+        msg = "The length of frame 2 in the Extended Offset Table Lengths is larger"
+        with pytest.raises(ValueError, match=msg):
+            frames[2]
+
+        msg = "Expected the item tag for the frame 1 at offset 20"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(data, extended_offsets=[0, 12])[1]
+
+        msg = "have different numbers of values"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(data, extended_offsets=offsets, extended_lengths=[1])
+
+        msg = "The length of an Extended Offset Table must be a multiple of 8"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(data, extended_offsets=b"\x00" * 12)
+
+    def test_invalid_raises(self):
+        """Test invalid pixel data raises an exception."""
+        msg = "'number_of_frames' must be at least 1"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(encapsulate([frame(1)]), number_of_frames=0)
+
+        msg = "The item tag for the Basic Offset Table is missing"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(b"\xFE\xFF\x00\xE0")
+
+        msg = r"Expected the item tag for the Basic Offset Table at offset 0 but "
+        msg += r"found \(7FE0,0010\)"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(b"\xE0\x7F\x10\x00\x00\x00\x00\x00")
+
+        msg = "The length of the Basic Offset Table, 2, isn't a multiple of 4"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(item(b"\x00\x00"))
+
+        msg = "The Pixel Data contains no fragments"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(item(b"") + SEQUENCE_DELIMITER)
+
+        msg = "The item for the fragment 1 at offset 22 extends past the end"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(encapsulate([frame(1)])[:-8] + item(b"\x00\x00")[:-1])
+
+        msg = "The item for the fragment 0 has an undefined length"
+        with pytest.raises(ValueError, match=msg):
+            EncapsulatedFrames(item(b"") + b"\xFE\xFF\x00\xE0\xFF\xFF\xFF\xFF")
+
+    def test_decode_pixel_data_many(self, plugins):
+        """Test the frames can be decoded as a batch."""
+        uid = "1.2.840.10008.1.2.4.50"
+
+        def decoder(src, **kwargs):
+            return np.full((2, 2), src[2], dtype="u1")
+
+        plugins({"pylibjpeg.pixel_data_decoders": {uid: decoder}})
+        data = encapsulate([frame(idx) for idx in range(1, 6)])
+        results = list(decode_pixel_data_many(EncapsulatedFrames(data), uid))
+        assert [r.position for r in results] == [0, 1, 2, 3, 4]
+        assert [r.arr[0, 0] for r in results] == [1, 2, 3, 4, 5]
+
+
+class TestEncapsulateFrames:
+    """Tests for encapsulate_frames()."""
+
+    uid = "1.2.840.10008.1.2.4.50"
+
+    @staticmethod
+    def encoder(src, **kwargs):
+        """A fake encoder that wraps `src` in SOI and EOI markers."""
+        if src[:1] == b"\x00":
+            raise ValueError("Bad data")
+
+        return b"\xFF\xD8" + src + b"\xFF\xD9"
+
+    def test_no_encoders_raises(self, plugins):
+        """Test an exception is raised if no encoders are available."""
+        plugins({"pylibjpeg.pixel_data_encoders": {self.uid: self.encoder}})
+        msg = "No pixel data encoders are available for the transfer syntax '1.2.3'"
+        with pytest.raises(ValueError, match=msg):
+            encapsulate_frames([b"\x01"], "1.2.3", BytesIO())
+
+        with pytest.raises(ValueError, match="No pixel data encoders"):
+            encapsulate_frames([b"\x01"], self.uid, BytesIO(), encoder="bar")
+
+        with pytest.raises(ValueError, match="'workers' must be at least 1"):
+            encapsulate_frames([b"\x01"], self.uid, BytesIO(), workers=-1)
+
+        with pytest.raises(ValueError, match="'max_pending' must be at least 1"):
+            encapsulate_frames([b"\x01"], self.uid, BytesIO(), max_pending=-1)
+
+    def test_extended(self, plugins):
+        """Test writing frames with the Extended Offset Table."""
+        received = []
+
+        def encoder(src, **kwargs):
+            received.append(kwargs)
+            return self.encoder(src)
+
+        plugins({"pylibjpeg.pixel_data_encoders": {self.uid: encoder}})
+        arr = np.arange(1, 25, dtype="u1").reshape(4, 3, 2)
+        fp = BytesIO()
+        tables = encapsulate_frames(
+            (x for x in arr), self.uid, fp, workers=2, max_pending=1, rows=3
+        )
+        data = fp.getvalue()
+        assert tables.nbytes == len(data) == 8 + 4 * (8 + 10) + 8
+        assert tables.basic_offsets == [0, 18, 36, 54]
+        assert unpack("<4Q", tables.extended_offsets) == (0, 18, 36, 54)
+        assert unpack("<4Q", tables.extended_lengths) == (10, 10, 10, 10)
+        assert received[0] == {
+            "transfer_syntax_uid": self.uid,
+            "number_of_frames": 1,
+            "rows": 3,
+        }
+
+        frames = EncapsulatedFrames(
+            data,
+            4,
+            extended_offsets=tables.extended_offsets,
+            extended_lengths=tables.extended_lengths,
+        )
+        assert frames.basic_offsets == []
+        for frame, expected in zip(frames, arr):
+            assert bytes(frame) == self.encoder(expected.tobytes())
+
+    def test_basic(self, plugins):
+        """Test writing frames with the Basic Offset Table and padding."""
+        plugins({"pylibjpeg.pixel_data_encoders": {self.uid: self.encoder}})
+        fp = BytesIO(b"\x00\x00")
+        fp.seek(2)
+        sources = [b"\x01", b"\x02\x03", np.array([4, 5, 6], dtype="u1")]
+        tables = encapsulate_frames(sources, self.uid, fp, basic_offsets=True)
+        data = fp.getvalue()[2:]
+        assert tables.nbytes == len(data)
+        assert tables.basic_offsets == [0, 14, 28]
+        assert unpack("<3Q", tables.extended_lengths) == (5, 6, 7)
+
+        frames = EncapsulatedFrames(data)
+        assert frames.basic_offsets == [0, 14, 28]
+        assert frames.nr_fragments == 3
+        assert bytes(frames[0]) == b"\xFF\xD8\x01\xFF\xD9\x00"
+        assert bytes(frames[2]) == b"\xFF\xD8\x04\x05\x06\xFF\xD9\x00"
+
+        msg = "Writing the Basic Offset Table requires 'frames' to have a length"
+        with pytest.raises(ValueError, match=msg):
+            encapsulate_frames(iter(sources), self.uid, fp, basic_offsets=True)
+
+    def test_encoding_fails_raises(self, plugins):
+        """Test an exception is raised if a frame can't be encoded."""
+        plugins({"pylibjpeg.pixel_data_encoders": {self.uid: self.encoder}})
+        msg = "Unable to encode the frame with the available plugins"
+        with pytest.raises(ValueError, match=msg) as exc:
+            encapsulate_frames([b"\x01", b"\x00"], self.uid, BytesIO())
+
+        assert isinstance(exc.value.__cause__, ValueError)
+        assert str(exc.value.__cause__) == "Bad data"
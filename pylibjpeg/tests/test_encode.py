@@ -1,7 +1,11 @@
 """Tests for standalone encoding."""
 
+import logging
+
+import numpy as np
 import pytest
 
+from pylibjpeg import encode
 from pylibjpeg.utils import get_encoders, _encode, get_pixel_data_encoders
 
 
@@ -45,3 +49,92 @@ class TestEncoders:
         for encoder in encoders:
             for plugin in encoders[encoder]:
                 assert callable(encoders[encoder][plugin])
+
+
+def j2k_encoder(arr, **kwargs):
+    """A fake JPEG 2000 encoder."""
+    if arr.dtype != "u1":
+        raise ValueError("Unsupported dtype")
+
+    return b"\xff\x4f\xff\x51" + arr.tobytes()
+
+
+def jls_encoder(arr, **kwargs):
+    """A fake JPEG-LS encoder."""
+    return b"\xff\xd8\xff\xf7" + arr.tobytes()
+
+
+def failing_encoder(arr, **kwargs):
+    """A fake encoder that always fails."""
+    raise NotImplementedError("Not supported")
+
+
+class TestEncode:
+    """Tests for encode()"""
+
+    def test_no_encoders_raises(self, plugins):
+        """Test exceptions are raised if no encoders are available."""
+        plugins({"pylibjpeg.jpeg_ls_encoders": {"bar": jls_encoder}})
+        msg = r"No JPEG 2000 encoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            encode(np.zeros(1), encoder_type="JPEG 2000")
+
+        plugins({})
+        with pytest.raises(RuntimeError, match=r"No encoders are available"):
+            encode(np.zeros(1))
+
+    def test_unknown_raises(self, plugins):
+        """Test exceptions are raised for unknown types and plugins."""
+        plugins({"pylibjpeg.jpeg_2000_encoders": {"foo": j2k_encoder}})
+        with pytest.raises(ValueError, match=r"Unknown encoder type 'JPEG 3000'"):
+            encode(np.zeros(1), encoder_type="JPEG 3000")
+
+        msg = r"The 'bar' encoder is not available"
+        with pytest.raises(ValueError, match=msg):
+            encode(np.zeros(1), encoder="bar")
+
+        with pytest.raises(ValueError, match=msg):
+            encode(np.zeros(1), encoder="bar", encoder_type="JPEG 2000")
+
+    def test_encoder_type(self, plugins):
+        """Test encoding only uses the encoders for the format."""
+        plugins(
+            {
+                "pylibjpeg.jpeg_2000_encoders": {"foo": j2k_encoder},
+                "pylibjpeg.jpeg_ls_encoders": {"bar": jls_encoder},
+            }
+        )
+        arr = np.ones(2, dtype="u1")
+        assert encode(arr, encoder_type="JPEG-LS") == b"\xff\xd8\xff\xf7\x01\x01"
+        assert encode(arr, encoder_type="JPEG 2000") == b"\xff\x4f\xff\x51\x01\x01"
+        assert encode(arr, encoder="bar") == b"\xff\xd8\xff\xf7\x01\x01"
+
+        # A single encoder's exceptions are raised as-is
+        with pytest.raises(ValueError, match="Unsupported dtype"):
+            encode(arr.astype("u2"), encoder_type="JPEG 2000")
+
+        with pytest.raises(ValueError, match="Unsupported dtype"):
+            encode(arr.astype("u2"), encoder="foo")
+
+    def test_fallback(self, plugins, caplog):
+        """Test encoding with multiple encoders."""
+        plugins(
+            {
+                "pylibjpeg.jpeg_2000_encoders": {
+                    "baz": failing_encoder,
+                    "foo": j2k_encoder,
+                },
+            }
+        )
+        arr = np.ones(2, dtype="u1")
+        with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+            assert encode(arr) == b"\xff\x4f\xff\x51\x01\x01"
+
+        assert "Encoding with the baz plugin failed: Not supported" in caplog.text
+        assert "Traceback" not in caplog.text
+
+        msg = r"Unable to encode the data with the available plugins"
+        with pytest.raises(ValueError, match=msg) as exc:
+            encode(arr.astype("u2"), encoder_type="JPEG 2000")
+
+        assert isinstance(exc.value.__cause__, ValueError)
@@ -0,0 +1,233 @@
+"""Tests for reading image information from headers."""
+
+from io import BytesIO
+from struct import pack
+
+import pytest
+
+from pylibjpeg import image_info
+from pylibjpeg.info import ImageInfo
+
+
+SOI = b"\xFF\xD8"
+APP0 = b"\xFF\xE0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+# Huffman and quantisation table segments with dummy contents
+DQT = b"\xFF\xDB\x00\x04\x00\x00"
+DHT = b"\xFF\xC4\x00\x04\x00\x00"
+
+
+def sof(marker, precision, rows, columns, components):
+    """Return an SOFn segment."""
+    specs = b"".join(bytes([ii + 1, 0x11, 0x00]) for ii in range(components))
+    length = 8 + len(specs)
+    return (
+        pack(">BBHBHHB", 0xFF, marker, length, precision, rows, columns, components)
+        + specs
+    )
+
+
+def siz(rows, columns, precisions, rsiz=0, offset=(0, 0), signed=False):
+    """Return a JPEG 2000 codestream up to the end of the SIZ segment."""
+    sign = 0x80 if signed else 0x00
+    components = b"".join(bytes([(p - 1) | sign, 1, 1]) for p in precisions)
+    segment = pack(
+        ">HHIIIIIIIIH",
+        38 + len(components),
+        rsiz,
+        columns + offset[1],
+        rows + offset[0],
+        offset[1],
+        offset[0],
+        columns + offset[1],
+        rows + offset[0],
+        0,
+        0,
+        len(precisions),
+    )
+    return b"\xFF\x4F\xFF\x51" + segment + components
+
+
+class TestImageInfo10918:
+    """Tests for image_info() with 10918 JPEG and JPEG-LS data."""
+
+    def test_baseline(self):
+        """Test a baseline JPEG header."""
+        data = SOI + APP0 + DQT + DHT + sof(0xC0, 8, 480, 640, 3) + b"\xFF\xDA"
+        info = image_info(data)
+        assert isinstance(info, ImageInfo)
+        assert info == ("JPEG", 480, 640, 3, 8, "SOF0", 921600, False)
+        assert info.dtype == "u1"
+
+    def test_processes(self):
+        """Test the process is taken from the SOFn marker."""
+        for marker, process, precision, nbytes in (
+            (0xC1, "SOF1", 12, 2000),
+            (0xC2, "SOF2", 8, 1000),
+            (0xC3, "SOF3", 16, 2000),
+            (0xCB, "SOF11", 8, 1000),
+        ):
+            data = SOI + sof(marker, precision, 10, 100, 1)
+            info = image_info(data)
+            assert info.process == process
+            assert info.precision == precision
+            assert info.nbytes == nbytes
+
+    def test_jpeg_ls(self):
+        """Test a JPEG-LS header."""
+        data = SOI + sof(0xF7, 12, 20, 30, 1) + b"\xFF\xDA"
+        assert image_info(data) == ("JPEG-LS", 20, 30, 1, 12, "SOF55", 1200, False)
+
+    def test_jpeg_xt(self):
+        """Test a JPEG XT header."""
+        app11 = b"\xFF\xEB\x00\x06JP\x00\x00"
+        data = SOI + app11 + sof(0xC1, 8, 2, 3, 3)
+        assert image_info(data) == ("JPEG XT", 2, 3, 3, 8, "SOF1", 18, False)
+
+    def test_hierarchical(self):
+        """Test the dimensions are taken from the DHP segment."""
+        dhp = sof(0xDE, 8, 64, 48, 1)
+        data = SOI + dhp + sof(0xC5, 8, 16, 12, 1)
+        assert image_info(data) == ("JPEG", 64, 48, 1, 8, "SOF5", 3072, False)
+
+    def test_fill_bytes(self):
+        """Test fill bytes before markers are skipped."""
+        data = SOI + b"\xFF\xFF" + APP0 + b"\xFF" + sof(0xC0, 8, 1, 2, 1)
+        assert image_info(data).columns == 2
+
+    def test_stops_at_sof(self):
+        """Test only the header is read."""
+        data = SOI + APP0 + sof(0xC0, 8, 1, 2, 1)
+        # Corrupt data after the SOF segment isn't an issue
+        assert image_info(data + b"\x00" * 100).rows == 1
+
+    def test_missing_sof_raises(self):
+        """Test exceptions are raised if no SOF marker is found."""
+        msg = "No SOFn marker found before the first scan"
+        with pytest.raises(ValueError, match=msg):
+            image_info(SOI + APP0 + b"\xFF\xDA\x00\x02")
+
+        msg = "No SOFn marker found in the JPEG data"
+        with pytest.raises(ValueError, match=msg):
+            image_info(SOI + APP0 + b"\xFF\xD9")
+
+        with pytest.raises(ValueError, match=msg):
+            image_info(SOI + APP0)
+
+        msg = "Unexpected end of data when reading 6 bytes at offset 24"
+        with pytest.raises(ValueError, match=msg):
+            image_info(SOI + APP0 + sof(0xC0, 8, 1, 2, 1)[:6])
+
+        msg = "Expected a marker at offset 20, found 0x0000"
+        with pytest.raises(ValueError, match=msg):
+            image_info(SOI + APP0 + b"\x00\x00" + sof(0xC0, 8, 1, 2, 1))
+
+
+class TestImageInfo15444:
+    """Tests for image_info() with JPEG 2000 data."""
+
+    def test_codestream(self):
+        """Test a JPEG 2000 codestream."""
+        data = siz(100, 200, [12])
+        assert image_info(data) == ("JPEG 2000", 100, 200, 1, 12, "J2K", 40000, False)
+
+    def test_image_offset(self):
+        """Test the image dimensions exclude the image offset."""
+        data = siz(100, 200, [8, 8, 8], offset=(5, 7))
+        assert image_info(data) == ("JPEG 2000", 100, 200, 3, 8, "J2K", 60000, False)
+
+    def test_htj2k(self):
+        """Test an HTJ2K codestream."""
+        data = siz(10, 10, [8, 16], rsiz=0x4000)
+        assert image_info(data) == ("JPEG 2000", 10, 10, 2, 16, "HTJ2K", 400, False)
+
+    def test_signed(self):
+        """Test the signedness is taken from Ssiz."""
+        info = image_info(siz(10, 10, [16], signed=True))
+        assert info == ("JPEG 2000", 10, 10, 1, 16, "J2K", 200, True)
+        assert info.dtype == "i2"
+
+        info = image_info(siz(10, 10, [24], signed=True))
+        assert info.nbytes == 400
+        assert info.dtype == "i4"
+
+        info = image_info(siz(10, 10, [24]))
+        assert not info.signed
+        assert info.dtype == "u4"
+
+    def test_jp2(self):
+        """Test a JP2 file."""
+        signature = b"\x00\x00\x00\x0C\x6A\x50\x20\x20\x0D\x0A\x87\x0A"
+        ftyp = b"\x00\x00\x00\x14ftypjp2 \x00\x00\x00\x00jp2 "
+        # Box with an extended length
+        xml = b"\x00\x00\x00\x01xml " + pack(">Q", 20) + b"<a/>"
+        jp2c = b"\x00\x00\x00\x00jp2c" + siz(3, 4, [8])
+        data = signature + ftyp + xml + jp2c
+        assert image_info(data) == ("JPEG 2000", 3, 4, 1, 8, "J2K", 12, False)
+
+    def test_jp2_missing_codestream_raises(self):
+        """Test an exception is raised if there's no codestream box."""
+        signature = b"\x00\x00\x00\x0C\x6A\x50\x20\x20\x0D\x0A\x87\x0A"
+        msg = "No contiguous codestream box found in the JP2 data"
+        with pytest.raises(ValueError, match=msg):
+            image_info(signature)
+
+        msg = "Invalid box length 4 at offset 12"
+        with pytest.raises(ValueError, match=msg):
+            image_info(signature + b"\x00\x00\x00\x04xml ")
+
+
+class TestImageInfo:
+    """Tests for image_info()."""
+
+    def test_sources(self, tmp_path):
+        """Test reading from paths, file-likes and buffers."""
+        data = SOI + APP0 + sof(0xC0, 8, 480, 640, 3)
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(data)
+        assert image_info(fpath).rows == 480
+        assert image_info(str(fpath)).rows == 480
+        assert image_info(bytearray(data)).rows == 480
+        assert image_info(memoryview(b"\x00" + data)[1:]).rows == 480
+
+        b = BytesIO(b"\x00" + data)
+        b.seek(1)
+        assert image_info(b).rows == 480
+        assert b.tell() == 1
+
+    def test_unknown_format_raises(self):
+        """Test an exception is raised for an unknown format."""
+        msg = "Unable to identify the format of the encoded data"
+        with pytest.raises(ValueError, match=msg):
+            image_info(b"\x00\x01\x02\x03" * 4)
+
+    def test_plugin(self, plugins):
+        """Test using a plugin's information reader."""
+        received = []
+
+        def reader(src, **kwargs):
+            received.append(kwargs)
+            assert src.read(2) == b"\xFF\x0A"
+            return ImageInfo("JPEG XL", 1, 2, 3, 8, "", 6)
+
+        plugins({"pylibjpeg.jpeg_xl_info_readers": {"foo": reader}})
+        b = BytesIO(b"\x00\xFF\x0A\x00")
+        b.seek(1)
+        assert image_info(b, bar=1) == ("JPEG XL", 1, 2, 3, 8, "", 6, False)
+        assert received == [{"bar": 1}]
+
+        assert image_info(b"\xFF\x0A\x00").columns == 2
+
+    def test_no_plugin_raises(self, plugins):
+        """Test exceptions are raised if no plugin can read the format."""
+        plugins({})
+        msg = "No information readers are available for JPEG XL"
+        with pytest.raises(ValueError, match=msg):
+            image_info(b"\xFF\x0A\x00")
+
+        def reader(src, **kwargs):
+            raise NotImplementedError
+
+        plugins({"pylibjpeg.jpeg_xl_info_readers": {"foo": reader}})
+        msg = "Unable to read the image information with the available plugins"
+        with pytest.raises(ValueError, match=msg):
+            image_info(b"\xFF\x0A\x00")
@@ -0,0 +1,173 @@
+"""Tests for lazily decoded images."""
+
+from io import BytesIO
+import logging
+from struct import pack
+
+import numpy as np
+import pytest
+
+import pylibjpeg
+from pylibjpeg import LazyImage, decode, open as open_image
+
+
+# 2 x 3, 8-bit, 1 component 10918 JPEG header
+JPEG = (
+    b"\xFF\xD8\xFF\xC0\x00\x0B\x08\x00\x02\x00\x03\x01\x01\x11\x00"
+    b"\xFF\xDA\x00\x08\x01\x01\x00\x00\x3F\x00"
+)
+
+# The same with 12-bit precision, 3 components and a DNL marker
+JPEG_DNL = (
+    b"\xFF\xD8\xFF\xC0\x00\x11\x0C\x00\x00\x00\x03\x03"
+    b"\x01\x11\x00\x02\x11\x00\x03\x11\x00"
+    b"\xFF\xDA\x00\x08\x01\x01\x00\x00\x3F\x00"
+)
+
+
+def j2k(precision, signed):
+    """Return a 2 x 3, 1 component JPEG 2000 codestream header."""
+    ssiz = (precision - 1) | (0x80 if signed else 0x00)
+    siz = pack(">HHIIIIIIIIH", 41, 0, 3, 2, 0, 0, 3, 2, 0, 0, 1)
+    return b"\xFF\x4F\xFF\x51" + siz + bytes([ssiz, 1, 1])
+
+
+class Decoder:
+    """A fake JPEG decoder that records the number of calls."""
+
+    def __init__(self, shape=(2, 3), dtype="u1"):
+        self.shape = shape
+        self.dtype = dtype
+        self.calls = []
+
+    def __call__(self, src, **kwargs):
+        self.calls.append(kwargs)
+        return np.full(self.shape, src[-1], dtype=self.dtype)
+
+
+@pytest.fixture
+def decoder(plugins):
+    """Return a registered fake JPEG decoder."""
+    func = Decoder()
+    plugins({"pylibjpeg.jpeg_decoders": {"foo": func}})
+    return func
+
+
+class TestLazyImage:
+    """Tests for LazyImage and open()."""
+
+    def test_header(self, decoder):
+        """Test the shape and dtype are read without decoding."""
+        im = open_image(JPEG + b"\x05")
+        assert isinstance(im, LazyImage)
+        assert pylibjpeg.open is open_image
+        assert im.shape == (2, 3)
+        assert im.dtype == "u1"
+        assert im.nbytes == 6
+        assert im.ndim == 2
+        assert len(im) == 2
+        assert im.info.process == "SOF0"
+        assert not im.is_decoded
+        assert repr(im) == "<LazyImage shape=(2, 3) dtype=uint8 encoded>"
+        assert decoder.calls == []
+
+    @pytest.mark.parametrize(
+        "precision, signed, dtype, nbytes",
+        [(16, True, "i2", 12), (12, True, "i2", 12), (24, False, "u4", 24)],
+    )
+    def test_header_dtype(self, plugins, precision, signed, dtype, nbytes):
+        """Test the dtype and nbytes of signed and > 16-bit JPEG 2000."""
+        decoder = Decoder(dtype=dtype)
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": decoder}})
+        data = j2k(precision, signed) + b"\x01"
+        im = open_image(data)
+        assert im.dtype == dtype
+        assert im.nbytes == nbytes == im.info.nbytes
+        assert decoder.calls == []
+        assert im.dtype == decode(data).dtype
+        assert np.asarray(im).dtype == dtype
+
+    def test_decode(self, decoder):
+        """Test the image is decoded on first access and kept."""
+        im = open_image(JPEG + b"\x05", decoder="foo", bar=1)
+        arr = np.asarray(im)
+        assert arr.tolist() == [[5, 5, 5], [5, 5, 5]]
+        assert im.is_decoded
+        assert "decoded>" in repr(im)
+        assert im[1, 2] == 5
+        assert im[:, :2].shape == (2, 2)
+        assert np.asarray(im) is arr
+        assert decoder.calls == [{"bar": 1}]
+
+        assert np.array(im, copy=True) is not arr
+        assert np.asarray(im, dtype="u2").dtype == "u2"
+        assert np.asarray(im, dtype="u1", copy=False) is arr
+        msg = "Unable to return the image as 'uint16' without a copy"
+        with pytest.raises(ValueError, match=msg):
+            np.asarray(im, dtype="u2", copy=False)
+
+        im.release()
+        assert not im.is_decoded
+        assert im[0, 0] == 5
+        assert len(decoder.calls) == 2
+
+    def test_release_policy(self, decoder):
+        """Test the pixels aren't kept with the release policy."""
+        im = open_image(JPEG + b"\x05", policy="release")
+        assert im[0, 0] == 5
+        assert not im.is_decoded
+        assert np.asarray(im).shape == (2, 3)
+        assert len(decoder.calls) == 2
+
+        msg = "Invalid 'policy' value 'foo', must be one of keep, release"
+        with pytest.raises(ValueError, match=msg):
+            open_image(JPEG, policy="foo")
+
+    def test_sources(self, decoder, tmp_path):
+        """Test opening paths and file-likes."""
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(JPEG + b"\x07")
+        im = open_image(fpath, use_mmap=True)
+        assert im.shape == (2, 3)
+        assert im[0, 0] == 7
+        assert open_image(str(fpath))[0, 0] == 7
+
+        fp = BytesIO(b"\x00\x00" + JPEG + b"\x09")
+        fp.seek(2)
+        im = open_image(fp)
+        assert fp.tell() == 2
+        assert im.shape == (2, 3)
+        fp.seek(0)
+        assert im[0, 0] == 9
+
+        with pytest.raises(FileNotFoundError):
+            open_image(tmp_path / "missing.jpg")
+
+    def test_no_header(self, plugins, caplog):
+        """Test the image is decoded if the header can't be used."""
+        decoder = Decoder(shape=(4, 3, 3), dtype="u2")
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": decoder}})
+        caplog.set_level(logging.DEBUG, logger="pylibjpeg")
+
+        im = open_image(JPEG_DNL + b"\x01")
+        assert im.info.rows == 0
+        assert "set by a DNL marker" in caplog.text
+        assert decoder.calls == []
+        assert im.shape == (4, 3, 3)
+        assert im.dtype == "u2"
+        assert len(decoder.calls) == 1
+
+        im = open_image(b"\x00\x01\x02")
+        assert im.info is None
+        assert "Unable to read the header of the image" in caplog.text
+        assert im.nbytes == 72
+
+    def test_header_mismatch(self, plugins, caplog):
+        """Test the shape of the decoded image is used if it differs."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": Decoder(shape=(2, 4))}})
+        caplog.set_level(logging.DEBUG, logger="pylibjpeg")
+        im = open_image(JPEG + b"\x01")
+        assert im.shape == (2, 3)
+        assert np.asarray(im).shape == (2, 4)
+        assert im.shape == (2, 4)
+        assert "has shape (2, 4) but the header gives (2, 3)" in caplog.text
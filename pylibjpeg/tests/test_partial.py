@@ -0,0 +1,413 @@
+"""Tests for decoding parts of JPEG images."""
+
+from io import BytesIO
+import logging
+from struct import pack
+import threading
+
+import numpy as np
+import pytest
+
+from pylibjpeg import decode
+from pylibjpeg.partial import (
+    decode_frames,
+    decode_region,
+    decode_scans,
+    decode_strips,
+)
+from pylibjpeg.tools.s10918 import JPEG, parse_buffer
+
+
+def restarts(rows=32, columns=32, interval=4):
+    """Return a single component JPEG with restart intervals of `interval`
+    MCUs.
+    """
+    nr_intervals = -(-(-(-rows // 8) * -(-columns // 8)) // interval)
+    sof = pack(">HHBHHB", 0xFFC0, 11, 8, rows, columns, 1) + b"\x01\x11\x00"
+    sos = pack(">HHB", 0xFFDA, 8, 1) + b"\x01\x00\x00\x3F\x00"
+    data = bytearray(b"\xFF\xD8" + pack(">HHH", 0xFFDD, 4, interval) + sof + sos)
+    for ii in range(nr_intervals):
+        if ii:
+            data.extend(pack(">BB", 0xFF, 0xD0 + (ii - 1) % 8))
+
+        data.append(ii + 1)
+
+    return bytes(data + b"\xFF\xD9")
+
+
+def decoder(src, **kwargs):
+    """A fake JPEG decoder that fills the samples of each restart interval
+    with the interval's first byte.
+    """
+    jpg = JPEG(parse_buffer(src))
+    frame = jpg.frame
+    scan = jpg.get_segments("SOS")[0]
+    values = [v[0] for k, v in scan.info.items() if k[0] == "ENC"]
+    interval = jpg.restart_interval or frame.nr_mcus
+    mcus = np.repeat(np.asarray(values, dtype="u1"), interval)
+    mcus = mcus[: frame.nr_mcus].reshape(frame.mcu_rows, frame.mcus_per_line)
+    arr = np.repeat(np.repeat(mcus, 8, axis=0), 8, axis=1)
+
+    return np.ascontiguousarray(arr[: jpg.rows, : jpg.columns])
+
+
+def hierarchical():
+    """Return a hierarchical JPEG with frames of 8 x 8, 16 x 16 and 32 x 32."""
+    sos = pack(">HHB", 0xFFDA, 8, 1) + b"\x01\x00\x00\x3F\x00"
+    data = bytearray(b"\xFF\xD8")
+    data.extend(pack(">HHBHHB", 0xFFDE, 11, 8, 32, 32, 1) + b"\x01\x11\x00")
+    for ii, marker in enumerate((0xFFC1, 0xFFC5, 0xFFC5)):
+        if ii:
+            data.extend(pack(">HHB", 0xFFDF, 3, 0x11))
+
+        size = 8 << ii
+        data.extend(pack(">HHBHHB", marker, 11, 8, size, size, 1) + b"\x01\x11\x00")
+        data.extend(sos + b"\x01")
+
+    return bytes(data + b"\xFF\xD9")
+
+
+def count_frames(src, **kwargs):
+    """A fake JPEG decoder that returns an image the size of the DHP or SOFn
+    segment containing the number of frames.
+    """
+    jpg = JPEG(parse_buffer(src))
+    segment = jpg.get_segments("DHP")[0] if jpg.is_hierarchical else jpg.frame
+    nr_frames = len(jpg.get_segments("SOF"))
+
+    return np.full((segment.rows, segment.columns), nr_frames, dtype="u1")
+
+
+class TestDecodeFrames:
+    """Tests for decode_frames()."""
+
+    def test_no_decoders_raises(self, plugins):
+        """Test an exception is raised if no decoders are available."""
+        plugins({})
+        msg = r"No JPEG decoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            decode_frames(hierarchical())
+
+    def test_frames(self, plugins):
+        """Test decoding the frames up to a resolution."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": count_frames}})
+        data = hierarchical()
+        for rows, columns, shape, nr_frames in (
+            (0, 0, (8, 8), 1),
+            (8, 8, (8, 8), 1),
+            (9, 0, (16, 16), 2),
+            (0, 16, (16, 16), 2),
+            (17, 8, (32, 32), 3),
+            (100, 100, (32, 32), 3),
+        ):
+            arr = decode_frames(data, rows, columns, decoder="foo")
+            assert arr.shape == shape
+            assert arr[0, 0] == nr_frames
+
+    def test_fallback(self, plugins, caplog):
+        """Test images that aren't hierarchical are decoded in full."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": count_frames}})
+        with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+            arr = decode_frames(restarts())
+
+        assert arr.shape == (32, 32)
+        assert "Only hierarchical JPEG data is supported" in caplog.text
+
+
+class TestDecodeRegion:
+    """Tests for decode_region()."""
+
+    def test_no_decoders_raises(self, plugins):
+        """Test an exception is raised if no decoders are available."""
+        plugins({})
+        msg = r"No JPEG decoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            decode_region(restarts())
+
+    def test_region(self, plugins, caplog):
+        """Test decoding only the intervals covering the region."""
+        shapes = []
+
+        def func(src, **kwargs):
+            arr = decoder(src)
+            shapes.append(arr.shape)
+            return arr
+
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": func}})
+        # 2 intervals per line of MCUs
+        data = restarts(rows=60, columns=60, interval=4)
+        reference = decoder(data)
+        for rows, cols, shape in (
+            (slice(10, 20), slice(40, 50), (16, 28)),
+            (slice(0, 8), slice(0, 32), (8, 32)),
+            (slice(7, 9), slice(31, 33), (16, 60)),
+            (slice(50, None, 3), slice(1, None, 2), (12, 60)),
+            (slice(None), slice(None), (60, 60)),
+        ):
+            shapes.clear()
+            with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+                arr = decode_region(data, rows, cols, bar=1)
+
+            assert np.array_equal(arr, reference[rows, cols])
+            assert shapes == [shape]
+
+        assert "Decoding 60 x 60 samples at (0, 0)" in caplog.text
+
+    def test_lines(self, plugins):
+        """Test decoding lines of MCUs when intervals don't match lines."""
+        shapes = []
+
+        def func(src, **kwargs):
+            arr = decoder(src)
+            shapes.append(arr.shape)
+            return arr
+
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": func}})
+        # 3 intervals per 2 lines of MCUs
+        data = restarts(rows=60, columns=24, interval=2)
+        reference = decoder(data)
+        arr = decode_region(data, slice(20, 30), slice(5, 10))
+        assert np.array_equal(arr, reference[20:30, 5:10])
+        assert shapes == [(16, 24)]
+
+    def test_fallback(self, plugins, caplog):
+        """Test images without restart intervals are decoded in full."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": decoder}})
+        # No DRI marker segment
+        data = restarts()[:2] + restarts()[8:]
+        with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+            arr = decode_region(data, slice(1, 3), slice(None, None, -1))
+
+        assert arr.shape == (2, 32)
+        assert arr.flags.owndata
+        assert "Unable to decode only the region, decoding in full" in caplog.text
+
+    def test_plugin(self):
+        """Test decoding a region with an installed plugin."""
+        pytest.importorskip("libjpeg")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (300, 420, 3), dtype="u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(
+            buffer, "JPEG", restart_marker_blocks=1, subsampling=0
+        )
+        data = buffer.getvalue()
+
+        reference = decode(data, decoder="libjpeg")
+        arr = decode_region(data, slice(100, 164), slice(30, 70), decoder="libjpeg")
+        assert np.array_equal(arr, reference[100:164, 30:70])
+
+    def test_plugin_subsampled(self):
+        """Test decoding a region of a 4:2:0 image with an installed plugin."""
+        pytest.importorskip("libjpeg")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (300, 420, 3), dtype="u1")
+        for blocks in (1, 3):
+            buffer = BytesIO()
+            Image.fromarray(arr).save(
+                buffer, "JPEG", restart_marker_blocks=blocks, subsampling=2
+            )
+            data = buffer.getvalue()
+            reference = decode(data, decoder="libjpeg")
+            for rows, cols in (
+                (slice(37, 91), slice(21, 203)),
+                (slice(96, 160), slice(32, 64)),
+                (slice(15, 33), slice(47, 65)),
+                (slice(0, 300, 7), slice(5, 415, 3)),
+            ):
+                region = decode_region(data, rows, cols, decoder="libjpeg")
+                assert np.array_equal(region, reference[rows, cols])
+
+
+def progressive(nr_scans=3):
+    """Return a progressive JPEG with `nr_scans` scans."""
+    sof = pack(">HHBHHB", 0xFFC2, 11, 8, 8, 8, 1) + b"\x01\x11\x00"
+    sos = pack(">HHB", 0xFFDA, 8, 1) + b"\x01\x00\x00\x00\x00"
+    return b"\xFF\xD8" + sof + (sos + b"\x01") * nr_scans + b"\xFF\xD9"
+
+
+def count_scans(src, **kwargs):
+    """A fake JPEG decoder that returns the number of scans."""
+    return np.full((1, 1), src.count(b"\xFF\xDA"), dtype="u1")
+
+
+class TestDecodeScans:
+    """Tests for decode_scans()."""
+
+    def test_no_decoders_raises(self, plugins):
+        """Test an exception is raised if no decoders are available."""
+        plugins({})
+        msg = r"No JPEG decoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            decode_scans(progressive(), 1)
+
+    def test_invalid_nr_scans_raises(self, plugins):
+        """Test an exception is raised if 'nr_scans' is invalid."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": count_scans}})
+        with pytest.raises(ValueError, match="'nr_scans' must be at least 1"):
+            decode_scans(progressive(), 0)
+
+    def test_scans(self, plugins, caplog):
+        """Test decoding the first scans."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": count_scans}})
+        data = progressive(5)
+        assert decode_scans(data, 1)[0, 0] == 1
+        assert decode_scans(data, 3, decoder="foo")[0, 0] == 3
+        with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+            assert decode_scans(data, 5)[0, 0] == 5
+            assert decode_scans(data, 6)[0, 0] == 5
+
+        assert "must be between 1 and 5" in caplog.text
+
+    def test_fallback(self, plugins, caplog):
+        """Test images that aren't progressive are decoded in full."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": count_scans}})
+        data = progressive().replace(b"\xFF\xC2", b"\xFF\xC0")
+        with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+            assert decode_scans(data, 1)[0, 0] == 3
+
+        assert "Unable to decode only the first scans" in caplog.text
+
+    def test_plugin(self):
+        """Test decoding the first scans with an installed plugin."""
+        pytest.importorskip("libjpeg")
+        Image = pytest.importorskip("PIL.Image")
+
+        yy, xx = np.mgrid[0:200, 0:300]
+        arr = np.stack([xx, yy, xx + yy], axis=-1).astype("u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(buffer, "JPEG", progressive=True)
+        data = buffer.getvalue()
+
+        reference = decode(data, decoder="libjpeg").astype(int)
+        preview = decode_scans(data, 1, decoder="libjpeg")
+        assert preview.shape == reference.shape
+        assert 0 < np.abs(preview - reference).mean() < 10
+
+
+class TestDecodeStrips:
+    """Tests for decode_strips()."""
+
+    def test_no_decoders_raises(self, plugins):
+        """Test an exception is raised if no decoders are available."""
+        plugins({})
+        msg = r"No JPEG decoders are available"
+        with pytest.raises(RuntimeError, match=msg):
+            decode_strips(restarts())
+
+    def test_invalid_workers_raises(self, plugins):
+        """Test an exception is raised if 'workers' is invalid."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": decoder}})
+        with pytest.raises(ValueError, match="'workers' must be at least 1"):
+            decode_strips(restarts(), workers=-1)
+
+    def test_strips(self, plugins):
+        """Test decoding in strips."""
+        calls = []
+
+        def func(src, **kwargs):
+            calls.append((parse_buffer(src), kwargs))
+            return decoder(src)
+
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": func}})
+        data = restarts(rows=160)
+        arr = decode_strips(data, rows=8, workers=4, bar=1)
+        assert arr.shape == (160, 32)
+        assert np.array_equal(arr, decoder(data))
+        assert len(calls) == 20
+        assert all(kwargs == {"bar": 1} for _, kwargs in calls)
+
+    def test_strip_per_worker(self, plugins):
+        """Test the default strip size."""
+        sizes = []
+
+        def func(src, **kwargs):
+            arr = decoder(src)
+            sizes.append(arr.shape[0])
+            return arr
+
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": func}})
+        data = restarts(rows=160)
+        arr = decode_strips(data, decoder="foo", workers=3)
+        assert np.array_equal(arr, decoder(data))
+        assert sorted(sizes) == [48, 56, 56]
+
+    def test_parallel(self, plugins):
+        """Test strips are decoded concurrently."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def func(src, **kwargs):
+            arr = decoder(src)
+            if arr[0, 0] > 1:
+                # Only passes if the other strips are decoded at the same time
+                barrier.wait()
+
+            return arr
+
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": func}})
+        arr = decode_strips(restarts(rows=24), rows=8, workers=2)
+        assert arr[::8, 0].tolist() == [1, 2, 3]
+
+    def test_fallback(self, plugins, caplog):
+        """Test images that can't be split are decoded in full."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": decoder}})
+        # The restart interval covers the whole image
+        data = restarts(rows=16, interval=8)
+        with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+            arr = decode_strips(data)
+
+        assert arr.shape == (16, 32)
+        assert "too small to be split into strips" in caplog.text
+
+        # No DRI marker segment
+        data = restarts()[:2] + restarts()[8:]
+        with caplog.at_level(logging.DEBUG, logger="pylibjpeg"):
+            arr = decode_strips(data)
+
+        assert arr.shape == (32, 32)
+        assert "Unable to split the image into strips" in caplog.text
+
+    def test_source(self, plugins, tmp_path):
+        """Test decoding from a path and file-like."""
+        plugins({"pylibjpeg.jpeg_decoders": {"foo": decoder}})
+        data = restarts()
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(data)
+        assert np.array_equal(decode_strips(fpath), decoder(data))
+        with open(fpath, "rb") as f:
+            assert np.array_equal(decode_strips(f), decoder(data))
+
+    def test_plugin(self):
+        """Test decoding strips with an installed plugin."""
+        pytest.importorskip("libjpeg")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (300, 420, 3), dtype="u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(buffer, "JPEG", restart_marker_rows=1, subsampling=0)
+        data = buffer.getvalue()
+
+        reference = decode(data, decoder="libjpeg")
+        arr = decode_strips(data, decoder="libjpeg", workers=4)
+        assert np.array_equal(arr, reference)
+
+    def test_plugin_subsampled(self):
+        """Test decoding strips of a 4:2:0 image with an installed plugin."""
+        pytest.importorskip("libjpeg")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (300, 420, 3), dtype="u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(buffer, "JPEG", restart_marker_rows=1, subsampling=2)
+        data = buffer.getvalue()
+
+        reference = decode(data, decoder="libjpeg")
+        for rows in (0, 16, 40):
+            arr = decode_strips(data, decoder="libjpeg", rows=rows, workers=4)
+            assert np.array_equal(arr, reference)
@@ -0,0 +1,479 @@
+"""Tests for the plugin utilities."""
+
+from importlib import metadata
+from io import BytesIO
+import logging
+import mmap
+
+import numpy as np
+import pytest
+
+from pylibjpeg import decode, sniff_format, utils
+from pylibjpeg.utils import (
+    PluginRegistry,
+    REGISTRY,
+    decode_pixel_data,
+    get_decoders,
+    get_encoders,
+    get_pixel_data_decoders,
+    reshape_pixel_data,
+)
+
+
+class TestPluginRegistry:
+    """Tests for PluginRegistry."""
+
+    def test_scans_once(self, monkeypatch):
+        """Test the installed distributions are only scanned once."""
+        calls = []
+        original = metadata.distributions
+
+        def distributions(*args, **kwargs):
+            calls.append(None)
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(metadata, "distributions", distributions)
+        registry = PluginRegistry()
+        registry.entry_points("pylibjpeg.jpeg_decoders")
+        registry.entry_points("pylibjpeg.jpeg_2000_decoders")
+        registry.entry_points("pylibjpeg.pixel_data_decoders")
+        assert len(calls) == 1
+
+        registry.invalidate()
+        registry.entry_points("pylibjpeg.jpeg_decoders")
+        assert len(calls) == 2
+
+    def test_unknown_group(self):
+        """Test an empty tuple is returned for an unknown group."""
+        assert PluginRegistry().entry_points("pylibjpeg.foo") == ()
+
+    def test_load_is_lazy(self):
+        """Test plugins are only loaded when requested."""
+        registry = PluginRegistry()
+        eps = registry.entry_points("pylibjpeg.pixel_data_decoders")
+        assert registry._loaded == {}
+        if not eps:
+            return
+
+        func = registry.load(eps[0])
+        assert callable(func)
+        assert list(registry._loaded) == [eps[0]]
+        assert registry.load(eps[0]) is func
+
+    def test_load_cached(self, monkeypatch):
+        """Test loaded plugins are cached."""
+        ep = metadata.EntryPoint(
+            name="foo", value="os.path:join", group="pylibjpeg.jpeg_decoders"
+        )
+        calls = []
+
+        def load(self):
+            calls.append(None)
+            return print
+
+        monkeypatch.setattr(metadata.EntryPoint, "load", load)
+        registry = PluginRegistry()
+        assert registry.load(ep) is print
+        assert registry.load(ep) is print
+        assert len(calls) == 1
+
+        registry.invalidate()
+        assert registry._loaded == {}
+        assert registry.load(ep) is print
+        assert len(calls) == 2
+
+    def test_shared(self, monkeypatch):
+        """Test the get_*() functions use the process-wide registry."""
+        ep = metadata.EntryPoint(
+            name="foo", value="os.path:join", group="pylibjpeg.jpeg_decoders"
+        )
+        monkeypatch.setattr(REGISTRY, "_groups", {"pylibjpeg.jpeg_decoders": (ep,)})
+        monkeypatch.setattr(REGISTRY, "_loaded", {ep: print})
+        assert get_decoders("JPEG") == {"foo": print}
+        assert get_decoders() == {"foo": print}
+        assert get_encoders() == {}
+        assert get_pixel_data_decoders() == {}
+        assert utils.REGISTRY is REGISTRY
+
+    def test_get_decoders_raises(self):
+        """Test an unknown plugin type still raises."""
+        msg = "No matching plugin entry point for 'foo'"
+        with pytest.raises(KeyError, match=msg):
+            get_decoders("foo")
+
+
+class TestSniffFormat:
+    """Tests for sniff_format()."""
+
+    def test_signatures(self):
+        """Test identifying the format from the signature."""
+        assert sniff_format(b"\xff\x4f\xff\x51\x00\x2f") == "JPEG 2000"
+        jp2 = b"\x00\x00\x00\x0c\x6a\x50\x20\x20\x0d\x0a\x87\x0a\x00\x00"
+        assert sniff_format(jp2) == "JPEG 2000"
+        assert sniff_format(b"\xff\x0a\xfa\x00") == "JPEG XL"
+        jxl = b"\x00\x00\x00\x0c\x4a\x58\x4c\x20\x0d\x0a\x87\x0a"
+        assert sniff_format(jxl) == "JPEG XL"
+        assert sniff_format(b"\xff\x10\xff\x50\x00\x04") == "JPEG XS"
+        assert sniff_format(b"\x49\x49\xbc\x01") == "JPEG XR"
+
+    def test_unknown(self):
+        """Test unknown formats return an empty str."""
+        assert sniff_format(b"") == ""
+        assert sniff_format(b"\x00\x00") == ""
+        assert sniff_format(b"\x00" * 100) == ""
+
+    def test_10918(self):
+        """Test identifying data starting with an SOI marker."""
+        # SOI, APP0, SOF0
+        app0 = b"\xff\xe0\x00\x06JFIF"
+        sof0 = b"\xff\xc0\x00\x0b\x08\x00\x01\x00\x01\x01\x01\x11\x00"
+        assert sniff_format(b"\xff\xd8" + app0 + sof0) == "JPEG"
+        # Fill bytes before the marker
+        assert sniff_format(b"\xff\xd8\xff\xff" + app0 + sof0) == "JPEG"
+        # SOF55
+        sof55 = b"\xff\xf7\x00\x0b\x08\x00\x01\x00\x01\x01\x01\x11\x00"
+        assert sniff_format(b"\xff\xd8" + app0 + sof55) == "JPEG-LS"
+        # APP11 with JPEG XT boxes
+        app11 = b"\xff\xeb\x00\x06JP\x00\x01"
+        assert sniff_format(b"\xff\xd8" + app11 + sof0) == "JPEG XT"
+        # Truncated
+        assert sniff_format(b"\xff\xd8") == "JPEG"
+        assert sniff_format(b"\xff\xd8" + app0) == "JPEG"
+
+    def test_sources(self, tmp_path):
+        """Test identifying paths and file-likes."""
+        # Large APP segments need more than the initial read
+        app1 = b"\xff\xe1\xff\xff" + b"\x00" * 65533
+        sof55 = b"\xff\xf7\x00\x0b\x08\x00\x01\x00\x01\x01\x01\x11\x00"
+        data = b"\xff\xd8" + app1 + app1 + sof55 + b"\x00" * 10
+        fpath = tmp_path / "test.jls"
+        fpath.write_bytes(data)
+        assert sniff_format(fpath) == "JPEG-LS"
+        assert sniff_format(str(fpath)) == "JPEG-LS"
+
+        b = BytesIO(b"\x00" + data)
+        b.seek(1)
+        assert sniff_format(b) == "JPEG-LS"
+        assert b.tell() == 1
+
+    def test_decode_uses_format(self, monkeypatch):
+        """Test decode() only tries the decoders for the sniffed format."""
+        jpg = metadata.EntryPoint(
+            name="foo", value="os:foo", group="pylibjpeg.jpeg_decoders"
+        )
+        j2k = metadata.EntryPoint(
+            name="bar", value="os:bar", group="pylibjpeg.jpeg_2000_decoders"
+        )
+        calls = []
+
+        def foo(src, **kwargs):
+            calls.append("foo")
+            raise ValueError("foo failed")
+
+        def bar(src, **kwargs):
+            calls.append("bar")
+            return "bar"
+
+        groups = {
+            "pylibjpeg.jpeg_decoders": (jpg,),
+            "pylibjpeg.jpeg_2000_decoders": (j2k,),
+        }
+        monkeypatch.setattr(REGISTRY, "_groups", groups)
+        monkeypatch.setattr(REGISTRY, "_loaded", {jpg: foo, j2k: bar})
+        assert decode(b"\xff\x4f\xff\x51\x00\x00") == "bar"
+        assert calls == ["bar"]
+
+        # Unknown formats try everything
+        calls.clear()
+        assert decode(b"\x00\x00") == "bar"
+        assert calls == ["foo", "bar"]
+
+
+class TestBufferSources:
+    """Tests for decoding objects supporting the buffer protocol."""
+
+    data = b"\xff\x4f\xff\x51\x00\x00"
+
+    def sources(self):
+        data = self.data
+        return [
+            bytearray(data),
+            memoryview(data),
+            memoryview(b"\x00" + data)[1:],
+            np.frombuffer(data, dtype="u1"),
+            np.frombuffer(data + b"\x00\x00", dtype="<u2")[:3],
+        ]
+
+    def test_sniff(self):
+        """Test identifying buffers."""
+        for src in self.sources():
+            assert sniff_format(src) == "JPEG 2000"
+
+    def test_copied(self, plugins):
+        """Test buffers are copied for plugins without buffer support."""
+        received = []
+
+        def foo(src, **kwargs):
+            received.append(src)
+            return "foo"
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": foo}})
+        for src in self.sources():
+            assert decode(src) == "foo"
+
+        assert all(isinstance(src, bytes) for src in received)
+        assert all(src == self.data for src in received)
+
+    def test_zero_copy(self, plugins):
+        """Test buffers are passed as-is for plugins with buffer support."""
+        received = []
+
+        def foo(src, **kwargs):
+            received.append(src)
+            return "foo"
+
+        foo.supports_buffers = True
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": foo}})
+        sources = self.sources()
+        for src in sources:
+            assert decode(src, decoder="foo") == "foo"
+            assert decode(src) == "foo"
+
+        assert received[::2] == received[1::2]
+        assert all(a is b for a, b in zip(received[::2], sources))
+
+    def test_use_mmap(self, plugins, tmp_path):
+        """Test memory-mapping a path."""
+        received = []
+
+        def foo(src, **kwargs):
+            received.append(src)
+            return "foo"
+
+        foo.supports_buffers = True
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": foo}})
+        fpath = tmp_path / "test.j2k"
+        fpath.write_bytes(self.data)
+
+        assert decode(fpath) == "foo"
+        assert isinstance(received[-1], bytes)
+
+        assert decode(fpath, use_mmap=True) == "foo"
+        assert isinstance(received[-1], mmap.mmap)
+        assert received[-1][:] == self.data
+        received[-1].close()
+
+        # Empty files can't be mapped
+        empty = tmp_path / "empty.j2k"
+        empty.write_bytes(b"")
+        assert decode(empty, use_mmap=True) == "foo"
+        assert received[-1] == b""
+
+
+class TestDecodeOut:
+    """Tests for decoding into an existing array."""
+
+    data = b"\xff\x4f\xff\x51\x00\x00"
+
+    def test_invalid_out(self, plugins):
+        """Test an invalid `out` raises an exception."""
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": lambda src: None}})
+        with pytest.raises(TypeError, match="'out' must be a numpy.ndarray"):
+            decode(self.data, out=bytearray(4))
+
+        with pytest.raises(ValueError, match="'out' must be C-contiguous"):
+            decode(self.data, out=np.zeros((4, 4))[:, 0])
+
+        out = np.zeros(4)
+        out.flags.writeable = False
+        with pytest.raises(ValueError, match="'out' must be writeable"):
+            decode(self.data, out=out)
+
+    def test_copied(self, plugins):
+        """Test the decoded image is copied for plugins without out support."""
+
+        def foo(src, **kwargs):
+            assert "out" not in kwargs
+            return np.arange(6, dtype="u2").reshape(2, 3)
+
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": foo}})
+        volume = np.zeros((2, 2, 3), dtype="u2")
+        assert decode(self.data, out=volume[1]) is not None
+        assert np.array_equal(volume[0], np.zeros((2, 3)))
+        assert np.array_equal(volume[1], [[0, 1, 2], [3, 4, 5]])
+
+        msg = (
+            r"The decoded image has shape \(2, 3\) and dtype 'uint16' but 'out' "
+            r"has shape \(3, 2\) and dtype 'uint16'"
+        )
+        with pytest.raises(ValueError, match=msg):
+            decode(self.data, out=np.zeros((3, 2), dtype="u2"))
+
+        with pytest.raises(ValueError, match="dtype 'uint8'"):
+            decode(self.data, decoder="foo", out=np.zeros((2, 3), dtype="u1"))
+
+    def test_in_place(self, plugins):
+        """Test plugins with out support are passed `out`."""
+
+        def foo(src, out=None, **kwargs):
+            out[...] = 7
+            return out
+
+        foo.supports_out = True
+        plugins({"pylibjpeg.jpeg_2000_decoders": {"foo": foo}})
+        out = np.zeros((2, 3), dtype="u1")
+        assert decode(self.data, out=out) is out
+        assert np.all(out == 7)
+
+        # Without `out` the plugin isn't passed it
+        with pytest.raises(ValueError, match="Unable to decode"):
+            decode(self.data)
+
+
+class TestDecodePixelData:
+    """Tests for decode_pixel_data()."""
+
+    uid = "1.2.840.10008.1.2.4.50"
+
+    def test_no_decoders(self, plugins):
+        """Test an exception is raised if there's no decoder for the UID."""
+        plugins({"pylibjpeg.pixel_data_decoders": {self.uid: lambda src: None}})
+        msg = "No pixel data decoders are available for the transfer syntax '1.2.3'"
+        with pytest.raises(ValueError, match=msg):
+            decode_pixel_data(b"", "1.2.3")
+
+        msg = "No pixel data decoders are available"
+        with pytest.raises(ValueError, match=msg):
+            decode_pixel_data(b"", self.uid, decoder="bar")
+
+    def test_decode(self, plugins):
+        """Test decoding with and without `out`."""
+        received = {}
+
+        def func(src, **kwargs):
+            received.update(kwargs)
+            return bytearray(b"\x01\x00\x02\x00")
+
+        plugins({"pylibjpeg.pixel_data_decoders": {self.uid: func}})
+        assert decode_pixel_data(b"", self.uid, rows=1) == b"\x01\x00\x02\x00"
+        assert received == {"transfer_syntax_uid": self.uid, "rows": 1}
+
+        out = np.zeros((1, 2), dtype="<u2")
+        assert decode_pixel_data(b"", self.uid, out=out) is out
+        assert out.tolist() == [[1, 2]]
+
+        msg = "The decoded frame is 4 bytes but 'out' is 2 bytes"
+        with pytest.raises(ValueError, match=msg):
+            decode_pixel_data(b"", self.uid, out=np.zeros(2, dtype="u1"))
+
+    def test_in_place(self, plugins):
+        """Test plugins with out support are passed `out`."""
+
+        def func(src, out, **kwargs):
+            out[:] = 3
+            return out
+
+        func.supports_out = True
+        plugins({"pylibjpeg.pixel_data_decoders": {self.uid: func}})
+        out = np.zeros(4, dtype="u1")
+        assert decode_pixel_data(b"", self.uid, out=out) is out
+        assert out.tolist() == [3, 3, 3, 3]
+
+
+class TestReshapePixelData:
+    """Tests for reshape_pixel_data()."""
+
+    def test_single_sample(self):
+        """Test shaping single sample per pixel data."""
+        data = bytearray(b"\x01\x00\x02\x00\xFF\xFF\x04\x00\x00")
+        arr = reshape_pixel_data(data, 2, 2, bits_allocated=16)
+        assert arr.dtype == "<u2"
+        assert arr.tolist() == [[1, 2], [65535, 4]]
+        assert np.shares_memory(arr, np.frombuffer(data, dtype="u1"))
+        assert arr.flags.writeable
+
+        arr = reshape_pixel_data(
+            data, 2, 2, bits_allocated=16, pixel_representation=1
+        )
+        assert arr.dtype == "<i2"
+        assert arr.tolist() == [[1, 2], [-1, 4]]
+
+        # Decoder keyword parameters can be used directly
+        kwargs = {
+            "transfer_syntax_uid": "1.2.840.10008.1.2.5",
+            "rows": 1,
+            "columns": 2,
+            "number_of_frames": 2,
+            "bits_allocated": 16,
+            "photometric_interpretation": "MONOCHROME2",
+        }
+        arr = reshape_pixel_data(data, **kwargs)
+        assert arr.shape == (2, 1, 2)
+        assert arr.tolist() == [[[1, 2]], [[65535, 4]]]
+
+    def test_samples(self):
+        """Test shaping multiple samples per pixel data."""
+        data = np.arange(12, dtype="u1")
+        arr = reshape_pixel_data(data, 2, 2, samples_per_pixel=3)
+        assert arr.shape == (2, 2, 3)
+        assert arr[0, 1].tolist() == [3, 4, 5]
+        assert np.shares_memory(arr, data)
+
+        arr = reshape_pixel_data(
+            data, 2, 2, samples_per_pixel=3, planar_configuration=1
+        )
+        assert arr.shape == (2, 2, 3)
+        assert arr[0, 1].tolist() == [1, 5, 9]
+        assert np.shares_memory(arr, data)
+        assert not arr.flags.c_contiguous
+
+        arr = reshape_pixel_data(
+            data, 2, 1, samples_per_pixel=3, number_of_frames=2
+        )
+        assert arr.shape == (2, 2, 1, 3)
+        assert arr[1, 0, 0].tolist() == [6, 7, 8]
+
+    def test_copy(self, caplog):
+        """Test when the data is copied."""
+        data = np.arange(8, dtype="u1")
+        arr = reshape_pixel_data(data, 2, 2, copy=True)
+        assert not np.shares_memory(arr, data)
+        assert arr.tolist() == [[0, 1], [2, 3]]
+
+        arr = reshape_pixel_data(
+            data, 2, 2, planar_configuration=1, samples_per_pixel=2, copy=True
+        )
+        assert arr.flags.c_contiguous
+        assert arr[0, 0].tolist() == [0, 4]
+
+        # Immutable data gives a read-only view
+        arr = reshape_pixel_data(b"\x00\x01", 1, 2)
+        assert not arr.flags.writeable
+
+        caplog.set_level(logging.DEBUG, logger="pylibjpeg")
+        arr = reshape_pixel_data(data[::2], 2, 2, copy=None)
+        assert arr.tolist() == [[0, 2], [4, 6]]
+        assert not np.shares_memory(arr, data)
+        assert "copied as it isn't C-contiguous" in caplog.text
+
+        msg = "'frame' must be C-contiguous when 'copy' is False"
+        with pytest.raises(ValueError, match=msg):
+            reshape_pixel_data(data[::2], 2, 2, copy=False)
+
+    def test_invalid_raises(self):
+        """Test invalid parameters raise an exception."""
+        msg = "Unsupported 'bits_allocated' value 12"
+        with pytest.raises(ValueError, match=msg):
+            reshape_pixel_data(b"\x00" * 8, 2, 2, bits_allocated=12)
+
+        msg = "Invalid 'pixel_representation' value 2"
+        with pytest.raises(ValueError, match=msg):
+            reshape_pixel_data(b"\x00" * 4, 2, 2, pixel_representation=2)
+
+        msg = "Invalid 'planar_configuration' value 2"
+        with pytest.raises(ValueError, match=msg):
+            reshape_pixel_data(b"\x00" * 4, 2, 2, planar_configuration=2)
+
+        msg = "The decoded pixel data is 7 bytes but at least 8 bytes are needed"
+        with pytest.raises(ValueError, match=msg):
+            reshape_pixel_data(b"\x00" * 7, 2, 2, bits_allocated=16)
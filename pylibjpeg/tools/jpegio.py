@@ -2,15 +2,21 @@ import logging
 import os
 from typing import BinaryIO, Union, cast
 
-from .s10918 import parse, JPEG
+from .reader import CachedReader, RangeReader, RangeReaderIO
+from .s10918 import parse, parse_header, JPEG
 
 
 LOGGER = logging.getLogger(__name__)
 PARSERS = {"10918": (parse, JPEG)}
+HEADER_PARSERS = {"10918": parse_header}
 
 
-def get_specification(fp: BinaryIO) -> str:
+def get_specification(fp: Union[BinaryIO, RangeReader]) -> str:
     """ """
+    if hasattr(fp, "read_at"):
+        reader = RangeReaderIO(cast(RangeReader, fp))
+        return get_specification(cast(BinaryIO, reader))
+
     if fp.read(1) != b"\xff":
         raise ValueError("File is not JPEG")
 
@@ -33,21 +39,68 @@ def get_specification(fp: BinaryIO) -> str:
     )
 
 
-def jpgread(path: Union[str, os.PathLike[str], BinaryIO]) -> JPEG:
-    """Return a represention of the JPEG file at `fpath`."""
+def jpgread(
+    path: Union[str, os.PathLike[str], BinaryIO, RangeReader],
+    ecs_views: bool = False,
+    lazy: bool = False,
+) -> JPEG:
+    """Return a represention of the JPEG file at `fpath`.
+
+    .. versionchanged:: 2.2
+
+        Added the `ecs_views` and `lazy` keyword parameters and support for
+        reading from a :class:`~pylibjpeg.tools.reader.RangeReader`.
+
+    Parameters
+    ----------
+    path : str, os.PathLike, file-like or RangeReader
+        The JPEG file to read. If an object with a ``read_at(offset, size)``
+        method then only the marker segments up to and including the first
+        SOS segment are read, using a few large reads through a
+        :class:`~pylibjpeg.tools.reader.CachedReader`, and `ecs_views` and
+        `lazy` are ignored. The number of reads made is logged at the
+        ``DEBUG`` level.
+    ecs_views : bool, optional
+        If ``True`` then the entropy-coded segments in
+        :attr:`JPEG.info<pylibjpeg.tools.s10918.JPEG.info>` reference the
+        memory-mapped file rather than being copied into memory, with the
+        byte stuffing only removed when the data is requested. Default
+        ``False``.
+    lazy : bool, optional
+        If ``True`` then only find the marker segments when reading, with
+        each parsed the first time it's accessed through
+        :attr:`JPEG.info<pylibjpeg.tools.s10918.JPEG.info>`. The file is
+        kept memory-mapped. Default ``False``.
+    """
     LOGGER.debug(f"Reading file: {path}")
+    if hasattr(path, "read_at"):
+        reader = (
+            path
+            if isinstance(path, CachedReader)
+            else CachedReader(cast(RangeReader, path))
+        )
+        jpg_format = get_specification(reader)
+        header = HEADER_PARSERS[jpg_format](reader)
+        stats = reader.stats
+        LOGGER.debug(
+            f"Header parsed successfully using {stats.fetches} reads of "
+            f"{stats.nbytes} bytes in total"
+        )
+
+        return PARSERS[jpg_format][1](header)
+
     if not hasattr(path, "read"):
         path = cast(str, path)
         with open(path, "rb") as fp:
             jpg_format = get_specification(fp)
             parser, jpg_class = PARSERS[jpg_format]
-            meta = parser(fp)
+            meta = parser(fp, ecs_views=ecs_views, lazy=lazy)
             LOGGER.debug("File parsed successfully")
     else:
         path = cast(BinaryIO, path)
         jpg_format = get_specification(path)
         parser, jpg_class = PARSERS[jpg_format]
-        meta = parser(path)
+        meta = parser(path, ecs_views=ecs_views, lazy=lazy)
         LOGGER.debug("File parsed successfully")
 
     return jpg_class(meta)
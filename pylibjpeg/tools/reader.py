@@ -0,0 +1,279 @@
+"""Random-access readers for JPEG data that isn't in a local file.
+
+Data in remote or chunked storage, such as a blob store, is usually read in
+ranges with each read having a fixed cost. Any object with a
+``read_at(offset, size)`` method can be used as a :class:`RangeReader`, and
+wrapping it in a :class:`CachedReader` turns many small reads, such as those
+made while parsing the marker segments of a JPEG, into a few large ones.
+
+.. versionadded:: 2.2
+"""
+
+from collections import OrderedDict
+import io
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Protocol, Tuple, Union
+
+
+# The default size of the blocks read by a CachedReader
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeReader(Protocol):
+    def read_at(self, offset: int, size: int) -> bytes:
+        ...  # pragma: no cover
+
+
+class ReadStats(NamedTuple):
+    """The reads made by a :class:`CachedReader`.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    requests : int
+        The number of reads requested from the :class:`CachedReader`.
+    fetches : int
+        The number of reads made from the wrapped reader.
+    nbytes : int
+        The total number of bytes returned by the wrapped reader.
+    """
+
+    requests: int
+    fetches: int
+    nbytes: int
+
+
+class FileReader:
+    """A :class:`RangeReader` for a local file.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        """Open a file for reading.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            The path to the file.
+        """
+        self._fp = open(path, "rb")
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "FileReader":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the file."""
+        self._fp.close()
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Return up to `size` bytes from `offset`, with fewer only if the end
+        of the file is reached.
+        """
+        if offset < 0 or size < 0:
+            raise ValueError("'offset' and 'size' must not be negative")
+
+        if hasattr(os, "pread"):
+            return os.pread(self._fp.fileno(), size, offset)
+
+        with self._lock:
+            self._fp.seek(offset)
+            return self._fp.read(size)
+
+
+class CachedReader:
+    """A :class:`RangeReader` that caches blocks of the data from another.
+
+    .. versionadded:: 2.2
+
+    Reads are made in whole blocks, with runs of adjacent blocks that aren't
+    cached combined into a single read of the wrapped reader, and blocks
+    following a read read ahead of time. The least recently used blocks are
+    evicted once the cache is full.
+    """
+
+    def __init__(
+        self,
+        reader: RangeReader,
+        block_size: int = BLOCK_SIZE,
+        read_ahead: int = 1,
+        max_blocks: int = 64,
+    ) -> None:
+        """Create a new reader.
+
+        Parameters
+        ----------
+        reader : RangeReader
+            The reader to cache the data from.
+        block_size : int, optional
+            The size of each block in bytes, default ``BLOCK_SIZE`` (64 KiB).
+        read_ahead : int, optional
+            The number of blocks to read after those needed for a read that
+            isn't cached, default ``1``.
+        max_blocks : int, optional
+            The maximum number of blocks to keep, default ``64``.
+        """
+        if block_size < 1:
+            raise ValueError("'block_size' must be at least 1")
+
+        if read_ahead < 0:
+            raise ValueError("'read_ahead' must not be negative")
+
+        if max_blocks < 1:
+            raise ValueError("'max_blocks' must be at least 1")
+
+        self.reader = reader
+        self.block_size = block_size
+        self.read_ahead = read_ahead
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+        # The index of the last block, once known
+        self._last: Optional[int] = None
+        self._requests = 0
+        self._fetches = 0
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Return up to `size` bytes from `offset`, with fewer only if the end
+        of the data is reached.
+        """
+        if offset < 0 or size < 0:
+            raise ValueError("'offset' and 'size' must not be negative")
+
+        with self._lock:
+            self._requests += 1
+            if not size:
+                return b""
+
+            first = offset // self.block_size
+            last = (offset + size - 1) // self.block_size
+            if self._last is not None:
+                last = min(last, self._last)
+
+            blocks: Dict[int, bytes] = {}
+            missing = []
+            for idx in range(first, last + 1):
+                block = self._blocks.get(idx)
+                if block is None:
+                    missing.append(idx)
+                else:
+                    self._blocks.move_to_end(idx)
+                    blocks[idx] = block
+
+            if missing:
+                blocks.update(self._fetch(missing))
+
+        data = b"".join(blocks.get(idx, b"") for idx in range(first, last + 1))
+        start = offset - first * self.block_size
+
+        return data[start : start + size]
+
+    @property
+    def stats(self) -> ReadStats:
+        """Return the number of reads made so far."""
+        return ReadStats(self._requests, self._fetches, self._nbytes)
+
+    def _fetch(self, missing: List[int]) -> Dict[int, bytes]:
+        """Return the blocks in `missing` after reading them from the wrapped
+        reader and caching them.
+        """
+        # Combine adjacent blocks into runs of [start, stop)
+        runs: List[Tuple[int, int]] = []
+        for idx in missing:
+            if runs and runs[-1][1] == idx:
+                runs[-1] = (runs[-1][0], idx + 1)
+            else:
+                runs.append((idx, idx + 1))
+
+        # Read ahead after the last run
+        start, stop = runs[-1]
+        for _ in range(self.read_ahead):
+            if stop in self._blocks or (self._last is not None and stop > self._last):
+                break
+
+            stop += 1
+
+        runs[-1] = (start, stop)
+
+        blocks = {}
+        size = self.block_size
+        for start, stop in runs:
+            data = self.reader.read_at(start * size, (stop - start) * size)
+            self._fetches += 1
+            self._nbytes += len(data)
+            for idx in range(start, stop):
+                block = data[(idx - start) * size : (idx - start + 1) * size]
+                if block or idx == 0:
+                    blocks[idx] = block
+
+                if len(block) < size:
+                    # Short read so this is the last block
+                    self._last = idx if block or idx == 0 else idx - 1
+                    break
+
+        for idx, block in blocks.items():
+            self._blocks[idx] = block
+            self._blocks.move_to_end(idx)
+
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+        return blocks
+
+
+class RangeReaderIO(io.RawIOBase):
+    """A read-only file-like view of a :class:`RangeReader`.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, reader: RangeReader) -> None:
+        """Create a new file-like.
+
+        Parameters
+        ----------
+        reader : RangeReader
+            The reader to read from.
+        """
+        super().__init__()
+        self.reader = reader
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        view = memoryview(buffer).cast("B")
+        data = self.reader.read_at(self._offset, len(view))
+        view[: len(data)] = data
+        self._offset += len(data)
+
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._offset + offset
+        else:
+            raise io.UnsupportedOperation("Seeking from the end isn't supported")
+
+        if position < 0:
+            raise ValueError(f"Invalid position {position}")
+
+        self._offset = position
+
+        return position
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._offset
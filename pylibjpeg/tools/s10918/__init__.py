@@ -1,2 +1,26 @@
-from .io import parse  # noqa: F401
+from ._ecs import EncodedSegment, SegmentCache  # noqa: F401
+from ._segments import (  # noqa: F401
+    Segment,
+    SOFSegment,
+    SOSSegment,
+    DHTSegment,
+    DQTSegment,
+    DRISegment,
+    DNLSegment,
+    EXPSegment,
+)
+from .build import (  # noqa: F401
+    Frame,
+    Region,
+    Scan,
+    Strip,
+    get_frames,
+    get_scans,
+    restart_region,
+    restart_strips,
+    truncate_frames,
+    truncate_scans,
+)
+from .io import parse, parse_buffer, parse_header, SegmentIndex  # noqa: F401
 from .rep import JPEG  # noqa: F401
+from .stream import Event, StreamParser, parse_stream  # noqa: F401
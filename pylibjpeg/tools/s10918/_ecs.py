@@ -0,0 +1,160 @@
+"""References to the entropy-coded segments in 10918 JPEG data.
+
+When parsing with `ecs_views` the entropy-coded segments aren't copied out
+of the source data, instead each is an :class:`EncodedSegment` referencing
+its offset and length in the source buffer or memory-mapped file. The byte
+stuffing is only removed when the unstuffed data is requested, with the
+result kept in a :class:`SegmentCache` shared by all the segments from the
+same source.
+
+.. versionadded:: 2.2
+"""
+
+from collections import OrderedDict
+import mmap
+import threading
+from typing import Any, Union
+
+
+# The default maximum size of the unstuffed data kept by a SegmentCache
+ECS_CACHE_SIZE = 32 * 1024 * 1024
+
+Source = Union[bytes, bytearray, mmap.mmap]
+
+
+def unstuff(data: Union[bytes, bytearray]) -> bytes:
+    """Return `data` with the byte stuffing removed."""
+    if b"\xFF\x00" not in data:
+        return bytes(data)
+
+    return b"\xFF".join(data.split(b"\xFF\x00"))
+
+
+class SegmentCache:
+    """A least recently used cache of unstuffed entropy-coded segments.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, source: Source, max_bytes: int = ECS_CACHE_SIZE) -> None:
+        """Create a new cache.
+
+        Parameters
+        ----------
+        source : bytes, bytearray or mmap.mmap
+            The buffer containing the JPEG data.
+        max_bytes : int, optional
+            The maximum total size of the unstuffed data to keep, once
+            exceeded the least recently used segments are evicted. Default
+            ``ECS_CACHE_SIZE`` (32 MiB).
+        """
+        self.source = source
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached segments."""
+        return len(self._cache)
+
+    def clear(self) -> None:
+        """Remove all the cached segments."""
+        with self._lock:
+            self._cache.clear()
+            self.nbytes = 0
+
+    def unstuffed(self, offset: int, length: int) -> bytes:
+        """Return the unstuffed entropy-coded segment.
+
+        Parameters
+        ----------
+        offset : int
+            The offset to the start of the segment in the source data.
+        length : int
+            The length of the segment in the source data.
+        """
+        with self._lock:
+            data = self._cache.get(offset)
+            if data is not None:
+                self._cache.move_to_end(offset)
+                return data
+
+        data = unstuff(self.source[offset : offset + length])
+        if len(data) > self.max_bytes:
+            return data
+
+        with self._lock:
+            if offset not in self._cache:
+                self._cache[offset] = data
+                self.nbytes += len(data)
+
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+        return data
+
+
+class EncodedSegment:
+    """A reference to an entropy-coded segment in the source JPEG data.
+
+    .. versionadded:: 2.2
+
+    Compares equal to a bytes-like containing the same unstuffed data, and
+    ``len()`` gives the length of the unstuffed data.
+
+    Attributes
+    ----------
+    offset : int
+        The offset to the start of the segment in the source data.
+    length : int
+        The length of the segment in the source data, including the byte
+        stuffing.
+    nbytes : int
+        The length of the segment with the byte stuffing removed.
+    """
+
+    __slots__ = ("cache", "offset", "length", "nbytes")
+
+    def __init__(
+        self, cache: SegmentCache, offset: int, length: int, nbytes: int
+    ) -> None:
+        self.cache = cache
+        self.offset = offset
+        self.length = length
+        self.nbytes = nbytes
+
+    def __bytes__(self) -> bytes:
+        return self.unstuffed()
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, EncodedSegment):
+            return self.unstuffed() == other.unstuffed()
+
+        if isinstance(other, (bytes, bytearray, memoryview)):
+            return self.unstuffed() == other
+
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __len__(self) -> int:
+        return self.nbytes
+
+    def __repr__(self) -> str:
+        return (
+            f"<EncodedSegment offset={self.offset} length={self.length} "
+            f"nbytes={self.nbytes}>"
+        )
+
+    @property
+    def raw(self) -> memoryview:
+        """Return a view of the segment in the source data, with the byte
+        stuffing.
+        """
+        return memoryview(self.cache.source)[self.offset : self.offset + self.length]
+
+    def unstuffed(self) -> bytes:
+        """Return the segment with the byte stuffing removed."""
+        return self.cache.unstuffed(self.offset, self.length)
@@ -48,12 +48,71 @@ The following marker segments are supported:
 * EXP
 * SOF
 * SOS
+
+Each segment has a parser that takes a buffer and the offset to the length
+parameter of the segment, such as :func:`APP_from`, which returns the segment
+data and the offset immediately after the parsed data. The parsers that take a
+file-like, such as :func:`APP`, read the segment then use the corresponding
+buffer parser.
 """
 
-from struct import unpack
-from typing import BinaryIO, Any, cast, Dict, Union, List, Tuple
+from struct import unpack, unpack_from
+from typing import BinaryIO, Any, Callable, Dict, Union, List, Tuple
+
+
+# A buffer parser returns the segment data and the offset after the data
+BufferParser = Callable[[Any, int], Tuple[Dict[str, Any], int]]
+# A file-like parser returns the segment data
+Parser = Callable[[BinaryIO], Dict[str, Any]]
+
+
+def _from_fp(fp: BinaryIO, parser: BufferParser) -> Dict[str, Any]:
+    """Return the segment data from `fp` parsed using the buffer `parser`.
+
+    After returning, `fp` will be positioned at the end of the parsed data.
+
+    Parameters
+    ----------
+    fp : file-like
+        A file-like positioned at the start of the length byte for the current
+        marker segment.
+    parser : Callable[[bytes, int], tuple[dict, int]]
+        The buffer parser for the segment.
+    """
+    length = fp.read(2)
+    data = length + fp.read(unpack(">H", length)[0] - 2)
+    info, offset = parser(data, 0)
+    fp.seek(offset - len(data), 1)
+
+    return info
+
 
-from pylibjpeg.tools.utils import split_byte
+def APP_from(buf: Any, offset: int) -> Tuple[Dict[str, Union[int, bytes]], int]:
+    """Return a dict containing APP data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.2.4.6.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Lp`` : application data segment length
+        * ``Ap`` : application data
+    int
+        The offset to the end of the segment.
+    """
+    (length,) = unpack_from(">H", buf, offset)
+    end = offset + length
+
+    return {"Lp": length, "Ap": bytes(buf[offset + 2 : end])}, end
 
 
 def APP(fp: BinaryIO) -> Dict[str, Union[int, bytes]]:
@@ -78,12 +137,38 @@ def APP(fp: BinaryIO) -> Dict[str, Union[int, bytes]]:
         * ``Lp`` : application data segment length
         * ``Ap`` : application data
     """
-    length = unpack(">H", fp.read(2))[0]
+    return _from_fp(fp, APP_from)
+
+
+def COM_from(buf: Any, offset: int) -> Tuple[Dict[str, Union[int, bytes]], int]:
+    """Return a dict containing COM data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.2.4.5.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Lc`` : comment data segment length
+        * ``Cm`` : comment bytes
+    int
+        The offset to the end of the segment.
+    """
+    (length,) = unpack_from(">H", buf, offset)
+    (comment,) = unpack_from(f"{length - 2}s", buf, offset + 2)
 
-    return {"Lp": length, "Ap": fp.read(length - 2)}
+    return {"Lc": length, "Cm": comment}, offset + length
 
 
-def COM(fp: BinaryIO) -> Dict[str, Union[int, str]]:
+def COM(fp: BinaryIO) -> Dict[str, Union[int, bytes]]:
     """Return a dict containing COM data.
 
     See ISO/IEC 10918-1 Section B.2.4.5.
@@ -105,25 +190,20 @@ def COM(fp: BinaryIO) -> Dict[str, Union[int, str]]:
         * ``Lc`` : comment data segment length
         * ``Cm`` : comment bytes
     """
-    length = unpack(">H", fp.read(2))[0]
-    comment = unpack("{}s".format(length - 2), fp.read(length - 2))[0]
+    return _from_fp(fp, COM_from)
 
-    return {"Lc": length, "Cm": comment}
 
-
-def DAC(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
-    """Return a dict containing DAC segment data.
+def DAC_from(buf: Any, offset: int) -> Tuple[Dict[str, Union[int, List[int]]], int]:
+    """Return a dict containing DAC segment data and the offset to the end of it.
 
     See ISO/IEC 10918-1 Section B.2.4.3.
 
-    After returning, `fp` will be positioned at the end of the current marker
-    segment.
-
     Parameters
     ----------
-    fp : file-life
-        A file-like positioned at the start of the length byte for the current
-        marker segment.
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
 
     Returns
     -------
@@ -134,26 +214,30 @@ def DAC(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
         * ``Tc`` : table class (0 for DC or lossless, 1 for AC)
         * ``Tb`` : arithmetic coding conditioning table destination identifier
         * ``Cs`` : conditioning table value
+    int
+        The offset to the end of the segment.
     """
-    length = unpack(">H", fp.read(2))[0]
+    (length,) = unpack_from(">H", buf, offset)
+    offset += 2
     bytes_to_read = length - 2
 
     tc, tb, cs = [], [], []
     while bytes_to_read > 0:
-        _tc, _tb = split_byte(fp.read(1))
-        cs.append(unpack(">B", fp.read(1))[0])
-        tc.append(_tc)
-        tb.append(_tb)
+        value, _cs = unpack_from(">BB", buf, offset)
+        tc.append(value >> 4)
+        tb.append(value & 0x0F)
+        cs.append(_cs)
 
+        offset += 2
         bytes_to_read -= 2
 
-    return {"La": length, "Tc": tc, "Tb": tb, "Cs": cs}
+    return {"La": length, "Tc": tc, "Tb": tb, "Cs": cs}, offset
 
 
-def DHT(fp: BinaryIO) -> Dict[str, Union[int, List[int], Any]]:
-    """Return a dict containing DHT segment data.
+def DAC(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
+    """Return a dict containing DAC segment data.
 
-    See ISO/IEC 10918-1 Section B.2.4.2.
+    See ISO/IEC 10918-1 Section B.2.4.3.
 
     After returning, `fp` will be positioned at the end of the current marker
     segment.
@@ -164,6 +248,33 @@ def DHT(fp: BinaryIO) -> Dict[str, Union[int, List[int], Any]]:
         A file-like positioned at the start of the length byte for the current
         marker segment.
 
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``La`` : arithmetic coding conditioning definition length
+        * ``Tc`` : table class (0 for DC or lossless, 1 for AC)
+        * ``Tb`` : arithmetic coding conditioning table destination identifier
+        * ``Cs`` : conditioning table value
+    """
+    return _from_fp(fp, DAC_from)
+
+
+def DHT_from(
+    buf: Any, offset: int
+) -> Tuple[Dict[str, Union[int, List[int], Any]], int]:
+    """Return a dict containing DHT segment data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.2.4.2.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
     Returns
     -------
     dict
@@ -177,42 +288,43 @@ def DHT(fp: BinaryIO) -> Dict[str, Union[int, List[int], Any]]:
           list *BITS*
         * ``Vij`` : value associated with each Huffman code of length *i*,
           equivalent to *HUFFVAL*
+    int
+        The offset to the end of the segment.
     """
-    length = unpack(">H", fp.read(2))[0]
+    (length,) = unpack_from(">H", buf, offset)
+    offset += 2
     bytes_to_read = length - 2
 
     tc, th, li = [], [], []
-    vij: Dict[Tuple[int, int], Dict[int, Tuple[int]]] = {}
+    vij: Dict[Tuple[int, int], Dict[int, Tuple[int, ...]]] = {}
     while bytes_to_read > 0:
-        _tc, _th = split_byte(fp.read(1))
+        # li (BITS) is the number of codes for each code length, from 1 to 16
+        value, *_li = unpack_from(">17B", buf, offset)
+        _tc, _th = value >> 4, value & 0x0F
         tc.append(_tc)
         th.append(_th)
-
-        bytes_to_read -= 1
-
-        # li (BITS) is the number of codes for each code length, from 1 to 16
-        _li = unpack(">16B", fp.read(16))
-        bytes_to_read -= 16
+        offset += 17
+        bytes_to_read -= 17
 
         # vij is a list of the 8-bit symbols values (HUFFVAL), each of which
         #   is assigned a Huffman code.
         _vij = {}
-        for ii in range(16):
-            nr = _li[ii]
+        for ii, nr in enumerate(_li, 1):
             if nr:
-                _vij[ii + 1] = unpack(f">{nr}B", fp.read(nr))
+                _vij[ii] = unpack_from(f">{nr}B", buf, offset)
+                offset += nr
                 bytes_to_read -= nr
 
-        li.append(_li)
+        li.append(tuple(_li))
         vij[(_tc, _th)] = _vij
 
-    return {"Lh": length, "Tc": tc, "Th": th, "Li": li, "Vij": vij}
+    return {"Lh": length, "Tc": tc, "Th": th, "Li": li, "Vij": vij}, offset
 
 
-def DNL(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
-    """Return a dict containing DNL segment data.
+def DHT(fp: BinaryIO) -> Dict[str, Union[int, List[int], Any]]:
+    """Return a dict containing DHT segment data.
 
-    See ISO/IEC 10918-1 Section B.2.5.
+    See ISO/IEC 10918-1 Section B.2.4.2.
 
     After returning, `fp` will be positioned at the end of the current marker
     segment.
@@ -223,6 +335,35 @@ def DNL(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
         A file-like positioned at the start of the length byte for the current
         marker segment.
 
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Lh`` : Huffman table definition length
+        * ``Tc`` : table class (0 for DC or lossless, 1 for AC)
+        * ``Th`` : Huffman table destination identifier, one of four possible
+          destinations at the decoder into which the table shall be installed
+        * ``Li`` : number of Huffman codes of length *i*, equivalent to the
+          list *BITS*
+        * ``Vij`` : value associated with each Huffman code of length *i*,
+          equivalent to *HUFFVAL*
+    """
+    return _from_fp(fp, DHT_from)
+
+
+def DNL_from(buf: Any, offset: int) -> Tuple[Dict[str, int], int]:
+    """Return a dict containing DNL segment data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.2.5.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
     Returns
     -------
     dict
@@ -230,17 +371,18 @@ def DNL(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
 
         * ``Ld`` : DNL segment length
         * ``NL`` : number of lines in the frame
+    int
+        The offset to the end of the segment.
     """
-    length = unpack(">H", fp.read(2))[0]
-    nr_lines = unpack(">H", fp.read(2))[0]
+    length, nr_lines = unpack_from(">HH", buf, offset)
 
-    return {"Ld": length, "NL": nr_lines}
+    return {"Ld": length, "NL": nr_lines}, offset + 4
 
 
-def DQT(fp: BinaryIO) -> Dict[str, Union[int, List[int], List[List[int]]]]:
-    """Return a dict containing DQT segment data.
+def DNL(fp: BinaryIO) -> Dict[str, int]:
+    """Return a dict containing DNL segment data.
 
-    See ISO/IEC 10918-1 Section B.2.4.1.
+    See ISO/IEC 10918-1 Section B.2.5.
 
     After returning, `fp` will be positioned at the end of the current marker
     segment.
@@ -251,6 +393,31 @@ def DQT(fp: BinaryIO) -> Dict[str, Union[int, List[int], List[List[int]]]]:
         A file-like positioned at the start of the length byte for the current
         marker segment.
 
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Ld`` : DNL segment length
+        * ``NL`` : number of lines in the frame
+    """
+    return _from_fp(fp, DNL_from)
+
+
+def DQT_from(
+    buf: Any, offset: int
+) -> Tuple[Dict[str, Union[int, List[int], List[List[int]]]], int]:
+    """Return a dict containing DQT segment data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.2.4.1.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
     Returns
     -------
     dict
@@ -260,14 +427,19 @@ def DQT(fp: BinaryIO) -> Dict[str, Union[int, List[int], List[List[int]]]]:
         * ``Pq`` : quantization table element precision
         * ``Tq`` : quantization table destination identifier
         * ``Qk`` : quantization table element
+    int
+        The offset to the end of the segment.
     """
     # length is 2 + sum(t=1, N) of (65 + 64 * Pq(t))
-    length = unpack(">H", fp.read(2))[0]
+    (length,) = unpack_from(">H", buf, offset)
+    offset += 2
     bytes_to_read = length - 2
 
     pq, tq, qk = [], [], []
     while bytes_to_read > 0:
-        precision, table_id = split_byte(fp.read(1))
+        (value,) = unpack_from(">B", buf, offset)
+        precision, table_id = value >> 4, value & 0x0F
+        offset += 1
         bytes_to_read -= 1
         pq.append(precision)
         tq.append(table_id)
@@ -276,18 +448,66 @@ def DQT(fp: BinaryIO) -> Dict[str, Union[int, List[int], List[List[int]]]]:
             raise ValueError(f"JPEG 10918 - DQT: invalid precision '{precision}'")
 
         # If Pq is 0, Qk is 8-bit, if Pq is 1, Qk is 16-bit
-        Q_k = []
-        for ii in range(64):
-            if precision == 0:
-                Q_k.append(cast(int, unpack(">B", fp.read(1))[0]))
-                bytes_to_read -= 1
-            elif precision == 1:
-                Q_k.append(cast(int, unpack(">H", fp.read(2))[0]))
-                bytes_to_read -= 2
+        fmt, size = (">64B", 64) if precision == 0 else (">64H", 128)
+        qk.append(list(unpack_from(fmt, buf, offset)))
+        offset += size
+        bytes_to_read -= size
 
-        qk.append(Q_k)
+    return {"Lq": length, "Pq": pq, "Tq": tq, "Qk": qk}, offset
 
-    return {"Lq": length, "Pq": pq, "Tq": tq, "Qk": qk}
+
+def DQT(fp: BinaryIO) -> Dict[str, Union[int, List[int], List[List[int]]]]:
+    """Return a dict containing DQT segment data.
+
+    See ISO/IEC 10918-1 Section B.2.4.1.
+
+    After returning, `fp` will be positioned at the end of the current marker
+    segment.
+
+    Parameters
+    ----------
+    fp : file-life
+        A file-like positioned at the start of the length byte for the current
+        marker segment.
+
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Lq`` : quantization table definition length
+        * ``Pq`` : quantization table element precision
+        * ``Tq`` : quantization table destination identifier
+        * ``Qk`` : quantization table element
+    """
+    return _from_fp(fp, DQT_from)
+
+
+def DRI_from(buf: Any, offset: int) -> Tuple[Dict[str, int], int]:
+    """Return a dict containing DRI segment data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.2.4.4.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Lr`` : DRI segment length
+        * ``Ri`` : restart interval (number of MCU in the restart interval)
+    int
+        The offset to the end of the segment.
+    """
+    length, interval = unpack_from(">HH", buf, offset)
+
+    return {"Lr": length, "Ri": interval}, offset + 4
 
 
 def DRI(fp: BinaryIO) -> Dict[str, int]:
@@ -312,7 +532,35 @@ def DRI(fp: BinaryIO) -> Dict[str, int]:
         * ``Lr`` : DRI segment length
         * ``Ri`` : restart interval (number of MCU in the restart interval)
     """
-    return {"Lr": unpack(">H", fp.read(2))[0], "Ri": unpack(">H", fp.read(2))[0]}
+    return _from_fp(fp, DRI_from)
+
+
+def EXP_from(buf: Any, offset: int) -> Tuple[Dict[str, int], int]:
+    """Return a dict containing EXP segment data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.3.3.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Le`` : EXP segment length
+        * ``Eh`` : expand horizontally
+        * ``Ev`` : expand vertically
+    int
+        The offset to the end of the segment.
+    """
+    length, value = unpack_from(">HB", buf, offset)
+
+    return {"Le": length, "Eh": value >> 4, "Ev": value & 0x0F}, offset + 3
 
 
 def EXP(fp: BinaryIO) -> Dict[str, int]:
@@ -338,25 +586,22 @@ def EXP(fp: BinaryIO) -> Dict[str, int]:
         * ``Eh`` : expand horizontally
         * ``Ev`` : expand vertically
     """
-    length = unpack(">H", fp.read(2))[0]
-    eh, ev = split_byte(unpack(">B", fp.read(1))[0])
-
-    return {"Le": length, "Eh": eh, "Ev": ev}
+    return _from_fp(fp, EXP_from)
 
 
-def SOF(fp: BinaryIO) -> Dict[str, Union[int, Dict[int, Dict[str, int]]]]:
-    """Return a dict containing SOF header data.
+def SOF_from(
+    buf: Any, offset: int
+) -> Tuple[Dict[str, Union[int, Dict[int, Dict[str, int]]]], int]:
+    """Return a dict containing SOF header data and the offset to the end of it.
 
     See ISO/IEC 10918-1 Section B.2.2.
 
-    After returning, `fp` will be positioned at the end of the current marker
-    segment.
-
     Parameters
     ----------
-    fp : file-life
-        A file-like positioned at the start of the length byte for the current
-        marker segment.
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
 
     Returns
     -------
@@ -372,30 +617,25 @@ def SOF(fp: BinaryIO) -> Dict[str, Union[int, Dict[int, Dict[str, int]]]]:
         * ``Hi`` : horizontal sampling factor
         * ``Vi`` : vertical sampling factor
         * ``Tqi`` : quantization table destination selector
+    int
+        The offset to the end of the segment.
     """
-    (length, precision, nr_lines, samples_per_line, nr_components) = unpack(
-        ">HBHHB", fp.read(8)
+    (length, precision, nr_lines, samples_per_line, nr_components) = unpack_from(
+        ">HBHHB", buf, offset
     )
+    offset += 8
 
     component_id = {}
-    # horizontal_sampling_factor = []
-    # vertical_sampling_factor = []
-    # quantisation_selector = []
     for ii in range(nr_components):
-        _ci = unpack(">B", fp.read(1))[0]
-        _hor, _vert = split_byte(fp.read(1))
-        # horizontal_sampling_factor.append(_hor)
-        # vertical_sampling_factor.append(_vert)
-        _tqi = unpack(">B", fp.read(1))[0]
-        # quantisation_selector.append(_tqi)
-
+        _ci, value, _tqi = unpack_from(">BBB", buf, offset)
+        offset += 3
         component_id[_ci] = {
-            "Hi": _hor,
-            "Vi": _vert,
+            "Hi": value >> 4,
+            "Vi": value & 0x0F,
             "Tqi": _tqi,
         }
 
-    return {
+    info: Dict[str, Union[int, Dict[int, Dict[str, int]]]] = {
         "Lf": length,
         "P": precision,
         "Y": nr_lines,
@@ -404,11 +644,13 @@ def SOF(fp: BinaryIO) -> Dict[str, Union[int, Dict[int, Dict[str, int]]]]:
         "Ci": component_id,
     }
 
+    return info, offset
 
-def SOS(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
-    """Return a dict containing SOS header data.
 
-    See ISO/IEC 10918-1 Section B.2.3.
+def SOF(fp: BinaryIO) -> Dict[str, Union[int, Dict[int, Dict[str, int]]]]:
+    """Return a dict containing SOF header data.
+
+    See ISO/IEC 10918-1 Section B.2.2.
 
     After returning, `fp` will be positioned at the end of the current marker
     segment.
@@ -419,6 +661,36 @@ def SOS(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
         A file-like positioned at the start of the length byte for the current
         marker segment.
 
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Lf`` : frame header length
+        * ``P`` : sample precision
+        * ``Y`` : number of lines
+        * ``X`` : number of samples per line
+        * ``Nf`` : number of image components in frame
+        * ``Ci`` : component identifier
+        * ``Hi`` : horizontal sampling factor
+        * ``Vi`` : vertical sampling factor
+        * ``Tqi`` : quantization table destination selector
+    """
+    return _from_fp(fp, SOF_from)
+
+
+def SOS_from(buf: Any, offset: int) -> Tuple[Dict[str, Union[int, List[int]]], int]:
+    """Return a dict containing SOS header data and the offset to the end of it.
+
+    See ISO/IEC 10918-1 Section B.2.3.
+
+    Parameters
+    ----------
+    buf : buffer
+        The buffer containing the segment.
+    offset : int
+        The offset to the length parameter of the current marker segment.
+
     Returns
     -------
     dict
@@ -439,21 +711,24 @@ def SOS(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
         * ``Al`` : successive approximation bit position low or point transform
           Shall be set to 0 for sequential DCT. In lossless mode specifies
           the point transform Pt.
+    int
+        The offset to the end of the segment.
     """
-    (length, nr_components) = unpack(">HB", fp.read(3))
+    (length, nr_components) = unpack_from(">HB", buf, offset)
+    offset += 3
 
     csj, tdj, taj = [], [], []
     for ii in range(nr_components):
-        _cs = unpack(">B", fp.read(1))[0]
+        _cs, value = unpack_from(">BB", buf, offset)
+        offset += 2
         csj.append(_cs)
-        _td, _ta = split_byte(fp.read(1))
-        tdj.append(_td)
-        taj.append(_ta)
+        tdj.append(value >> 4)
+        taj.append(value & 0x0F)
 
-    (ss, se) = unpack(">BB", fp.read(2))
-    ah, al = split_byte(fp.read(1))
+    (ss, se, value) = unpack_from(">BBB", buf, offset)
+    offset += 3
 
-    return {
+    info: Dict[str, Union[int, List[int]]] = {
         "Ls": length,
         "Ns": nr_components,
         "Csj": csj,
@@ -461,10 +736,50 @@ def SOS(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
         "Taj": taj,
         "Ss": ss,
         "Se": se,
-        "Ah": ah,
-        "Al": al,
+        "Ah": value >> 4,
+        "Al": value & 0x0F,
     }
 
+    return info, offset
+
+
+def SOS(fp: BinaryIO) -> Dict[str, Union[int, List[int]]]:
+    """Return a dict containing SOS header data.
+
+    See ISO/IEC 10918-1 Section B.2.3.
+
+    After returning, `fp` will be positioned at the end of the current marker
+    segment.
+
+    Parameters
+    ----------
+    fp : file-life
+        A file-like positioned at the start of the length byte for the current
+        marker segment.
+
+    Returns
+    -------
+    dict
+        A dict with keys:
+
+        * ``Ls`` : scan header length
+        * ``Ns`` : number of image components in scan
+        * ``Csj`` : scan component selector
+        * ``Tdj`` : DC entropy coding table destination selector.
+        * ``Taj`` : AC entropy coding table destination selector. Set to 0 for
+          lossless.
+        * ``Ss`` : start of spectral or predictor selection. Shall be 0 for
+          sequential DCT, for lossless this is the predictor.
+        * ``Se`` : end of spectral selection. Shall be 63 for sequential DCT.
+          In lossless this has no meaning and shall be set to 0.
+        * ``Ah`` : successive approximation bit position high. In lossless
+          this has no meaning and shall be set to 0.
+        * ``Al`` : successive approximation bit position low or point transform
+          Shall be set to 0 for sequential DCT. In lossless mode specifies
+          the point transform Pt.
+    """
+    return _from_fp(fp, SOS_from)
+
 
 def skip(fp: BinaryIO) -> None:
     """Skip the next N - 2 bytes.
@@ -482,3 +797,18 @@ def skip(fp: BinaryIO) -> None:
     """
     length = unpack(">H", fp.read(2))[0]
     fp.seek(length - 2, 1)
+
+
+# The buffer parser for each file-like parser
+BUFFER_PARSERS: Dict[Parser, BufferParser] = {
+    APP: APP_from,
+    COM: COM_from,
+    DAC: DAC_from,
+    DHT: DHT_from,
+    DNL: DNL_from,
+    DQT: DQT_from,
+    DRI: DRI_from,
+    EXP: EXP_from,
+    SOF: SOF_from,
+    SOS: SOS_from,
+}
@@ -0,0 +1,324 @@
+"""Typed representations of the marker segments in 10918 JPEG data.
+
+Each marker segment in :attr:`JPEG.info<pylibjpeg.tools.s10918.JPEG.info>`
+is represented by a :class:`Segment`, or a subclass of it with the parsed
+values as attributes for the SOFn, DHP, SOS, DHT, DQT, DRI, DNL and EXP
+segments. Values that are derived from a segment, such as the MCU geometry of
+a frame, are computed when the segment is created.
+
+.. versionadded:: 2.2
+"""
+
+from math import ceil
+from typing import Any, Dict, List, Tuple, Type
+
+
+# The SOFn markers for the lossless processes
+LOSSLESS_FRAMES = ("SOF3", "SOF7", "SOF11", "SOF15")
+
+
+class Segment:
+    """A marker segment in 10918 JPEG data.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    name : str
+        The name of the marker, such as ``"SOF0"``.
+    offset : int
+        The offset to the marker.
+    marker : int
+        The marker, such as ``0xFFC0``.
+    fill_bytes : int
+        The number of fill bytes before the marker.
+    info : dict
+        The parsed marker segment, as in
+        :attr:`JPEG.info<pylibjpeg.tools.s10918.JPEG.info>`.
+    """
+
+    __slots__ = ("name", "offset", "marker", "fill_bytes", "info")
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        self.name = name
+        self.offset = offset
+        self.marker = marker
+        self.fill_bytes = fill_bytes
+        self.info = info
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        """Return the segment's key in ``JPEG.info``."""
+        return (self.name, self.offset)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name} at offset {self.offset}>"
+
+
+class SOFSegment(Segment):
+    """A SOFn or DHP marker segment.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    precision : int
+        The sample precision, P.
+    rows : int
+        The number of lines, Y.
+    columns : int
+        The number of samples per line, X.
+    components : dict[int, tuple[int, int, int]]
+        The horizontal and vertical sampling factors and quantization table
+        destination of each component as ``{Ci: (Hi, Vi, Tqi)}``.
+    max_h : int
+        The maximum horizontal sampling factor, Hmax.
+    max_v : int
+        The maximum vertical sampling factor, Vmax.
+    mcu_width : int
+        The width of an MCU of an interleaved scan in samples, or of a data
+        unit if there's only one component.
+    mcu_height : int
+        The height of an MCU in samples.
+    mcus_per_line : int
+        The number of MCUs in each line of MCUs.
+    mcu_rows : int
+        The number of lines of MCUs, ``0`` if `rows` is ``0``.
+    nr_mcus : int
+        The total number of MCUs.
+    """
+
+    __slots__ = (
+        "precision",
+        "rows",
+        "columns",
+        "components",
+        "max_h",
+        "max_v",
+        "mcu_width",
+        "mcu_height",
+        "mcus_per_line",
+        "mcu_rows",
+        "nr_mcus",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        super().__init__(name, offset, marker, fill_bytes, info)
+        self.precision: int = info["P"]
+        self.rows: int = info["Y"]
+        self.columns: int = info["X"]
+        self.components: Dict[int, Tuple[int, int, int]] = {
+            ci: (v["Hi"], v["Vi"], v["Tqi"]) for ci, v in info["Ci"].items()
+        }
+        self.max_h: int = max((v[0] for v in self.components.values()), default=1)
+        self.max_v: int = max((v[1] for v in self.components.values()), default=1)
+
+        # The data unit is a sample for lossless and an 8 x 8 block for DCT
+        unit = 1 if name in LOSSLESS_FRAMES else 8
+        self.mcu_width: int = unit * self.max_h if len(self.components) > 1 else unit
+        self.mcu_height: int = unit * self.max_v if len(self.components) > 1 else unit
+        self.mcus_per_line: int = ceil(self.columns / self.mcu_width)
+        self.mcu_rows: int = ceil(self.rows / self.mcu_height)
+        self.nr_mcus: int = self.mcus_per_line * self.mcu_rows
+
+
+class SOSSegment(Segment):
+    """A SOS marker segment and its scan.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    components : list[tuple[int, int, int]]
+        The component selector and DC and AC entropy coding table
+        destinations for each component in the scan as ``(Csj, Tdj, Taj)``.
+    ss : int
+        The start of spectral or predictor selection, Ss.
+    se : int
+        The end of spectral selection, Se.
+    ah : int
+        The successive approximation bit position high, Ah.
+    al : int
+        The successive approximation bit position low or point transform,
+        Al.
+    nr_restarts : int
+        The number of RSTn markers in the scan.
+    """
+
+    __slots__ = ("components", "ss", "se", "ah", "al", "nr_restarts")
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        super().__init__(name, offset, marker, fill_bytes, info)
+        self.components: List[Tuple[int, int, int]] = list(
+            zip(info["Csj"], info["Tdj"], info["Taj"])
+        )
+        self.ss: int = info["Ss"]
+        self.se: int = info["Se"]
+        self.ah: int = info["Ah"]
+        self.al: int = info["Al"]
+        self.nr_restarts = sum(
+            1 for key in info if isinstance(key, tuple) and key[0] != "ENC"
+        )
+
+
+class DHTSegment(Segment):
+    """A DHT marker segment.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    tables : list[tuple[int, int]]
+        The table class and destination of each Huffman table as
+        ``(Tc, Th)``.
+    """
+
+    __slots__ = ("tables",)
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        super().__init__(name, offset, marker, fill_bytes, info)
+        self.tables: List[Tuple[int, int]] = list(zip(info["Tc"], info["Th"]))
+
+
+class DQTSegment(Segment):
+    """A DQT marker segment.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    tables : list[tuple[int, int]]
+        The element precision and destination of each quantization table as
+        ``(Pq, Tq)``.
+    """
+
+    __slots__ = ("tables",)
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        super().__init__(name, offset, marker, fill_bytes, info)
+        self.tables: List[Tuple[int, int]] = list(zip(info["Pq"], info["Tq"]))
+
+
+class DRISegment(Segment):
+    """A DRI marker segment.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    restart_interval : int
+        The number of MCUs in each restart interval, Ri.
+    """
+
+    __slots__ = ("restart_interval",)
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        super().__init__(name, offset, marker, fill_bytes, info)
+        self.restart_interval: int = info["Ri"]
+
+
+class DNLSegment(Segment):
+    """A DNL marker segment.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    lines : int
+        The number of lines in the frame, NL.
+    """
+
+    __slots__ = ("lines",)
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        super().__init__(name, offset, marker, fill_bytes, info)
+        self.lines: int = info["NL"]
+
+
+class EXPSegment(Segment):
+    """An EXP marker segment.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    expand : tuple[int, int]
+        Whether the reference components are expanded horizontally and
+        vertically, as ``(Eh, Ev)``.
+    """
+
+    __slots__ = ("expand",)
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        marker: int,
+        fill_bytes: int,
+        info: Dict[Any, Any],
+    ) -> None:
+        super().__init__(name, offset, marker, fill_bytes, info)
+        self.expand: Tuple[int, int] = (info["Eh"], info["Ev"])
+
+
+# The segment class to use for each marker, by the first three characters of
+#   the marker name
+SEGMENTS: Dict[str, Type[Segment]] = {
+    "DHP": SOFSegment,
+    "DHT": DHTSegment,
+    "DNL": DNLSegment,
+    "DQT": DQTSegment,
+    "DRI": DRISegment,
+    "EXP": EXPSegment,
+    "SOF": SOFSegment,
+    "SOS": SOSSegment,
+}
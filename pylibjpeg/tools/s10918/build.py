@@ -0,0 +1,639 @@
+"""Build stand-alone 10918 JPEG streams from parts of existing JPEG data.
+
+.. versionadded:: 2.2
+"""
+
+from math import ceil, lcm
+from struct import pack
+from typing import Any, List, NamedTuple, Optional, Tuple, Union, cast
+
+from ._ecs import EncodedSegment
+from ._segments import EXPSegment, SOFSegment, SOSSegment
+from .io import parse_buffer
+from .rep import JPEG
+
+
+# The SOFn markers for the non-hierarchical sequential and lossless processes
+SEQUENTIAL_FRAMES = ("SOF0", "SOF1", "SOF3", "SOF9", "SOF11")
+# The SOFn markers for the progressive processes
+PROGRESSIVE_FRAMES = ("SOF2", "SOF6", "SOF10", "SOF14")
+# The SOFn markers for the differential frames of the hierarchical process
+DIFFERENTIAL_FRAMES = ("SOF5", "SOF6", "SOF7", "SOF13", "SOF14", "SOF15")
+
+
+class Scan(NamedTuple):
+    """A scan in 10918 JPEG data.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    offset : int
+        The offset to the scan's SOS marker.
+    nr_bytes : int
+        The number of bytes from the start of the JPEG data up to the end of
+        the scan's entropy-coded data, which is the number needed to decode
+        the image using only the scans up to and including this one.
+    components : list[int]
+        The component selector of each component in the scan, Csj.
+    ss : int
+        The start of spectral selection, Ss.
+    se : int
+        The end of spectral selection, Se.
+    ah : int
+        The successive approximation bit position high, Ah.
+    al : int
+        The successive approximation bit position low, Al.
+    """
+
+    offset: int
+    nr_bytes: int
+    components: List[int]
+    ss: int
+    se: int
+    ah: int
+    al: int
+
+
+class Strip(NamedTuple):
+    """A horizontal strip of a JPEG image as a stand-alone JPEG.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    row : int
+        The index of the first row of the strip in the image.
+    rows : int
+        The number of rows in the strip.
+    data : bytes
+        The strip as a JPEG.
+    overlap : tuple[int, int]
+        The number of rows in `data` above and below the strip that belong
+        to the neighbouring strips, which are included for chroma subsampled
+        images so the strip is upsampled the same as the full image.
+    """
+
+    row: int
+    rows: int
+    data: bytes
+    overlap: Tuple[int, int] = (0, 0)
+
+
+class Frame(NamedTuple):
+    """A frame in hierarchical 10918 JPEG data.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    offset : int
+        The offset to the frame's SOFn marker.
+    nr_bytes : int
+        The number of bytes from the start of the JPEG data up to the end of
+        the frame's last scan, which is the number needed to decode the
+        image using only the frames up to and including this one.
+    name : str
+        The name of the frame's SOFn marker, such as ``"SOF5"``.
+    rows : int
+        The number of lines in the frame, Y.
+    columns : int
+        The number of samples per line in the frame, X.
+    components : list[int]
+        The component identifier of each component in the frame, Ci.
+    differential : bool
+        ``True`` if the frame is a differential frame, ``False`` otherwise.
+    expand : tuple[int, int]
+        The horizontal and vertical expansion of the reference components,
+        as ``(Eh, Ev)`` from the EXP segment before the frame, or ``(0, 0)``
+        if there isn't one.
+    reference : int | None
+        For differential frames, the index of the most recent frame
+        containing the same components, which are the reference components
+        for this frame. ``None`` for non-differential frames.
+    """
+
+    offset: int
+    nr_bytes: int
+    name: str
+    rows: int
+    columns: int
+    components: List[int]
+    differential: bool
+    expand: Tuple[int, int]
+    reference: Optional[int]
+
+
+class Region(NamedTuple):
+    """Part of a JPEG image as a stand-alone JPEG.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    row : int
+        The index of the first row of the region in the image.
+    column : int
+        The index of the first column of the region in the image.
+    rows : int
+        The number of rows in the region.
+    columns : int
+        The number of columns in the region.
+    data : bytes
+        The region as a JPEG.
+    crop : tuple[slice, slice]
+        The rows and columns of the decoded region that were requested.
+    """
+
+    row: int
+    column: int
+    rows: int
+    columns: int
+    data: bytes
+    crop: Tuple[slice, slice]
+
+
+class _Header:
+    """The marker segments before the scan of a JPEG, used to build new
+    JPEGs from its entropy-coded segments.
+    """
+
+    def __init__(
+        self, buf: Union[bytes, bytearray], frame: SOFSegment, scan: SOSSegment
+    ) -> None:
+        # Marker segments from after the SOI marker to the start of the scan
+        soi = buf.index(b"\xFF\xD8")
+        self.data = bytearray(buf[soi + 2 : scan.offset + 2 + scan.info["Ls"]])
+        # Offset to the Y parameter of the SOFn segment
+        self.offset = frame.offset + 5 - (soi + 2)
+
+    def build(self, rows: int, columns: int, segments: List[memoryview]) -> bytes:
+        """Return a JPEG of the given size containing `segments`, with the
+        RSTn markers renumbered.
+        """
+        self.data[self.offset : self.offset + 4] = pack(">HH", rows, columns)
+        data = bytearray(b"\xFF\xD8")
+        data.extend(self.data)
+        for ii, segment in enumerate(segments):
+            if ii:
+                data.extend(pack(">BB", 0xFF, 0xD0 + (ii - 1) % 8))
+
+            data.extend(segment)
+
+        data.extend(b"\xFF\xD9")
+
+        return bytes(data)
+
+
+def restart_strips(buf: Any, rows: int = 0) -> List[Strip]:
+    """Return the image in `buf` split into strips at its restart markers.
+
+    .. versionadded:: 2.2
+
+    Each strip is a valid JPEG containing whole restart intervals, with a
+    copy of the marker segments before the scan, the number of lines in the
+    SOFn segment changed to the height of the strip and the RSTn markers
+    renumbered from ``RST0``. As the DC predictors (or lossless predictors)
+    are reset at each restart marker, each strip decodes to the
+    corresponding rows of the full image.
+
+    Strips must start at the beginning of a line of MCUs, so the smallest
+    strip covers the least common multiple of the restart interval and the
+    number of MCUs per line.
+
+    The upsampling of chroma subsampled images uses the samples on either
+    side of each row, so for these images each strip's JPEG also contains
+    the smallest strip above and below it, if any, with the number of extra
+    rows given by :attr:`Strip.overlap`.
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The JPEG data, which must use a non-hierarchical sequential DCT or
+        lossless process with a single scan containing all the components
+        and a non-zero restart interval.
+    rows : int, optional
+        The minimum number of rows in each strip, default ``0`` for the
+        smallest strips possible. Strips are sized to contain whole lines of
+        MCUs at restart interval boundaries, so may be larger, and the last
+        strip may be smaller.
+
+    Returns
+    -------
+    list of Strip
+        The strips, in order from the top of the image.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG data can't be split into strips.
+    """
+    buf = _as_buffer(buf)
+    frame, scan, segments, interval = _restart_scan(buf)
+
+    # The smallest strip in MCUs, then the size of each strip in restart
+    #   intervals and rows
+    group = lcm(interval, frame.mcus_per_line)
+    group_rows = group // frame.mcus_per_line * frame.mcu_height
+    nr_groups = max(ceil(rows / group_rows), 1)
+    intervals = nr_groups * group // interval
+    strip_rows = nr_groups * group_rows
+
+    # The number of extra intervals and rows on each side of a strip
+    extra, extra_rows = 0, 0
+    if _is_subsampled(frame):
+        extra, extra_rows = group // interval, group_rows
+
+    header = _Header(buf, frame, scan)
+    strips = []
+    for row, idx in zip(
+        range(0, frame.rows, strip_rows), range(0, len(segments), intervals)
+    ):
+        nr_rows = min(strip_rows, frame.rows - row)
+        start = max(idx - extra, 0)
+        stop = min(idx + intervals + extra, len(segments))
+        above = min(row, extra_rows)
+        below = min(frame.rows - row - nr_rows, extra_rows)
+        data = header.build(
+            above + nr_rows + below, frame.columns, segments[start:stop]
+        )
+        strips.append(Strip(row, nr_rows, data, (above, below)))
+
+    return strips
+
+
+def restart_region(
+    buf: Any, rows: slice = slice(None), cols: slice = slice(None)
+) -> Region:
+    """Return a JPEG containing only the restart intervals that cover part of
+    the image in `buf`.
+
+    .. versionadded:: 2.2
+
+    If the restart interval divides the number of MCUs per line then each
+    line of MCUs has its own restart intervals, and the returned JPEG only
+    contains those that overlap both `rows` and `cols`. Otherwise it
+    contains the smallest set of whole lines of MCUs starting at a restart
+    interval boundary, as with :func:`restart_strips`, that overlap `rows`.
+
+    The upsampling of chroma subsampled images uses the neighbouring
+    samples, so for these images the JPEG also contains one more restart
+    interval, or set of lines of MCUs, on each side of the region that
+    isn't an edge of the image.
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The JPEG data, which must use a non-hierarchical sequential DCT or
+        lossless process with a single scan containing all the components
+        and a non-zero restart interval.
+    rows : slice, optional
+        The rows of the image to cover, default all rows.
+    cols : slice, optional
+        The columns of the image to cover, default all columns.
+
+    Returns
+    -------
+    Region
+        The JPEG covering the region and its position in the image.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG data can't be split into restart intervals or the region
+        is empty.
+    """
+    buf = _as_buffer(buf)
+    frame, scan, segments, interval = _restart_scan(buf)
+
+    r_start, r_stop, r_step = rows.indices(frame.rows)
+    c_start, c_stop, c_step = cols.indices(frame.columns)
+    if r_step < 1 or c_step < 1:
+        raise ValueError("Only positive slice steps are supported")
+
+    if r_start >= r_stop or c_start >= c_stop:
+        raise ValueError("The region to decode is empty")
+
+    # The image is split into bands of whole lines of MCUs that each start
+    #   with a restart interval
+    mcus_per_line = frame.mcus_per_line
+    # Include the neighbouring intervals used when upsampling
+    extra = 1 if _is_subsampled(frame) else 0
+    if mcus_per_line % interval == 0:
+        # Each line of MCUs has its own intervals, so select only those
+        #   covering the columns
+        band_rows = frame.mcu_height
+        per_band = mcus_per_line // interval
+        width = interval * frame.mcu_width
+        first = max(c_start // width - extra, 0)
+        last = min((c_stop - 1) // width + 1 + extra, per_band)
+        column = first * width
+        nr_columns = min(last * width, frame.columns) - column
+    else:
+        group = lcm(interval, mcus_per_line)
+        band_rows = group // mcus_per_line * frame.mcu_height
+        per_band = group // interval
+        first, last = 0, per_band
+        column, nr_columns = 0, frame.columns
+
+    bands = range(
+        max(r_start // band_rows - extra, 0),
+        min((r_stop - 1) // band_rows + 1 + extra, ceil(frame.rows / band_rows)),
+    )
+    selected = [
+        segment
+        for band in bands
+        for segment in segments[band * per_band + first : band * per_band + last]
+    ]
+    row = bands.start * band_rows
+    nr_rows = min(bands.stop * band_rows, frame.rows) - row
+
+    crop = (
+        slice(r_start - row, r_stop - row, r_step),
+        slice(c_start - column, c_stop - column, c_step),
+    )
+    data = _Header(buf, frame, scan).build(nr_rows, nr_columns, selected)
+
+    return Region(row, column, nr_rows, nr_columns, data, crop)
+
+
+def get_scans(buf: Any) -> List[Scan]:
+    """Return the scans in the JPEG data in `buf`.
+
+    .. versionadded:: 2.2
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The JPEG data.
+
+    Returns
+    -------
+    list of Scan
+        The scans, in the order they appear in `buf`.
+    """
+    return _get_scans(JPEG(parse_buffer(_as_buffer(buf), ecs_views=True, lazy=True)))
+
+
+def truncate_scans(buf: Any, nr_scans: int) -> bytes:
+    """Return the JPEG data in `buf` with only its first `nr_scans` scans.
+
+    .. versionadded:: 2.2
+
+    With a progressive JPEG each scan refines the image, so the returned
+    data decodes to a lower quality version of the image that only needs
+    part of `buf` to be read and entropy decoded.
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The JPEG data, which must use a progressive process.
+    nr_scans : int
+        The number of scans to keep, must be at least 1.
+
+    Returns
+    -------
+    bytes
+        The JPEG data up to the end of the last scan to keep, followed by an
+        EOI marker.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG data isn't progressive or has fewer than `nr_scans`
+        scans.
+    """
+    buf = _as_buffer(buf)
+    jpg = JPEG(parse_buffer(buf, ecs_views=True, lazy=True))
+    frame = jpg.frame
+    if frame is None:
+        raise ValueError("No SOFn marker found in the JPEG data")
+
+    if frame.name not in PROGRESSIVE_FRAMES:
+        raise ValueError(f"Only progressive JPEG data is supported, not '{frame.name}'")
+
+    scans = _get_scans(jpg)
+    if not 1 <= nr_scans <= len(scans):
+        raise ValueError(
+            f"'nr_scans' must be between 1 and {len(scans)}, the number of scans "
+            "in the JPEG data"
+        )
+
+    return bytes(buf[: scans[nr_scans - 1].nr_bytes]) + b"\xFF\xD9"
+
+
+def get_frames(buf: Any) -> List[Frame]:
+    """Return the frames in the hierarchical JPEG data in `buf`.
+
+    .. versionadded:: 2.2
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The JPEG data. Non-hierarchical JPEG data has a single frame.
+
+    Returns
+    -------
+    list of Frame
+        The frames, in the order they appear in `buf`.
+    """
+    jpg = JPEG(parse_buffer(_as_buffer(buf), ecs_views=True, lazy=True))
+    return _get_frames(jpg)
+
+
+def truncate_frames(buf: Any, nr_frames: int) -> bytes:
+    """Return the hierarchical JPEG data in `buf` with only its first
+    `nr_frames` frames.
+
+    .. versionadded:: 2.2
+
+    The size of the image in the DHP segment is changed to that of the last
+    frame to keep. If only the first frame is kept, and it contains all the
+    components of the image, then the DHP segment is removed so the returned
+    data is non-hierarchical and may be decoded by more decoders.
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The JPEG data, which must use a hierarchical process.
+    nr_frames : int
+        The number of frames to keep, must be at least 1.
+
+    Returns
+    -------
+    bytes
+        The JPEG data up to the end of the last frame to keep, followed by an
+        EOI marker.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG data isn't hierarchical or has fewer than `nr_frames`
+        frames.
+    """
+    buf = _as_buffer(buf)
+    jpg = JPEG(parse_buffer(buf, ecs_views=True, lazy=True))
+    if not jpg.is_hierarchical:
+        raise ValueError("Only hierarchical JPEG data is supported")
+
+    frames = _get_frames(jpg)
+    if not 1 <= nr_frames <= len(frames):
+        raise ValueError(
+            f"'nr_frames' must be between 1 and {len(frames)}, the number of "
+            "frames in the JPEG data"
+        )
+
+    last = frames[nr_frames - 1]
+    dhp = cast(SOFSegment, jpg.get_segments("DHP")[0])
+    data = bytearray(buf[: last.nr_bytes])
+    if nr_frames == 1 and set(last.components) == set(dhp.components):
+        # Remove the DHP segment, any fill bytes before it are still valid
+        del data[dhp.offset : dhp.offset + 2 + dhp.info["Lf"]]
+    else:
+        # Offset to the Y parameter of the DHP segment
+        offset = dhp.offset + 5
+        data[offset : offset + 4] = pack(">HH", last.rows, last.columns)
+
+    data.extend(b"\xFF\xD9")
+
+    return bytes(data)
+
+
+def _as_buffer(buf: Any) -> Union[bytes, bytearray]:
+    """Return `buf` as a :class:`bytes` or :class:`bytearray`."""
+    if isinstance(buf, (bytes, bytearray)):
+        return buf
+
+    return memoryview(buf).cast("B").tobytes()
+
+
+def _is_subsampled(frame: SOFSegment) -> bool:
+    """Return ``True`` if the components of `frame` have different sampling
+    factors.
+    """
+    return len({(h, v) for h, v, _ in frame.components.values()}) > 1
+
+
+def _encoded_segments(scan: SOSSegment) -> List[EncodedSegment]:
+    """Return the entropy-coded segments in `scan`."""
+    return [
+        cast(EncodedSegment, value)
+        for key, value in scan.info.items()
+        if isinstance(key, tuple) and key[0] == "ENC"
+    ]
+
+
+def _restart_scan(
+    buf: Union[bytes, bytearray],
+) -> Tuple[SOFSegment, SOSSegment, List[memoryview], int]:
+    """Return the frame, scan, entropy-coded segments and restart interval of
+    a JPEG that can be split at its restart markers.
+    """
+    jpg = JPEG(parse_buffer(buf, ecs_views=True, lazy=True))
+    frame, scan = _get_scan(jpg)
+
+    interval = jpg.restart_interval
+    if not interval:
+        raise ValueError("The JPEG data has no restart intervals")
+
+    if frame.rows == 0:
+        raise ValueError("JPEG data using a DNL segment is not supported")
+
+    segments = [x.raw for x in _encoded_segments(scan)]
+    if len(segments) != jpg.nr_restart_intervals:
+        raise ValueError(
+            f"The scan has {len(segments)} restart intervals but "
+            f"{jpg.nr_restart_intervals} were expected"
+        )
+
+    return frame, scan, segments, interval
+
+
+def _get_frames(jpg: JPEG) -> List[Frame]:
+    """Return the frames in `jpg`."""
+    frames: List[Frame] = []
+    expand = (0, 0)
+    for segment in jpg.segments:
+        if isinstance(segment, EXPSegment):
+            expand = segment.expand
+        elif isinstance(segment, SOFSegment) and segment.name != "DHP":
+            differential = segment.name in DIFFERENTIAL_FRAMES
+            components = list(segment.components)
+            reference = None
+            if differential:
+                reference = next(
+                    (
+                        idx
+                        for idx in range(len(frames) - 1, -1, -1)
+                        if set(components) & set(frames[idx].components)
+                    ),
+                    None,
+                )
+
+            frames.append(
+                Frame(
+                    segment.offset,
+                    segment.offset + 2 + segment.info["Lf"],
+                    segment.name,
+                    segment.rows,
+                    segment.columns,
+                    components,
+                    differential,
+                    expand,
+                    reference,
+                )
+            )
+            expand = (0, 0)
+        elif isinstance(segment, SOSSegment) and frames:
+            frames[-1] = frames[-1]._replace(nr_bytes=_scan_end(segment))
+
+    return frames
+
+
+def _get_scans(jpg: JPEG) -> List[Scan]:
+    """Return the scans in `jpg`."""
+    scans = []
+    for segment in jpg.get_segments("SOS"):
+        scan = cast(SOSSegment, segment)
+        end = _scan_end(scan)
+        components = [x[0] for x in scan.components]
+        scans.append(
+            Scan(scan.offset, end, components, scan.ss, scan.se, scan.ah, scan.al)
+        )
+
+    return scans
+
+
+def _scan_end(scan: SOSSegment) -> int:
+    """Return the offset to the end of the entropy-coded data of `scan`."""
+    segments = _encoded_segments(scan)
+    if segments:
+        return segments[-1].offset + segments[-1].length
+
+    return scan.offset + 2 + cast(int, scan.info["Ls"])
+
+
+def _get_scan(jpg: JPEG) -> Tuple[SOFSegment, SOSSegment]:
+    """Return the frame and scan of a single scan sequential JPEG."""
+    frame: Optional[SOFSegment] = jpg.frame
+    if frame is None:
+        raise ValueError("No SOFn marker found in the JPEG data")
+
+    if jpg.is_hierarchical or frame.name not in SEQUENTIAL_FRAMES:
+        raise ValueError(
+            f"Only non-hierarchical sequential and lossless JPEG data is "
+            f"supported, not '{frame.name}'"
+        )
+
+    scans = jpg.get_segments("SOS")
+    if len(scans) != 1:
+        raise ValueError(
+            f"Only JPEG data with a single scan is supported, not {len(scans)}"
+        )
+
+    scan = cast(SOSSegment, scans[0])
+    if len(scan.components) != len(frame.components):
+        raise ValueError("The scan doesn't contain all of the image components")
+
+    return frame, scan
+
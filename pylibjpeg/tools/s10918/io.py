@@ -1,145 +1,542 @@
 """"""
 
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+import io
 import logging
-from struct import unpack
-from typing import BinaryIO, Any, Callable, cast, Dict, Tuple
+import mmap
+from struct import unpack_from
+from typing import BinaryIO, Any, Dict, Iterator, Optional, Tuple, Union, cast
 
+import numpy as np
+
+from ..reader import CachedReader, RangeReader
+from ._ecs import EncodedSegment, SegmentCache
 from ._markers import MARKERS
+from ._parsers import BUFFER_PARSERS, Parser
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Buffers that support searching and slicing to bytes
+SearchableBuffer = Union[bytes, bytearray, mmap.mmap]
+
+
+def parse(
+    fp: BinaryIO, ecs_views: bool = False, lazy: bool = False
+) -> Union[Dict[Tuple[str, int], Any], "SegmentIndex"]:
+    """Return a JPEG but don't decode yet.
+
+    .. versionchanged:: 2.2
+
+        The data is now parsed using :func:`parse_buffer`, with files
+        memory-mapped rather than read, and added the `ecs_views` and `lazy`
+        keyword parameters.
+
+    Parameters
+    ----------
+    fp : file-like
+        A file-like positioned at the start of the JPEG data, after returning
+        it will be positioned at the end of the parsed data.
+    ecs_views : bool, optional
+        If ``True`` then reference the entropy-coded segments in the file
+        rather than copying them, see :func:`parse_buffer`. Files are kept
+        memory-mapped until the segments are no longer referenced, other
+        file-likes are read into memory. Default ``False``.
+    lazy : bool, optional
+        If ``True`` then return a :class:`SegmentIndex` that only parses each
+        marker segment when it's accessed, see :func:`parse_buffer`. As with
+        `ecs_views`, files are kept memory-mapped. Default ``False``.
+    """
+    start = fp.tell()
+    try:
+        data: SearchableBuffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # Not a file, or an empty one, the offsets are from the start of `fp`
+        fp.seek(0)
+        data = fp.read()
+
+    info: Union[Dict[Tuple[str, int], Any], SegmentIndex]
+    try:
+        index, end = _parse(data, start, ecs_views)
+        info = index if lazy else dict(index)
+        del index
+    finally:
+        if isinstance(data, mmap.mmap) and not (ecs_views or lazy):
+            try:
+                data.close()
+            except BufferError:
+                # Still referenced by a traceback, closed when released
+                pass
+
+    fp.seek(end)
+
+    return info
+
+
+def parse_buffer(
+    buf: Any, offset: int = 0, ecs_views: bool = False, lazy: bool = False
+) -> Union[Dict[Tuple[str, int], Any], "SegmentIndex"]:
+    """Return the parsed JPEG data in `buf`.
+
+    .. versionadded:: 2.2
+
+    Gives the same result as :func:`parse`, but works directly on the
+    buffer rather than reading from a file-like.
+
+    Parameters
+    ----------
+    buf : bytes, bytearray, mmap.mmap or buffer
+        The JPEG data. Other objects supporting the buffer protocol are
+        copied to :class:`bytes`.
+    offset : int, optional
+        The offset to the start of the JPEG data in `buf`, default ``0``. The
+        offsets of the parsed markers are relative to the start of `buf`.
+    ecs_views : bool, optional
+        If ``False`` (default) then each entropy-coded segment is copied
+        from `buf` as a :class:`bytearray` with the byte stuffing removed.
+        If ``True`` then each is an
+        :class:`~pylibjpeg.tools.s10918.EncodedSegment` referencing its
+        offset and length in `buf` instead, with the byte stuffing only
+        removed when requested and the result kept in a size-limited cache
+        shared by the segments.
+    lazy : bool, optional
+        If ``False`` (default) then parse every marker segment and return a
+        :class:`dict`. If ``True`` then only the position of each marker
+        segment is found and a :class:`SegmentIndex` is returned instead,
+        with the segments parsed when accessed. This is much faster for data
+        with large APPn segments when only a few segments are needed.
+
+    Returns
+    -------
+    dict or SegmentIndex
+        The parsed JPEG data as ``{(marker name, offset): (marker, number of
+        fill bytes, segment data)}``.
+    """
+    if not isinstance(buf, (bytes, bytearray, mmap.mmap)):
+        buf = memoryview(buf).cast("B").tobytes()
+
+    index = _parse(buf, offset, ecs_views)[0]
+
+    return index if lazy else dict(index)
+
+
+def parse_header(reader: RangeReader, offset: int = 0) -> Dict[Tuple[str, int], Any]:
+    """Return the parsed marker segments of JPEG data up to and including the
+    first SOS segment, reading only the bytes needed.
+
+    .. versionadded:: 2.2
+
+    The marker segments are read from `reader` through a
+    :class:`~pylibjpeg.tools.reader.CachedReader`, so the many small reads
+    made while parsing become a few large reads of whole blocks. This is
+    suited to JPEG data in remote storage, where only the header is needed
+    and each read has a fixed cost.
+
+    Parameters
+    ----------
+    reader : RangeReader
+        An object with a ``read_at(offset, size)`` method returning the
+        JPEG data, such as a :class:`~pylibjpeg.tools.reader.FileReader`.
+        Readers that aren't a
+        :class:`~pylibjpeg.tools.reader.CachedReader` are wrapped in one.
+    offset : int, optional
+        The offset to the start of the JPEG data, default ``0``.
 
-def parse(fp: BinaryIO) -> Dict[Tuple[str, int], Any]:
-    """Return a JPEG but don't decode yet."""
-    _fill_bytes = 0
-    while fp.read(1) == b"\xff":
-        _fill_bytes += 1
-        pass
+    Returns
+    -------
+    dict
+        The parsed marker segments as ``{(marker name, offset): (marker,
+        number of fill bytes, segment data)}``, as with :func:`parse`
+        except the SOS segment data has no entropy-coded segments. If the
+        data has no scans then the segments up to and including the EOI
+        marker are returned.
+    """
+    if not isinstance(reader, CachedReader):
+        reader = CachedReader(reader)
 
-    fp.seek(-2, 1)
+    def skip_fill(offset: int) -> int:
+        while reader.read_at(offset, 1) == b"\xFF":
+            offset += 1
 
-    # Confirm SOI marker
-    if fp.read(2) != b"\xFF\xD8":
+        return offset
+
+    # Skip any fill bytes, the last 0xFF is part of the SOI marker but counted
+    start = offset
+    offset = skip_fill(start)
+    _fill_bytes = offset - start
+    offset -= 1
+    if offset < start or reader.read_at(offset, 2) != b"\xFF\xD8":
         raise ValueError("SOI marker not found")
 
-    info: Dict[Tuple[str, int], Tuple[int, int, Any]] = {
-        ("SOI", fp.tell() - 2): (unpack(">H", b"\xFF\xD8")[0], _fill_bytes, {})
-    }
+    info: Dict[Tuple[str, int], Any] = {("SOI", offset): (0xFFD8, _fill_bytes, {})}
+    offset += 2
+
+    while True:
+        # Skip fill, the last 0xFF is part of the marker
+        end = skip_fill(offset)
+        _fill_bytes = max(end - offset - 1, 0)
+        offset = max(end - 1, offset)
+
+        data = reader.read_at(offset, 4)
+        if len(data) < 2 or data[0] != 0xFF:
+            raise ValueError(f"No marker found at offset {offset}")
+
+        (_marker,) = unpack_from(">H", data)
+        if _marker not in MARKERS:
+            raise NotImplementedError(
+                f"Unknown marker 0x{_marker:04X} at offset {offset}"
+            )
+
+        name, _, handler = MARKERS[_marker]
+        if name == "EOI":
+            info[(name, offset)] = (_marker, _fill_bytes, {})
+            break
+
+        if len(data) < 4:
+            raise ValueError(f"Reached the end of the data at offset {offset}")
+
+        (segment_length,) = unpack_from(">H", data, 2)
+        if handler is not None:
+            segment = reader.read_at(offset, 2 + segment_length)
+            parsed, _ = BUFFER_PARSERS[handler](segment, 2)
+            info[(name, offset)] = (_marker, _fill_bytes, parsed)
+
+        offset += 2 + segment_length
+        if name == "SOS":
+            break
+
+    return info
+
+
+def _parse(
+    data: SearchableBuffer, offset: int, ecs_views: bool = False
+) -> Tuple["SegmentIndex", int]:
+    """Return an index of the marker segments in the JPEG `data` and the
+    offset to the end of the parsing.
+
+    Only the marker, offset and number of fill bytes of each segment are
+    recorded, the segments themselves are parsed when accessed.
+
+    Parameters
+    ----------
+    data : bytes, bytearray or mmap.mmap
+        The buffer containing the JPEG data.
+    offset : int
+        The offset to the start of the JPEG data.
+    ecs_views : bool, optional
+        If ``True`` then reference the entropy-coded segments rather than
+        copying them.
+    """
+    length = len(data)
+
+    # Skip any fill bytes, the last 0xFF is part of the SOI marker but counted
+    start = offset
+    offset = _skip_fill(data, start)
+    _fill_bytes = offset - start
+    offset -= 1
+    if offset < start or data[offset : offset + 2] != b"\xFF\xD8":
+        raise ValueError("SOI marker not found")
 
-    END_OF_FILE = False
+    index = SegmentIndex(data, ecs_views)
+    index._append(0xFFD8, offset, _fill_bytes)
+    offset += 2
 
     while True:
-        _fill_bytes = 0
-
-        # Skip fill
-        next_byte = fp.read(1)
-        while next_byte == b"\xFF":
-            _fill_bytes += 1
-            next_byte = fp.read(1)
-
-        # Remove the byte thats actually part of the marker
-        if _fill_bytes:
-            _fill_bytes -= 1
-
-        fp.seek(-2, 1)
-
-        _marker = unpack(">H", fp.read(2))[0]
-
-        if _marker in MARKERS:
-            name, description, handler = MARKERS[_marker]
-            key = (name, fp.tell() - 2)
-            if name not in ["SOS", "EOI"]:
-                if handler is None:
-                    length = unpack(">H", fp.read(2))[0] - 2
-                    fp.seek(length, 1)
-                    continue
-
-                info[key] = (_marker, _fill_bytes, handler(fp))
-
-            elif name == "SOS":
-                # SOS's info dict contains an extra 'encoded_data' keys
-                # which use RSTN@offset and ENC@offset
-                handler = cast(Callable, handler)
-                info[key] = (_marker, _fill_bytes, handler(fp))
-
-                encoded_data = bytearray()
-                _enc_start = fp.tell()
-
-                while True:
-                    _enc_key = ("ENC", _enc_start - 2)
-                    prev_byte = fp.read(1)
-                    if prev_byte == b"":
-                        END_OF_FILE = True
-                        break
-                    elif prev_byte != b"\xFF":
-                        encoded_data.extend(prev_byte)
-                        continue
-
-                    # To get here next_byte must be 0xFF
-                    # If the next byte is 0x00 then keep reading
-                    # If the next byte is 0xFF then keep reading until
-                    #   a non-0xFF byte is found
-                    # If the marker is a RST marker then keep reading
-                    # Otherwise rewind to the start of the fill bytes and break
-
-                    next_byte = fp.read(1)
-                    if next_byte == b"\x00":
-                        # Skip padding bytes
-                        # The previous byte wasn't added so do it now
-                        encoded_data.extend(prev_byte)
-                        # encoded_data.extend(next_byte)
-                        continue
-
-                    # To get here next_byte must be non-padding (non 0x00)
-                    #   so we must be at the end of the encoded data
-                    info[key][2].update({_enc_key: encoded_data})
-                    encoded_data = bytearray()
-
-                    # The number of 0xFF bytes before the marker
-                    #   i.e. 0xFF 0xFF 0xFF 0xD9 is 2 fill bytes
-                    _sos_fill_bytes = 0
-                    # While we still have 0xFF bytes
-                    while next_byte == b"\xFF":
-                        _sos_fill_bytes += 1
-                        next_byte = fp.read(1)
-
-                    # Check to see if marker is RST_m
-                    if next_byte in [
-                        b"\xD0",
-                        b"\xD1",
-                        b"\xD2",
-                        b"\xD3",
-                        b"\xD4",
-                        b"\xD5",
-                        b"\xD6",
-                        b"\xD7",
-                    ]:
-                        _sos_marker = unpack(">H", b"\xFF" + next_byte)[0]
-                        _sos_marker, _, _ = MARKERS[_sos_marker]
-                        _sos_key = (_sos_marker, fp.tell() - 2)
-                        info[key][2].update({_sos_key: None})
-
-                        _enc_start = fp.tell()
-                        continue
-
-                    # End of the current scan, rewind and break
-                    # Back up to the start of the 0xFF
-                    # Currently position at first byte after marker
-                    fp.seek(-2 - _sos_fill_bytes, 1)
-                    break
-
-            elif name == "EOI":
-                info[key] = (_marker, _fill_bytes, {})
+        # Skip fill, the last 0xFF is part of the marker
+        end = _skip_fill(data, offset)
+        _fill_bytes = max(end - offset - 1, 0)
+        offset = end - 1 if end < length else length - 2
+
+        (_marker,) = unpack_from(">H", data, offset)
+        if _marker not in MARKERS:
+            raise NotImplementedError(
+                f"Unknown marker 0x{_marker:04X} at offset {offset}"
+            )
+
+        name, _, handler = MARKERS[_marker]
+        if name == "EOI":
+            index._append(_marker, offset, _fill_bytes)
+            offset += 2
+            break
+
+        (segment_length,) = unpack_from(">H", data, offset + 2)
+        if handler is not None:
+            index._append(_marker, offset, _fill_bytes)
+
+        offset += 2 + segment_length
+        if name == "SOS":
+            offset, complete = index._scans.scan_end(offset)
+            if not complete:
+                # Reached the end of the data while in the scan
                 break
 
-        else:
-            if not END_OF_FILE:
-                print(
-                    "Unknown marker {} at offset {}".format(hex(_marker), fp.tell() - 2)
+    return index, offset
+
+
+class SegmentIndex(Mapping[Tuple[str, int], Tuple[int, int, Any]]):
+    """A lazily parsed index of the marker segments in JPEG data.
+
+    .. versionadded:: 2.2
+
+    A mapping with the same keys and values as the :class:`dict` returned by
+    :func:`parse`, ``{(marker name, offset): (marker, number of fill bytes,
+    segment data)}``. Only the marker, offset and number of fill bytes for
+    each segment are stored up front, in compact arrays, with the segment
+    data parsed the first time it's accessed and then kept.
+    """
+
+    def __init__(self, data: SearchableBuffer, ecs_views: bool = False) -> None:
+        """Create a new index.
+
+        Parameters
+        ----------
+        data : bytes, bytearray or mmap.mmap
+            The buffer containing the JPEG data.
+        ecs_views : bool, optional
+            If ``True`` then reference the entropy-coded segments rather than
+            copying them.
+        """
+        self._data = data
+        self._ecs_views = ecs_views
+        self._markers = array("H")
+        self._offsets = array("Q")
+        self._fill_bytes = array("L")
+        self._parsed: Dict[int, Tuple[int, int, Any]] = {}
+        self._scan_index: Optional[_ScanIndex] = None
+
+    def _append(self, marker: int, offset: int, fill_bytes: int) -> None:
+        """Add a marker segment to the index."""
+        self._markers.append(marker)
+        self._offsets.append(offset)
+        self._fill_bytes.append(fill_bytes)
+
+    def __getitem__(self, key: Tuple[str, int]) -> Tuple[int, int, Any]:
+        """Return the parsed marker segment for `key`."""
+        try:
+            name, offset = key
+            idx = bisect_left(self._offsets, offset)
+            if self._offsets[idx] != offset or self.name(idx) != name:
+                raise KeyError(key)
+        except (IndexError, TypeError, ValueError):
+            raise KeyError(key)
+
+        if idx not in self._parsed:
+            self._parsed[idx] = (
+                self._markers[idx],
+                self._fill_bytes[idx],
+                self._parse_segment(idx),
+            )
+
+        return self._parsed[idx]
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        """Yield the keys in order of offset."""
+        for idx, offset in enumerate(self._offsets):
+            yield (self.name(idx), offset)
+
+    def __len__(self) -> int:
+        """Return the number of marker segments."""
+        return len(self._offsets)
+
+    def name(self, idx: int) -> str:
+        """Return the name of the marker for the segment at `idx`."""
+        return MARKERS[self._markers[idx]][0]
+
+    @property
+    def nr_parsed(self) -> int:
+        """Return the number of marker segments that have been parsed."""
+        return len(self._parsed)
+
+    def _parse_segment(self, idx: int) -> Dict[Any, Any]:
+        """Return the data for the marker segment at `idx`."""
+        name, _, handler = MARKERS[self._markers[idx]]
+        if name in ("SOI", "EOI"):
+            return {}
+
+        offset = self._offsets[idx] + 2
+        segment, offset = BUFFER_PARSERS[cast(Parser, handler)](self._data, offset)
+        if name == "SOS":
+            # SOS's info dict contains extra keys for the encoded data and
+            #   RST markers, which use ENC@offset and RSTn@offset
+            self._scans.parse_scan(offset, segment)
+
+        return cast(Dict[Any, Any], segment)
+
+    @property
+    def _scans(self) -> "_ScanIndex":
+        """Return the index of the entropy-coded data."""
+        if self._scan_index is None:
+            # Index from the first SOS onwards
+            sos = self._markers.index(0xFFDA)
+            (length,) = unpack_from(">H", self._data, self._offsets[sos] + 2)
+            cache = SegmentCache(self._data) if self._ecs_views else None
+            self._scan_index = _ScanIndex(
+                self._data, self._offsets[sos] + 2 + length, cache
+            )
+
+        return self._scan_index
+
+
+def _skip_fill(data: SearchableBuffer, offset: int) -> int:
+    """Return the offset to the first non-0xFF byte at or after `offset`."""
+    length = len(data)
+    while offset < length and data[offset] == 0xFF:
+        offset += 1
+
+    return offset
+
+
+class _ScanIndex:
+    """An index of the markers and byte stuffing in entropy-coded data.
+
+    Every 0xFF byte from the start of the first scan to the end of the data
+    is found in a single vectorized pass and each run of consecutive 0xFF
+    bytes is classified by the byte that follows it as either byte stuffing
+    (a single 0xFF followed by 0x00), an RSTn marker or a marker that ends
+    the scan. Leading 0xFF bytes in a run are fill bytes.
+    """
+
+    def __init__(
+        self,
+        data: SearchableBuffer,
+        offset: int,
+        cache: Optional[SegmentCache] = None,
+    ) -> None:
+        """Create a new index.
+
+        Parameters
+        ----------
+        data : bytes, bytearray or mmap.mmap
+            The buffer containing the JPEG data.
+        offset : int
+            The offset to the start of the first entropy-coded segment.
+        cache : pylibjpeg.tools.s10918.SegmentCache, optional
+            If used then add the entropy-coded segments as
+            :class:`~pylibjpeg.tools.s10918.EncodedSegment` references
+            sharing `cache` rather than copying them.
+        """
+        self.cache = cache
+        self.data = np.frombuffer(data, dtype="u1")
+        self.length = length = len(self.data)
+
+        # The offsets to every 0xFF and the runs of consecutive 0xFF
+        ff = np.flatnonzero(self.data[offset:] == 0xFF) + offset
+        breaks = np.flatnonzero(np.diff(ff) != 1)
+        self.ff = ff
+        self.starts = ff[np.concatenate(([0], breaks + 1))] if ff.size else ff
+        self.lasts = ff[np.concatenate((breaks, [ff.size - 1]))] if ff.size else ff
+        nr_bytes = self.lasts - self.starts + 1
+        # The index of the run each 0xFF belongs to
+        self.runs = np.repeat(np.arange(self.starts.size), nr_bytes)
+
+        # The byte following each run, or -1 at the end of the data
+        follows = self.lasts + 1
+        self.codes = np.full(follows.size, -1, dtype="i2")
+        available = follows < length
+        self.codes[available] = self.data[follows[available]]
+
+        single = nr_bytes == 1
+        self.stuffing = single & (self.codes == 0)
+        # A single 0xFF at the end of the data isn't a marker
+        marker = ~self.stuffing & ~(single & (self.codes == -1))
+        self.rst = marker & (self.codes >= 0xD0) & (self.codes <= 0xD7)
+        self.ends = self.starts[marker & ~self.rst]
+
+    def scan_end(self, offset: int) -> Tuple[int, bool]:
+        """Return the end of the scan starting at `offset`.
+
+        Returns
+        -------
+        int, bool
+            The offset to the first fill byte before the marker that ends the
+            scan and ``True``, or the length of the data and ``False`` if the
+            end of the data was reached first.
+        """
+        idx = np.searchsorted(self.ends, offset)
+        if idx < self.ends.size:
+            return int(self.ends[idx]), True
+
+        return self.length, False
+
+    def parse_scan(self, offset: int, segment: Dict[Any, Any]) -> Tuple[int, bool]:
+        """Add the entropy-coded data for a scan to its SOS `segment`.
+
+        Each entropy-coded segment is added with the byte stuffing removed,
+        or as an :class:`~pylibjpeg.tools.s10918.EncodedSegment` if the index
+        has a cache, using the key ``("ENC", offset - 2)``, where `offset` is
+        the start of the entropy-coded segment, and each RSTn marker as
+        ``("RSTn", offset)``.
+
+        Parameters
+        ----------
+        offset : int
+            The offset to the start of the first entropy-coded segment.
+        segment : dict
+            The SOS segment data.
+
+        Returns
+        -------
+        int, bool
+            The offset to the first fill byte before the marker that ends the
+            scan and ``True``, or the length of the data and ``False`` if the
+            end of the data was reached first.
+        """
+        end, complete = self.scan_end(offset)
+
+        # The runs of 0xFF within the scan
+        first, last = np.searchsorted(self.starts, (offset, end))
+        rst = self.rst[first:last]
+        rst_starts = self.starts[first:last][rst]
+        rst_lasts = self.lasts[first:last][rst]
+        stuffed = self.starts[first:last][self.stuffing[first:last]] + 1
+
+        # The start and end of each entropy-coded segment
+        starts = np.concatenate(([offset], rst_lasts + 2))
+        stops = np.concatenate((rst_starts, [end]))
+        nr_stuffed = np.searchsorted(stuffed, stops) - np.searchsorted(stuffed, starts)
+        # Each segment is followed by an RSTn marker, except the last
+        markers = [
+            (f"RST{code - 0xD0}", rst_offset)
+            for code, rst_offset in zip(
+                self.codes[first:last][rst].tolist(), rst_lasts.tolist()
+            )
+        ]
+        # The last segment is only added if the end of the scan was found
+        nr_segments = starts.size if complete else starts.size - 1
+
+        if self.cache is not None:
+            cache = self.cache
+            lengths = (stops - starts).tolist()
+            sizes = (stops - starts - nr_stuffed).tolist()
+            for ii, start in enumerate(starts[:nr_segments].tolist()):
+                segment[("ENC", start - 2)] = EncodedSegment(
+                    cache, start, lengths[ii], sizes[ii]
                 )
-                raise NotImplementedError
-            else:
-                break
+                if ii < len(markers):
+                    segment[markers[ii]] = None
 
-    return info
+            return end, complete
+
+        # Remove the stuffed 0x00 bytes and the RSTn markers and their fill
+        #   bytes with a single gather
+        keep = np.ones(end - offset, dtype=bool)
+        keep[stuffed - offset] = False
+        ff_first, ff_last = np.searchsorted(self.ff, (offset, end))
+        in_rst = self.rst[self.runs[ff_first:ff_last]]
+        keep[self.ff[ff_first:ff_last][in_rst] - offset] = False
+        keep[rst_lasts + 1 - offset] = False
+        encoded = memoryview(self.data[offset:end][keep].tobytes())
+
+        # The segment boundaries in `encoded`
+        removed = np.concatenate(([0], np.cumsum(rst_lasts + 2 - rst_starts)))
+        stops_enc = (stops - offset - removed - np.cumsum(nr_stuffed)).tolist()
+        starts_enc = [0] + stops_enc[:-1]
+        for ii, start in enumerate(starts[:nr_segments].tolist()):
+            a, b = starts_enc[ii], stops_enc[ii]
+            segment[("ENC", start - 2)] = bytearray(encoded[a:b])
+            if ii < len(markers):
+                segment[markers[ii]] = None
+
+        return end, complete
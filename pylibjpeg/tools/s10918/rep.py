@@ -1,6 +1,9 @@
-from typing import Any, cast, Dict, Tuple, List
+from functools import cached_property
+from math import ceil
+from typing import Any, cast, Dict, Iterator, List, Mapping, Optional, Tuple
 
 from ._printers import PRINTERS
+from ._segments import SEGMENTS, DNLSegment, Segment, SOFSegment, SOSSegment
 
 
 class JPEG:
@@ -51,33 +54,101 @@ class JPEG:
     28: Lossless, Huffman, 2 to 16-bit
     29: Lossless, arithmetic, 2 to 16-bit
 
+    .. versionchanged:: 2.2
+
+        The marker segments are now represented by
+        :class:`~pylibjpeg.tools.s10918.Segment` objects ordered by offset,
+        and :attr:`info` is a read-only view of them. Added :attr:`segments`,
+        :meth:`get_segments`, :attr:`frame`, :attr:`process`,
+        :attr:`restart_interval`, :attr:`nr_mcus` and
+        :attr:`nr_restart_intervals`.
     """
 
-    def __init__(self, meta: Dict[Tuple[str, int], Any]) -> None:
+    def __init__(self, meta: Mapping[Tuple[str, int], Any]) -> None:
         """Initialise a new JPEG.
 
         Parameters
         ----------
-        meta : dict
-            The parsed JPEG image.
+        meta : dict or pylibjpeg.tools.s10918.SegmentIndex
+            The parsed JPEG image. Each marker segment is only converted to a
+            :class:`~pylibjpeg.tools.s10918.Segment` when first used.
         """
-        self.info = meta
+        self._meta = meta
+        keys = list(meta)
+        if any(a[1] > b[1] for a, b in zip(keys, keys[1:])):
+            keys.sort(key=lambda x: x[1])
+
+        # The marker segments ordered by offset and their positions
+        self._keys: List[Tuple[str, int]] = keys
+        self._segments: List[Optional[Segment]] = [None] * len(keys)
+        self._positions = {key: idx for idx, key in enumerate(keys)}
+        self._by_name: Dict[str, List[int]] = {}
+        for idx, (name, _) in enumerate(keys):
+            self._by_name.setdefault(name, []).append(idx)
+
+        # Positions of the marker segments containing a given name
+        self._matches: Dict[str, List[int]] = {}
+        self._info = _InfoView(self)
 
     @property
     def columns(self) -> int:
         """Return the number of columns in the image as an int."""
-        keys = self.get_keys("SOF")
-        if keys:
-            return cast(int, self.info[keys[0]][2]["X"])
+        return self._get_frame("the number of columns in the image").columns
+
+    @property
+    def frame(self) -> Optional[SOFSegment]:
+        """Return the first SOFn marker segment, or ``None`` if there isn't
+        one.
+
+        .. versionadded:: 2.2
+        """
+        positions = self._find("SOF")
+        if positions:
+            return cast(SOFSegment, self._segment(positions[0]))
+
+        return None
 
-        raise ValueError(
-            "Unable to get the number of columns in the image as no SOFn "
-            "marker was found"
-        )
+    def _get_frame(self, description: str) -> SOFSegment:
+        """Return the first SOFn marker segment or raise an exception."""
+        frame = self.frame
+        if frame is None:
+            raise ValueError(f"Unable to get {description} as no SOFn marker was found")
+
+        return frame
+
+    def _find(self, name: str) -> List[int]:
+        """Return the positions of the segments with marker containing `name`."""
+        if name not in self._matches:
+            self._matches[name] = sorted(
+                idx
+                for marker, positions in self._by_name.items()
+                if name in marker
+                for idx in positions
+            )
+
+        return self._matches[name]
 
     def get_keys(self, name: str) -> List[Any]:
         """Return a list of keys with marker containing `name`."""
-        return [mm for mm in self._keys if name in mm[0]]
+        return [self._keys[idx] for idx in self._find(name)]
+
+    def get_segments(self, name: str) -> List[Segment]:
+        """Return a list of marker segments with marker containing `name`.
+
+        .. versionadded:: 2.2
+        """
+        return [self._segment(idx) for idx in self._find(name)]
+
+    @property
+    def info(self) -> Mapping[Tuple[str, int], Any]:
+        """Return a read-only view of the marker segments as ``{(marker name,
+        offset): (marker, number of fill bytes, segment data)}``.
+
+        .. versionchanged:: 2.2
+
+            Changed to a view of the marker segments.
+        """
+        return self._info
 
     @property
     def is_baseline(self) -> bool:
@@ -96,7 +167,7 @@ class JPEG:
         Hierarchical baseline processes are:
             16, 17, 20, 21, 24, 25.
         """
-        return "SOF0" in self.markers
+        return "SOF0" in self._by_name
 
     @property
     def is_extended(self) -> bool:
@@ -116,10 +187,7 @@ class JPEG:
             16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27
         """
         extended_markers = ("SOF1", "SOF9", "SOF5", "SOF13")
-        if [mm for mm in extended_markers if mm in self.markers]:
-            return True
-
-        return False
+        return any(mm in self._by_name for mm in extended_markers)
 
     @property
     def is_hierarchical(self) -> bool:
@@ -131,7 +199,7 @@ class JPEG:
         * Decoders shall process scans with 1, 2, 3 and 4 components
         * Interleaved and non-interleaved scans
         """
-        return "DHP" in self.markers
+        return "DHP" in self._by_name
 
     @property
     def is_lossless(self) -> bool:
@@ -151,60 +219,128 @@ class JPEG:
             28, 29
         """
         lossless_markers = ("SOF3", "SOF11")  # , 'SOF7', 'SOF15')
-        if [mm for mm in lossless_markers if mm in self.markers]:
-            return True
-
-        return False
+        return any(mm in self._by_name for mm in lossless_markers)
 
     @property
     def is_sequential(self) -> bool:
         return not self.is_hierarchical
 
-    @property
-    def _keys(self) -> List[Tuple[str, int]]:
-        """Return a list of the info keys, ordered by offset."""
-        return sorted(self.info.keys(), key=lambda x: x[1])
-
     @property
     def markers(self) -> List[str]:
         """Return a list of the found JPEG markers, ordered by offset."""
         return [mm[0] for mm in self._keys]
 
+    @cached_property
+    def nr_mcus(self) -> int:
+        """Return the number of MCUs in an interleaved scan of the frame.
+
+        .. versionadded:: 2.2
+
+        If the number of lines in the SOFn segment is ``0`` then the number
+        from the DNL segment is used instead.
+        """
+        frame = self._get_frame("the number of MCUs")
+        if frame.rows == 0 and "DNL" in self._by_name:
+            dnl = cast(DNLSegment, self.get_segments("DNL")[0])
+            return frame.mcus_per_line * ceil(dnl.lines / frame.mcu_height)
+
+        return frame.nr_mcus
+
+    @cached_property
+    def nr_restart_intervals(self) -> int:
+        """Return the number of restart intervals in an interleaved scan of
+        the frame, or ``0`` if restart intervals aren't used.
+
+        .. versionadded:: 2.2
+        """
+        if not self.restart_interval:
+            return 0
+
+        return ceil(self.nr_mcus / self.restart_interval)
+
     @property
     def precision(self) -> int:
         """Return the precision of the sample as an int."""
-        keys = self.get_keys("SOF")
-        if keys:
-            return cast(int, self.info[keys[0]][2]["P"])
+        return self._get_frame("the sample precision of the image").precision
 
-        raise ValueError(
-            "Unable to get the sample precision of the image as no SOFn "
-            "marker was found"
-        )
+    @cached_property
+    def process(self) -> int:
+        """Return the JPEG coding process as an int between 1 and 29.
+
+        .. versionadded:: 2.2
+
+        The process is determined by the first SOFn marker, the precision,
+        whether the JPEG is hierarchical and, for progressive processes,
+        whether successive approximation is used by any of the scans.
+        """
+        frame = self._get_frame("the coding process")
+        sof = int(frame.name[3:])
+        arithmetic = int(sof >= 8)
+        extended = 2 * int(frame.precision > 8)
+        hierarchical = self.is_hierarchical
+        kind = sof % 4
+        if kind == 3:
+            # Lossless
+            return (28 if hierarchical else 14) + arithmetic
+
+        if kind == 2:
+            # Progressive, either spectral selection only or full progression
+            full = any(
+                cast(SOSSegment, scan).ah or cast(SOSSegment, scan).al
+                for scan in self.get_segments("SOS")
+            )
+            process = 10 if full else 6
+            return process + 14 * hierarchical + arithmetic + extended
+
+        # Sequential
+        if sof == 0 and not hierarchical:
+            return 1
+
+        return (16 if hierarchical else 2) + arithmetic + extended
+
+    @cached_property
+    def restart_interval(self) -> int:
+        """Return the restart interval from the first DRI segment, or ``0``
+        if there isn't one.
+
+        .. versionadded:: 2.2
+        """
+        positions = self._find("DRI")
+        if positions:
+            return cast(int, self._segment(positions[0]).info["Ri"])
+
+        return 0
 
     @property
     def rows(self) -> int:
         """Return the number of rows in the image as an int."""
-        keys = self.get_keys("SOF")
-        if keys:
-            return cast(int, self.info[keys[0]][2]["Y"])
-
-        raise ValueError(
-            "Unable to get the number of rows in the image as no SOFn "
-            "marker was found"
-        )
+        return self._get_frame("the number of rows in the image").rows
 
     @property
     def samples(self) -> int:
         """Return the number of components in the JPEG as an int."""
-        keys = self.get_keys("SOF")
-        if keys:
-            return cast(int, self.info[keys[0]][2]["Nf"])
+        frame = self._get_frame("the number of components in the image")
+        return cast(int, frame.info["Nf"])
 
-        raise ValueError(
-            "Unable to get the number of components in the image as no SOFn "
-            "marker was found"
-        )
+    def _segment(self, idx: int) -> Segment:
+        """Return the marker segment at position `idx`."""
+        segment = self._segments[idx]
+        if segment is None:
+            name, offset = key = self._keys[idx]
+            marker, fill_bytes, info = self._meta[key]
+            cls = SEGMENTS.get(name[:3], Segment)
+            segment = cls(name, offset, marker, fill_bytes, info)
+            self._segments[idx] = segment
+
+        return segment
+
+    @property
+    def segments(self) -> List[Segment]:
+        """Return a list of the marker segments, ordered by offset.
+
+        .. versionadded:: 2.2
+        """
+        return [self._segment(idx) for idx in range(len(self._keys))]
 
     @property
     def selection_value(self) -> int:
@@ -226,8 +362,7 @@ class JPEG:
         if not self.is_lossless:
             raise ValueError("Selection value is only available for lossless JPEG")
 
-        sos_markers = [mm for mm in self._keys if "SOS" in mm]
-        return cast(int, self.info[sos_markers[0]][2]["Ss"])
+        return cast(SOSSegment, self.get_segments("SOS")[0]).ss
 
     def __str__(self) -> str:
         """"""
@@ -238,3 +373,20 @@ class JPEG:
             ss.append(printer(marker, offset, info))
 
         return "\n".join(ss)
+
+
+class _InfoView(Mapping[Tuple[str, int], Tuple[int, int, Any]]):
+    """A read-only view of the marker segments in a :class:`JPEG`."""
+
+    def __init__(self, jpg: JPEG) -> None:
+        self._jpg = jpg
+
+    def __getitem__(self, key: Tuple[str, int]) -> Tuple[int, int, Any]:
+        segment = self._jpg._segment(self._jpg._positions[key])
+        return (segment.marker, segment.fill_bytes, segment.info)
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        return iter(self._jpg._keys)
+
+    def __len__(self) -> int:
+        return len(self._jpg._keys)
@@ -0,0 +1,293 @@
+"""Incremental parsing of 10918 JPEG data as it arrives.
+
+.. versionadded:: 2.2
+"""
+
+from struct import unpack_from
+from typing import Any, BinaryIO, Iterator, List, NamedTuple, Optional, cast
+
+from ._markers import MARKERS
+from ._parsers import BUFFER_PARSERS
+
+
+# Markers without a length or segment
+STANDALONE = ("SOI", "EOI", "TEM") + tuple(f"RST{idx}" for idx in range(8))
+
+
+class Event(NamedTuple):
+    """Something found in the JPEG data by a :class:`StreamParser`.
+
+    .. versionadded:: 2.2
+
+    Attributes
+    ----------
+    kind : str
+        One of:
+
+        * ``"segment"``: a marker segment other than SOS or EOI, including
+          SOI, has been parsed.
+        * ``"scan"``: an SOS marker segment has been parsed and the
+          entropy-coded data of the scan follows.
+        * ``"restart"``: an RSTn marker has been found in the entropy-coded
+          data.
+        * ``"eoi"``: the EOI marker has been found and parsing is complete.
+    name : str
+        The name of the marker, such as ``"DQT"`` or ``"RST3"``.
+    offset : int
+        The offset to the marker from the start of the data.
+    marker : int
+        The marker, such as ``0xFFDB``.
+    fill_bytes : int
+        The number of fill bytes before the marker.
+    info : dict
+        The parsed marker segment, the same as the segment data from
+        :func:`~pylibjpeg.tools.s10918.parse` except that of the SOS segment
+        has no entropy-coded data. Empty for markers without a segment.
+    """
+
+    kind: str
+    name: str
+    offset: int
+    marker: int
+    fill_bytes: int
+    info: Any
+
+
+class StreamParser:
+    """An incremental parser for 10918 JPEG data.
+
+    .. versionadded:: 2.2
+
+    The data is passed to :meth:`feed` in chunks of any size, as it's read
+    from a pipe, socket or streaming HTTP response, and the events found in
+    it are returned as soon as enough data has arrived for each, with no
+    need to seek. Only the unparsed part of the current marker segment, at
+    most 65,537 bytes, is kept between calls, and none of the entropy-coded
+    data, so the memory used doesn't depend on the size of the image.
+
+    Examples
+    --------
+
+    >>> parser = StreamParser()
+    >>> for chunk in response.iter_content(65536):
+    ...     for event in parser.feed(chunk):
+    ...         if event.kind == "scan":
+    ...             ...
+    >>> parser.close()
+    """
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        # The offset to the start of `_buf` from the start of the data
+        self._offset = 0
+        self._in_scan = False
+        self._started = False
+        self._done = False
+
+    def close(self) -> None:
+        """Finish parsing.
+
+        Raises
+        ------
+        ValueError
+            If the EOI marker hasn't been reached.
+        """
+        if not self._done:
+            raise ValueError(
+                f"The JPEG data ended at offset {self._offset + len(self._buf)} "
+                "before the EOI marker"
+            )
+
+    @property
+    def done(self) -> bool:
+        """Return ``True`` if the EOI marker has been reached."""
+        return self._done
+
+    def feed(self, chunk: bytes) -> List[Event]:
+        """Parse the next part of the JPEG data.
+
+        Parameters
+        ----------
+        chunk : bytes-like
+            The next part of the JPEG data. Any data after the EOI marker is
+            ignored.
+
+        Returns
+        -------
+        list of Event
+            The events found, in order of their offset.
+
+        Raises
+        ------
+        ValueError
+            If the data doesn't start with an SOI marker or a marker
+            segment is invalid.
+        NotImplementedError
+            If an unknown marker is found.
+        """
+        if self._done:
+            return []
+
+        self._buf += chunk
+        events: List[Event] = []
+        pos = 0
+        while not self._done:
+            if self._in_scan:
+                pos = self._scan(pos, events)
+                if self._in_scan:
+                    break
+            else:
+                end = self._segment(pos, events)
+                if end is None:
+                    break
+
+                pos = end
+
+        # Keep only the unparsed data
+        del self._buf[:pos]
+        self._offset += pos
+        if self._done:
+            self._buf = bytearray()
+
+        return events
+
+    def _scan(self, pos: int, events: List[Event]) -> int:
+        """Find the markers in the entropy-coded data starting at `pos` and
+        return the offset to the unparsed data.
+
+        The scan is complete once a marker other than RSTn is found.
+        """
+        buf = self._buf
+        length = len(buf)
+        while True:
+            start = buf.find(b"\xFF", pos)
+            if start == -1:
+                return length
+
+            # Skip fill, the last 0xFF is part of the marker
+            end = start + 1
+            while end < length and buf[end] == 0xFF:
+                end += 1
+
+            if end == length:
+                # Wait for the byte following the 0xFF
+                return start
+
+            if buf[end] == 0x00:
+                # Byte stuffing
+                pos = end + 1
+            elif 0xD0 <= buf[end] <= 0xD7:
+                marker = 0xFF00 + buf[end]
+                events.append(
+                    Event(
+                        "restart",
+                        MARKERS[marker][0],
+                        self._offset + end - 1,
+                        marker,
+                        end - start - 1,
+                        {},
+                    )
+                )
+                pos = end + 1
+            else:
+                self._in_scan = False
+                return start
+
+    def _segment(self, pos: int, events: List[Event]) -> Optional[int]:
+        """Parse the marker segment at `pos` and return the offset to the
+        end of it, or ``None`` if more data is needed.
+        """
+        buf = self._buf
+        length = len(buf)
+
+        # Skip fill, the last 0xFF is part of the marker
+        end = pos
+        while end < length and buf[end] == 0xFF:
+            end += 1
+
+        if end == length:
+            return None
+
+        offset = end - 1
+        if offset < pos or (not self._started and buf[end] != 0xD8):
+            if not self._started:
+                raise ValueError("SOI marker not found")
+
+            raise ValueError(f"No marker found at offset {self._offset + end}")
+
+        (marker,) = unpack_from(">H", buf, offset)
+        if marker not in MARKERS:
+            raise NotImplementedError(
+                f"Unknown marker 0x{marker:04X} at offset {self._offset + offset}"
+            )
+
+        # The fill bytes before SOI are counted with its 0xFF, as with parse()
+        fill_bytes = end - pos - (1 if self._started else 0)
+        self._started = True
+
+        name, _, handler = MARKERS[marker]
+        info: Any = {}
+        if name in STANDALONE:
+            end = offset + 2
+        else:
+            if length < offset + 4:
+                return None
+
+            (segment_length,) = unpack_from(">H", buf, offset + 2)
+            end = offset + 2 + cast(int, segment_length)
+            if length < end:
+                return None
+
+            if handler is None:
+                # Skip markers that aren't parsed
+                return end
+
+            info, _ = BUFFER_PARSERS[handler](bytes(buf[offset:end]), 2)
+
+        kind = "segment"
+        if name == "SOS":
+            kind = "scan"
+            self._in_scan = True
+        elif name == "EOI":
+            kind = "eoi"
+            self._done = True
+
+        events.append(
+            Event(kind, name, self._offset + offset, marker, fill_bytes, info)
+        )
+
+        return end
+
+
+def parse_stream(fp: BinaryIO, chunk_size: int = 65536) -> Iterator[Event]:
+    """Yield the events in JPEG data read from a file-like without seeking.
+
+    .. versionadded:: 2.2
+
+    Parameters
+    ----------
+    fp : file-like
+        A file-like, such as a pipe or socket file, positioned at the start
+        of the JPEG data. Only its ``read()`` method is used.
+    chunk_size : int, optional
+        The maximum number of bytes to read at a time, default ``65536``.
+
+    Yields
+    ------
+    Event
+        The events found in the data, see :class:`StreamParser`.
+
+    Raises
+    ------
+    ValueError
+        If the data is invalid or ends before the EOI marker.
+    """
+    parser = StreamParser()
+    while not parser.done:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+
+        yield from parser.feed(chunk)
+
+    parser.close()
@@ -0,0 +1,263 @@
+"""Tests for reading JPEG data using range readers."""
+
+import logging
+
+import pytest
+
+from pylibjpeg.tools.jpegio import get_specification, jpgread
+from pylibjpeg.tools.reader import CachedReader, FileReader, RangeReaderIO, ReadStats
+from pylibjpeg.tools.s10918 import parse_buffer, parse_header
+
+from .test_s10918 import EOI, SOF0, SOI, SOS, build, segment
+
+
+class BytesReader:
+    """A range reader for bytes that records the reads made."""
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def read_at(self, offset, size):
+        self.reads.append((offset, size))
+        return self.data[offset : offset + size]
+
+
+class TestFileReader:
+    """Tests for FileReader."""
+
+    def test_read_at(self, tmp_path):
+        """Test reading from a file."""
+        fpath = tmp_path / "test.bin"
+        fpath.write_bytes(bytes(range(256)))
+        with FileReader(fpath) as reader:
+            assert reader.read_at(0, 4) == b"\x00\x01\x02\x03"
+            assert reader.read_at(254, 4) == b"\xFE\xFF"
+            assert reader.read_at(300, 4) == b""
+            assert reader.read_at(10, 0) == b""
+
+            msg = "'offset' and 'size' must not be negative"
+            with pytest.raises(ValueError, match=msg):
+                reader.read_at(-1, 4)
+
+        assert reader._fp.closed
+
+
+class TestCachedReader:
+    """Tests for CachedReader."""
+
+    def test_invalid_raises(self):
+        """Test invalid parameters raise an exception."""
+        with pytest.raises(ValueError, match="'block_size' must be at least 1"):
+            CachedReader(BytesReader(b""), block_size=0)
+
+        with pytest.raises(ValueError, match="'read_ahead' must not be negative"):
+            CachedReader(BytesReader(b""), read_ahead=-1)
+
+        with pytest.raises(ValueError, match="'max_blocks' must be at least 1"):
+            CachedReader(BytesReader(b""), max_blocks=0)
+
+        reader = CachedReader(BytesReader(b""))
+        with pytest.raises(ValueError, match="'offset' and 'size' must not be"):
+            reader.read_at(0, -1)
+
+    def test_blocks(self):
+        """Test small reads are served from whole blocks."""
+        data = bytes(range(256)) * 4
+        src = BytesReader(data)
+        reader = CachedReader(src, block_size=64, read_ahead=0)
+        for offset in range(0, 64, 2):
+            assert reader.read_at(offset, 2) == data[offset : offset + 2]
+
+        assert src.reads == [(0, 64)]
+        assert reader.stats == ReadStats(32, 1, 64)
+        assert reader.read_at(60, 8) == data[60:68]
+        assert src.reads == [(0, 64), (64, 64)]
+
+    def test_coalesce(self):
+        """Test reads of adjacent missing blocks are combined."""
+        data = bytes(range(256)) * 4
+        src = BytesReader(data)
+        reader = CachedReader(src, block_size=64, read_ahead=0)
+        assert reader.read_at(64, 1) == data[64:65]
+        assert reader.read_at(256, 1) == data[256:257]
+        # Blocks 0, 2 and 3 are missing, 1 and 4 are cached
+        assert reader.read_at(10, 300) == data[10:310]
+        assert src.reads == [(64, 64), (256, 64), (0, 64), (128, 128)]
+        assert reader.stats == ReadStats(3, 4, 320)
+
+    def test_read_ahead(self):
+        """Test the blocks after a read are read ahead."""
+        data = bytes(range(256)) * 4
+        src = BytesReader(data)
+        reader = CachedReader(src, block_size=64, read_ahead=2)
+        assert reader.read_at(0, 1) == data[:1]
+        assert reader.read_at(150, 30) == data[150:180]
+        assert src.reads == [(0, 192)]
+        # Read ahead stops at cached blocks
+        assert reader.read_at(256, 1) == data[256:257]
+        assert reader.read_at(200, 1) == data[200:201]
+        assert src.reads == [(0, 192), (256, 192), (192, 64)]
+
+    def test_eof(self):
+        """Test reading past the end of the data."""
+        data = bytes(range(100))
+        src = BytesReader(data)
+        reader = CachedReader(src, block_size=64, read_ahead=4)
+        assert reader.read_at(90, 20) == data[90:]
+        assert src.reads == [(64, 320)]
+        assert reader.read_at(0, 200) == data
+        assert reader.read_at(100, 10) == b""
+        assert reader.read_at(1000, 10) == b""
+        assert reader.read_at(5, 0) == b""
+        assert src.reads == [(64, 320), (0, 64)]
+        assert reader.stats.nbytes == 100
+
+    def test_eof_at_block(self):
+        """Test data that ends at the end of a block."""
+        data = bytes(range(128))
+        src = BytesReader(data)
+        reader = CachedReader(src, block_size=64, read_ahead=0)
+        assert reader.read_at(100, 100) == data[100:]
+        assert reader.read_at(128, 10) == b""
+        assert src.reads == [(64, 192)]
+
+        reader = CachedReader(BytesReader(b""))
+        assert reader.read_at(0, 10) == b""
+
+    def test_eviction(self):
+        """Test the least recently used blocks are evicted."""
+        data = bytes(range(256))
+        src = BytesReader(data)
+        reader = CachedReader(src, block_size=16, read_ahead=0, max_blocks=2)
+        reader.read_at(0, 1)
+        reader.read_at(16, 1)
+        reader.read_at(0, 1)
+        reader.read_at(32, 1)
+        assert list(reader._blocks) == [0, 2]
+        reader.read_at(0, 1)
+        reader.read_at(16, 1)
+        assert src.reads == [(0, 16), (16, 16), (32, 16), (16, 16)]
+
+        # Reads larger than the cache
+        assert reader.read_at(0, 256) == data
+        assert len(reader._blocks) == 2
+
+
+class TestRangeReaderIO:
+    """Tests for RangeReaderIO."""
+
+    def test_read(self):
+        """Test reading and seeking."""
+        data = bytes(range(100))
+        fp = RangeReaderIO(BytesReader(data))
+        assert fp.readable()
+        assert fp.seekable()
+        assert fp.read(10) == data[:10]
+        assert fp.tell() == 10
+        assert fp.seek(-5, 1) == 5
+        assert fp.read() == data[5:]
+        assert fp.seek(98) == 98
+        assert fp.read(10) == data[98:]
+        assert fp.read(10) == b""
+
+        with pytest.raises(ValueError, match="Invalid position -1"):
+            fp.seek(-1)
+
+        with pytest.raises(OSError, match="Seeking from the end isn't"):
+            fp.seek(0, 2)
+
+
+class TestParseHeader:
+    """Tests for parse_header()."""
+
+    def test_parse(self):
+        """Test the segments match those from parse_buffer()."""
+        data = build()
+        info = parse_header(BytesReader(data))
+        full = parse_buffer(data)
+        keys = list(full)[:-1]
+        assert list(info) == keys
+        for key in keys[:-1]:
+            assert info[key] == full[key]
+
+        marker, fill, sos = full[("SOS", 294)]
+        sos = {k: v for k, v in sos.items() if isinstance(k, str)}
+        assert info[("SOS", 294)] == (marker, fill, sos)
+
+    def test_offset(self):
+        """Test parsing from an offset."""
+        data = b"\x00" * 10 + SOI + SOF0 + SOS + b"\x00" + EOI
+        info = parse_header(BytesReader(data), offset=10)
+        assert list(info) == [("SOI", 10), ("SOF0", 12), ("SOS", 25)]
+
+    def test_no_scan(self):
+        """Test parsing data without a scan."""
+        data = SOI + b"\xFF" + SOF0 + EOI
+        info = parse_header(BytesReader(data))
+        assert list(info) == [("SOI", 0), ("SOF0", 3), ("EOI", 16)]
+        assert info[("SOF0", 3)][1] == 1
+
+    def test_invalid_raises(self):
+        """Test invalid data raises an exception."""
+        with pytest.raises(ValueError, match="SOI marker not found"):
+            parse_header(BytesReader(b"\x00\xD8"))
+
+        with pytest.raises(ValueError, match="No marker found at offset 2"):
+            parse_header(BytesReader(SOI + b"\x00\x00"))
+
+        with pytest.raises(ValueError, match="No marker found at offset 15"):
+            parse_header(BytesReader(SOI + SOF0))
+
+        msg = "Reached the end of the data at offset 2"
+        with pytest.raises(ValueError, match=msg):
+            parse_header(BytesReader(SOI + b"\xFF\xC0\x00"))
+
+        msg = "Unknown marker 0xFF00 at offset 2"
+        with pytest.raises(NotImplementedError, match=msg):
+            parse_header(BytesReader(SOI + b"\xFF\x00\x00\x02"))
+
+    def test_minimal_reads(self):
+        """Test the header is parsed using a few large reads."""
+        app1 = segment(0xFFE1, b"Exif\x00\x00" + b"\x00" * 60000)
+        data = SOI + app1 + SOF0 + SOS + b"\x00" * 500000 + EOI
+        src = BytesReader(data)
+        reader = CachedReader(src, block_size=4096)
+        info = parse_header(reader)
+        assert list(info) == [("SOI", 0), ("APP1", 2), ("SOF0", 60012), ("SOS", 60025)]
+        assert reader.stats.fetches == 2
+        assert reader.stats.nbytes < 70000
+        assert reader.stats.requests > 10
+        assert src.reads == [(0, 8192), (8192, 57344)]
+
+
+class TestJPGRead:
+    """Tests for jpgread() and get_specification() with range readers."""
+
+    def test_get_specification(self):
+        """Test the JPEG specification of range readers."""
+        assert get_specification(BytesReader(b"\xFF\xFF" + build())) == "10918"
+        with pytest.raises(ValueError, match="File is not JPEG"):
+            get_specification(BytesReader(b"\x00"))
+
+    def test_jpgread(self, tmp_path, caplog):
+        """Test reading only the header of a file."""
+        app1 = segment(0xFFE1, b"Exif\x00\x00" + b"\x00" * 60000)
+        data = SOI + app1 + SOF0 + SOS + b"\x00" * 500000 + EOI
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(data)
+
+        caplog.set_level(logging.DEBUG, logger="pylibjpeg")
+        with FileReader(fpath) as reader:
+            jpg = jpgread(reader)
+
+        assert (jpg.rows, jpg.columns, jpg.samples) == (16, 32, 1)
+        assert jpg.markers == ["SOI", "APP1", "SOF0", "SOS"]
+        assert "using 1 reads of 131072 bytes" in caplog.text
+
+        # CachedReaders are used as-is
+        reader = CachedReader(BytesReader(data), block_size=1024, read_ahead=0)
+        jpg = jpgread(reader)
+        assert jpg.markers == ["SOI", "APP1", "SOF0", "SOS"]
+        assert reader.stats.fetches == 2
+        assert jpg.info == parse_header(BytesReader(data))
@@ -0,0 +1,1072 @@
+"""Tests for parsing ISO/IEC 10918 JPEG data."""
+
+from io import BytesIO
+import mmap
+from struct import pack
+
+import pytest
+
+from pylibjpeg.tools.jpegio import jpgread
+from pylibjpeg.tools.s10918 import (
+    JPEG,
+    DHTSegment,
+    DQTSegment,
+    DRISegment,
+    EncodedSegment,
+    EXPSegment,
+    Frame,
+    Segment,
+    SegmentIndex,
+    SOFSegment,
+    SOSSegment,
+    Scan,
+    StreamParser,
+    get_frames,
+    get_scans,
+    parse,
+    parse_buffer,
+    parse_stream,
+    restart_region,
+    restart_strips,
+    truncate_frames,
+    truncate_scans,
+)
+from pylibjpeg.tools.s10918._parsers import DHT, DQT, SOF
+
+
+def segment(marker, payload):
+    """Return a marker segment."""
+    return pack(">HH", marker, len(payload) + 2) + payload
+
+
+SOI = b"\xFF\xD8"
+EOI = b"\xFF\xD9"
+APP0 = segment(0xFFE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+COM = segment(0xFFFE, b"Hello")
+DQT8 = segment(0xFFDB, b"\x00" + bytes(range(64)))
+DQT16 = segment(0xFFDB, b"\x11" + pack(">64H", *range(256, 320)))
+# Two tables: DC table 0 with 2 codes of length 2 and AC table 1 with 1 code
+BITS = b"\x00\x02" + b"\x00" * 14
+DHT_ = segment(
+    0xFFC4, b"\x00" + BITS + b"\x03\x04" + b"\x11\x01" + b"\x00" * 15 + b"\x05"
+)
+DRI = segment(0xFFDD, b"\x00\x02")
+SOF0 = segment(0xFFC0, b"\x08\x00\x10\x00\x20\x01\x01\x11\x00")
+SOS = segment(0xFFDA, b"\x01\x01\x01\x00\x3F\x00")
+
+
+def build():
+    """Return a JPEG with fill bytes, byte stuffing and restart markers."""
+    ecs0 = b"\x12\xFF\x00\x34"
+    ecs1 = b"\xFF\x00\xFF\x00\x56"
+    ecs2 = b"\x78"
+    return (
+        b"\xFF"  # Fill byte before SOI
+        + SOI
+        + APP0
+        + COM
+        + b"\xFF\xFF"  # Fill bytes before DQT
+        + DQT8
+        + DQT16
+        + DHT_
+        + DRI
+        + SOF0
+        + SOS
+        + ecs0
+        + b"\xFF\xD0"
+        + ecs1
+        + b"\xFF\xFF\xD1"  # Fill byte before RST1
+        + ecs2
+        + b"\xFF\xFF"  # Fill bytes before EOI
+        + EOI
+    )
+
+
+class TestParseBuffer:
+    """Tests for parse_buffer()."""
+
+    def test_parse(self):
+        """Test the parsed segments."""
+        data = build()
+        info = parse_buffer(data)
+        keys = list(info)
+        assert keys == [
+            ("SOI", 1),
+            ("APP0", 3),
+            ("COM", 21),
+            ("DQT", 32),
+            ("DQT", 101),
+            ("DHT", 234),
+            ("DRI", 275),
+            ("SOF0", 281),
+            ("SOS", 294),
+            ("EOI", 321),
+        ]
+        assert info[("SOI", 1)] == (0xFFD8, 2, {})
+        assert info[("APP0", 3)][2]["Ap"] == APP0[4:]
+        assert info[("COM", 21)] == (0xFFFE, 0, {"Lc": 7, "Cm": b"Hello"})
+
+        marker, fill, dqt = info[("DQT", 32)]
+        assert fill == 2
+        assert dqt == {"Lq": 67, "Pq": [0], "Tq": [0], "Qk": [list(range(64))]}
+        dqt = info[("DQT", 101)][2]
+        assert dqt == {"Lq": 131, "Pq": [1], "Tq": [1], "Qk": [list(range(256, 320))]}
+
+        dht = info[("DHT", 234)][2]
+        assert dht["Tc"] == [0, 1]
+        assert dht["Th"] == [0, 1]
+        assert dht["Li"] == [tuple(BITS), (1,) + (0,) * 15]
+        assert dht["Vij"] == {(0, 0): {2: (3, 4)}, (1, 1): {1: (5,)}}
+
+        assert info[("DRI", 275)][2] == {"Lr": 4, "Ri": 2}
+        assert info[("SOF0", 281)][2] == {
+            "Lf": 11,
+            "P": 8,
+            "Y": 16,
+            "X": 32,
+            "Nf": 1,
+            "Ci": {1: {"Hi": 1, "Vi": 1, "Tqi": 0}},
+        }
+
+        sos = info[("SOS", 294)][2]
+        assert sos["Ns"] == 1
+        assert sos["Csj"] == [1]
+        assert (sos["Ss"], sos["Se"], sos["Ah"], sos["Al"]) == (0, 63, 0, 0)
+        # Entropy-coded segments, with the stuffing removed
+        assert sos[("ENC", 302)] == b"\x12\xFF\x34"
+        assert isinstance(sos[("ENC", 302)], bytearray)
+        assert sos[("RST0", 308)] is None
+        assert sos[("ENC", 308)] == b"\xFF\xFF\x56"
+        assert sos[("RST1", 316)] is None
+        assert sos[("ENC", 316)] == b"\x78"
+        assert info[("EOI", 321)] == (0xFFD9, 2, {})
+
+    def test_sources(self, tmp_path):
+        """Test parsing from different sources gives the same result."""
+        data = build()
+        info = parse_buffer(data)
+        assert parse_buffer(bytearray(data)) == info
+        assert parse_buffer(memoryview(data)) == info
+        assert parse(BytesIO(data)) == info
+
+        # Offsets are from the start of the buffer
+        offset = parse_buffer(b"\x00" * 3 + data, offset=3)
+        assert list(offset) == [(name, idx + 3) for name, idx in info]
+
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(data + b"\x00\x00")
+        with open(fpath, "rb") as f:
+            assert parse(f) == info
+            # Positioned after the EOI marker
+            assert f.tell() == len(data)
+
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            assert parse_buffer(mm) == info
+            mm.close()
+
+        assert jpgread(fpath).info == info
+
+    def test_no_soi_raises(self):
+        """Test an exception is raised if there's no SOI marker."""
+        with pytest.raises(ValueError, match="SOI marker not found"):
+            parse_buffer(b"\xFF\xE0\x00\x02")
+
+        with pytest.raises(ValueError, match="SOI marker not found"):
+            parse_buffer(b"\x00\xFF\xD8")
+
+    def test_unknown_marker_raises(self):
+        """Test an exception is raised for an unknown marker."""
+        msg = "Unknown marker 0xFF00 at offset 2"
+        with pytest.raises(NotImplementedError, match=msg):
+            parse_buffer(SOI + b"\xFF\x00\x00\x00")
+
+    def test_truncated_scan(self):
+        """Test parsing stops if the data ends in a scan."""
+        data = build()
+        info = parse_buffer(data[:306])
+        assert list(info)[-1] == ("SOS", 294)
+        assert ("ENC", 302) not in info[("SOS", 294)][2]
+
+    def test_multiple_scans(self):
+        """Test parsing data with more than one scan."""
+        header = SOI + DQT8 + DHT_ + SOF0
+        data = (
+            header
+            + SOS
+            + b"\x01\x02"  # No 0xFF bytes
+            + SOS
+            + b"\xFF\x00\xFF\xD7\xFF\x00"  # Stuffing either side of RST7
+            + b"\xFF\xD9"
+        )
+        info = parse_buffer(data)
+        assert list(info)[-3:] == [("SOS", 125), ("SOS", 137), ("EOI", 153)]
+        assert info[("SOS", 125)][2][("ENC", 133)] == b"\x01\x02"
+        sos = info[("SOS", 137)][2]
+        assert [k for k in sos if isinstance(k, tuple)] == [
+            ("ENC", 145),
+            ("RST7", 149),
+            ("ENC", 149),
+        ]
+        assert sos[("ENC", 145)] == b"\xFF"
+        assert sos[("ENC", 149)] == b"\xFF"
+
+    def test_trailing_ff(self):
+        """Test a single 0xFF at the end of the data isn't a marker."""
+        data = SOI + SOF0 + SOS + b"\x01\xFF\xD0\x02\xFF"
+        sos = parse_buffer(data)[("SOS", 15)][2]
+        assert sos[("ENC", 23)] == b"\x01"
+        assert sos[("RST0", 26)] is None
+        assert ("ENC", 26) not in sos
+
+
+class TestEncodedSegments:
+    """Tests for parsing with `ecs_views`."""
+
+    def test_views(self):
+        """Test the entropy-coded segments reference the source data."""
+        data = build()
+        info = parse_buffer(data, ecs_views=True)
+        assert info == parse_buffer(data)
+
+        sos = info[("SOS", 294)][2]
+        segments = [sos[k] for k in sos if k[0] == "ENC"]
+        assert all(isinstance(x, EncodedSegment) for x in segments)
+        offsets = [(x.offset, x.length) for x in segments]
+        assert offsets == [(304, 4), (310, 5), (318, 1)]
+        assert [len(x) for x in segments] == [3, 3, 1]
+        assert segments[0].raw == b"\x12\xFF\x00\x34"
+        assert bytes(segments[1]) == b"\xFF\xFF\x56"
+        assert segments[1] != b"\xFF\x00\xFF\x00\x56"
+        assert sos[("RST0", 308)] is None
+        assert sos[("RST1", 316)] is None
+
+        # The truncated scan references the complete segments only
+        sos = parse_buffer(data[:316], ecs_views=True)[("SOS", 294)][2]
+        assert [k for k in sos if isinstance(k, tuple)] == [
+            ("ENC", 302),
+            ("RST0", 308),
+        ]
+
+    def test_cache(self):
+        """Test the unstuffed data is cached and evicted."""
+        sos = parse_buffer(build(), ecs_views=True)[("SOS", 294)][2]
+        segments = [sos[k] for k in sos if k[0] == "ENC"]
+        cache = segments[0].cache
+        assert all(x.cache is cache for x in segments)
+        assert len(cache) == 0
+
+        data = segments[0].unstuffed()
+        assert segments[0].unstuffed() is data
+        assert len(cache) == 1 and cache.nbytes == 3
+
+        # Least recently used are evicted first
+        cache.max_bytes = 6
+        segments[1].unstuffed()
+        segments[0].unstuffed()
+        segments[2].unstuffed()
+        assert len(cache) == 2 and cache.nbytes == 4
+        assert segments[0].unstuffed() is data
+
+        # Segments larger than the cache aren't kept
+        cache.max_bytes = 2
+        cache.clear()
+        assert segments[0] == b"\x12\xFF\x34"
+        assert len(cache) == 0 and cache.nbytes == 0
+
+    def test_jpgread(self, tmp_path):
+        """Test the file is memory-mapped for jpgread()."""
+        data = build()
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(data)
+        jpg = jpgread(fpath, ecs_views=True)
+        assert (jpg.rows, jpg.columns) == (16, 32)
+        assert jpg.info == parse_buffer(data)
+
+        segment = jpg.info[("SOS", 294)][2][("ENC", 302)]
+        assert isinstance(segment.cache.source, mmap.mmap)
+        assert segment == b"\x12\xFF\x34"
+
+        with open(fpath, "rb") as f:
+            info = parse(BytesIO(f.read()), ecs_views=True)
+            f.seek(0)
+            assert info == jpgread(f, ecs_views=True).info
+
+
+class TestSegmentIndex:
+    """Tests for parsing with `lazy`."""
+
+    def test_lazy(self):
+        """Test the segments are only parsed when accessed."""
+        data = build()
+        index = parse_buffer(data, lazy=True)
+        assert isinstance(index, SegmentIndex)
+        assert index.nr_parsed == 0
+        assert list(index) == list(parse_buffer(data))
+        assert len(index) == 10
+        assert index.nr_parsed == 0
+
+        assert index[("DRI", 275)] == (0xFFDD, 0, {"Lr": 4, "Ri": 2})
+        assert index[("DRI", 275)] is index[("DRI", 275)]
+        assert index.nr_parsed == 1
+
+        assert index == parse_buffer(data)
+        assert dict(index) == parse_buffer(data)
+        assert parse_buffer(data, ecs_views=True, lazy=True) == parse_buffer(data)
+
+    def test_missing_key_raises(self):
+        """Test a KeyError is raised for keys that aren't in the index."""
+        index = parse_buffer(build(), lazy=True)
+        for key in (("DRI", 274), ("DQT", 275), ("DRI", 1000), "DRI", None):
+            with pytest.raises(KeyError):
+                index[key]
+
+            assert key not in index
+
+        assert ("DRI", 275) in index
+
+    def test_jpgread(self, tmp_path):
+        """Test only the SOFn segment is parsed for the image properties."""
+        app1 = segment(0xFFE1, b"Exif\x00\x00" + b"\x00" * 60000)
+        data = SOI + app1 + SOF0 + SOS + b"\x00\xFF\xD9"
+        fpath = tmp_path / "test.jpg"
+        fpath.write_bytes(data)
+
+        index = parse_buffer(data, lazy=True)
+        jpg = JPEG(index)
+        assert (jpg.rows, jpg.columns, jpg.samples) == (16, 32, 1)
+        assert jpg.markers == ["SOI", "APP1", "SOF0", "SOS", "EOI"]
+        assert index.nr_parsed == 1
+
+        jpg = jpgread(fpath, lazy=True)
+
+        with open(fpath, "rb") as f:
+            assert jpg.info == parse(f)
+            f.seek(0)
+            assert str(jpg) == str(jpgread(f))
+
+
+def frame(name, precision=8, hierarchical=False, ah=0, al=0):
+    """Return a JPEG with a SOFn and SOS marker segment."""
+    marker = 0xFFC0 + int(name[3:])
+    sof = segment(marker, pack(">BHHB", precision, 16, 32, 1) + b"\x01\x11\x00")
+    sos = segment(0xFFDA, b"\x01\x01\x00\x00\x3F" + bytes([ah << 4 | al]))
+    dhp = segment(0xFFDE, sof[4:]) if hierarchical else b""
+    return parse_buffer(SOI + dhp + sof + sos + b"\x00" + EOI)
+
+
+class TestJPEG:
+    """Tests for the JPEG representation."""
+
+    def test_segments(self):
+        """Test the typed marker segments."""
+        jpg = JPEG(parse_buffer(build(), lazy=True))
+        segments = jpg.segments
+        assert [x.key for x in segments] == list(parse_buffer(build()))
+        assert [type(x) for x in segments] == [
+            Segment,
+            Segment,
+            Segment,
+            DQTSegment,
+            DQTSegment,
+            DHTSegment,
+            DRISegment,
+            SOFSegment,
+            SOSSegment,
+            Segment,
+        ]
+        assert segments[3].tables == [(0, 0)]
+        assert segments[4].tables == [(1, 1)]
+        assert segments[5].tables == [(0, 0), (1, 1)]
+        assert segments[6].restart_interval == 2
+        assert segments[7].components == {1: (1, 1, 0)}
+        sos = segments[8]
+        assert sos.components == [(1, 0, 1)]
+        assert (sos.ss, sos.se, sos.ah, sos.al) == (0, 63, 0, 0)
+        assert sos.nr_restarts == 2
+        assert jpg.get_segments("SOS") == [sos]
+        assert jpg.get_segments("SOF")[0] is jpg.frame is segments[7]
+        assert jpg.get_keys("DQT") == [("DQT", 32), ("DQT", 101)]
+
+        # Compatibility view
+        assert jpg.info == parse_buffer(build())
+        assert jpg.info[("DRI", 275)] == (0xFFDD, 0, {"Lr": 4, "Ri": 2})
+        assert len(jpg.info) == 10
+
+    def test_mcus(self):
+        """Test the MCU geometry."""
+        jpg = JPEG(parse_buffer(build()))
+        assert jpg.restart_interval == 2
+        # One component, so 8 x 8 MCUs
+        assert (jpg.frame.mcu_width, jpg.frame.mcu_height) == (8, 8)
+        assert jpg.nr_mcus == 8
+        assert jpg.nr_restart_intervals == 4
+
+        # Three components with 2 x 2 subsampling
+        components = b"\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+        sof = segment(0xFFC0, pack(">BHHB", 8, 17, 33, 3) + components)
+        jpg = JPEG(parse_buffer(SOI + DRI + sof + EOI))
+        frame = jpg.frame
+        assert (frame.max_h, frame.max_v) == (2, 2)
+        assert (frame.mcu_width, frame.mcu_height) == (16, 16)
+        assert (frame.mcus_per_line, frame.mcu_rows) == (3, 2)
+        assert jpg.nr_mcus == 6
+        assert jpg.nr_restart_intervals == 3
+
+        # Lossless with the number of lines from DNL
+        sof = segment(0xFFC3, pack(">BHHB", 16, 0, 10, 1) + b"\x01\x11\x00")
+        dnl = segment(0xFFDC, b"\x00\x07")
+        jpg = JPEG(parse_buffer(SOI + sof + dnl + EOI))
+        assert (jpg.frame.mcu_width, jpg.frame.mcu_height) == (1, 1)
+        assert jpg.frame.nr_mcus == 0
+        assert jpg.nr_mcus == 70
+        assert jpg.restart_interval == 0
+        assert jpg.nr_restart_intervals == 0
+
+    def test_process(self):
+        """Test the coding process."""
+        for kwargs, process in (
+            ({"name": "SOF0"}, 1),
+            ({"name": "SOF1"}, 2),
+            ({"name": "SOF9"}, 3),
+            ({"name": "SOF1", "precision": 12}, 4),
+            ({"name": "SOF9", "precision": 12}, 5),
+            ({"name": "SOF2"}, 6),
+            ({"name": "SOF10"}, 7),
+            ({"name": "SOF2", "precision": 12}, 8),
+            ({"name": "SOF10", "precision": 12, "al": 0}, 9),
+            ({"name": "SOF2", "al": 1}, 10),
+            ({"name": "SOF10", "ah": 1}, 11),
+            ({"name": "SOF2", "precision": 12, "al": 2}, 12),
+            ({"name": "SOF10", "precision": 12, "al": 1}, 13),
+            ({"name": "SOF3", "precision": 16}, 14),
+            ({"name": "SOF11", "precision": 2}, 15),
+            ({"name": "SOF1", "hierarchical": True}, 16),
+            ({"name": "SOF9", "hierarchical": True}, 17),
+            ({"name": "SOF1", "hierarchical": True, "precision": 12}, 18),
+            ({"name": "SOF9", "hierarchical": True, "precision": 12}, 19),
+            ({"name": "SOF2", "hierarchical": True}, 20),
+            ({"name": "SOF10", "hierarchical": True}, 21),
+            ({"name": "SOF2", "hierarchical": True, "precision": 12}, 22),
+            ({"name": "SOF10", "hierarchical": True, "precision": 12}, 23),
+            ({"name": "SOF2", "hierarchical": True, "al": 1}, 24),
+            ({"name": "SOF10", "hierarchical": True, "al": 1}, 25),
+            ({"name": "SOF2", "hierarchical": True, "precision": 12, "ah": 1}, 26),
+            ({"name": "SOF10", "hierarchical": True, "precision": 12, "al": 1}, 27),
+            ({"name": "SOF3", "hierarchical": True}, 28),
+            ({"name": "SOF11", "hierarchical": True}, 29),
+        ):
+            assert JPEG(frame(**kwargs)).process == process
+
+    def test_no_sof_raises(self):
+        """Test exceptions are raised if there's no SOFn segment."""
+        jpg = JPEG(parse_buffer(SOI + DRI + EOI))
+        assert jpg.frame is None
+        for attr in ("rows", "columns", "precision", "samples", "process"):
+            with pytest.raises(ValueError, match="as no SOFn marker was found"):
+                getattr(jpg, attr)
+
+
+def restarts(rows=16, columns=32, interval=2, nr_intervals=4):
+    """Return a single component JPEG with restart intervals."""
+    sof = segment(0xFFC0, pack(">BHHB", 8, rows, columns, 1) + b"\x01\x11\x00")
+    data = bytearray(SOI + APP0 + DQT8 + DHT_ + segment(0xFFDD, pack(">H", interval)))
+    data.extend(sof + SOS)
+    for ii in range(nr_intervals):
+        if ii:
+            # With a fill byte before the RSTn marker
+            data.extend(pack(">BBB", 0xFF, 0xFF, 0xD0 + (ii - 1) % 8))
+
+        data.extend(bytes([ii + 1]) + b"\xFF\x00")
+
+    return bytes(data + EOI)
+
+
+class TestRestartStrips:
+    """Tests for restart_strips()."""
+
+    def test_strips(self):
+        """Test splitting into the smallest strips."""
+        strips = restart_strips(restarts())
+        # 4 MCUs per line and 2 MCUs per interval
+        assert [(s.row, s.rows) for s in strips] == [(0, 8), (8, 8)]
+        sof = segment(0xFFC0, pack(">BHHB", 8, 8, 32, 1) + b"\x01\x11\x00")
+        header = APP0 + DQT8 + DHT_ + DRI + sof + SOS
+        assert strips[0].data == (
+            SOI + header + b"\x01\xFF\x00\xFF\xD0\x02\xFF\x00" + EOI
+        )
+        assert strips[1].data == (
+            SOI + header + b"\x03\xFF\x00\xFF\xD0\x04\xFF\x00" + EOI
+        )
+
+        jpg = JPEG(parse_buffer(strips[1].data))
+        assert jpg.rows == 8
+        assert jpg.nr_restart_intervals == 2
+        assert jpg.get_segments("SOS")[0].nr_restarts == 1
+
+    def test_rows(self):
+        """Test the minimum number of rows in a strip."""
+        data = restarts(rows=20, nr_intervals=6)
+        strips = restart_strips(data, rows=9)
+        assert [(s.row, s.rows) for s in strips] == [(0, 16), (16, 4)]
+        assert strips[0].data.endswith(
+            b"\x01\xFF\x00\xFF\xD0\x02\xFF\x00\xFF\xD1\x03\xFF\x00\xFF\xD2"
+            b"\x04\xFF\x00" + EOI
+        )
+        assert strips[1].data.endswith(b"\x05\xFF\x00\xFF\xD0\x06\xFF\x00" + EOI)
+
+        assert len(restart_strips(data, rows=100)) == 1
+
+    def test_lcm(self):
+        """Test strips when intervals don't match lines of MCUs."""
+        # 4 MCUs per line, 3 MCUs per interval, so 12 MCUs per strip
+        data = restarts(rows=48, interval=3, nr_intervals=8)
+        strips = restart_strips(data)
+        assert [(s.row, s.rows) for s in strips] == [(0, 24), (24, 24)]
+        for strip in strips:
+            assert JPEG(parse_buffer(strip.data)).nr_restart_intervals == 4
+
+    def test_buffers(self):
+        """Test splitting data in other buffers."""
+        data = restarts()
+        reference = restart_strips(data)
+        assert restart_strips(bytearray(data)) == reference
+        assert restart_strips(memoryview(data)) == reference
+
+    def test_invalid_raises(self):
+        """Test exceptions are raised if the data can't be split."""
+        with pytest.raises(ValueError, match="has no restart intervals"):
+            restart_strips(build().replace(DRI, segment(0xFFDD, b"\x00\x00")))
+
+        with pytest.raises(ValueError, match="has 3 restart intervals but 4"):
+            restart_strips(build())
+
+        with pytest.raises(ValueError, match="DNL segment is not supported"):
+            restart_strips(restarts(rows=0))
+
+        msg = "Only non-hierarchical sequential and lossless JPEG data"
+        with pytest.raises(ValueError, match=msg):
+            restart_strips(restarts().replace(b"\xFF\xC0", b"\xFF\xC2"))
+
+        with pytest.raises(ValueError, match="No SOFn marker found"):
+            restart_strips(SOI + DRI + EOI)
+
+    def test_pillow(self):
+        """Test the strips decode to the rows of the full image."""
+        np = pytest.importorskip("numpy")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (100, 120, 3), dtype="u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(
+            buffer, "JPEG", restart_marker_blocks=5, subsampling=0
+        )
+        data = buffer.getvalue()
+
+        strips = restart_strips(data, rows=30)
+        assert [s.rows for s in strips] == [32, 32, 32, 4]
+        reference = np.asarray(Image.open(BytesIO(data)))
+        decoded = [np.asarray(Image.open(BytesIO(s.data))) for s in strips]
+        assert np.array_equal(np.concatenate(decoded), reference)
+        assert all(s.overlap == (0, 0) for s in strips)
+
+    def test_subsampled(self):
+        """Test the strips of a subsampled image include their neighbours."""
+        np = pytest.importorskip("numpy")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (100, 120, 3), dtype="u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(buffer, "JPEG", restart_marker_rows=1, subsampling=2)
+        data = buffer.getvalue()
+
+        strips = restart_strips(data, rows=30)
+        assert [s.row for s in strips] == [0, 32, 64, 96]
+        assert [s.rows for s in strips] == [32, 32, 32, 4]
+        assert [s.overlap for s in strips] == [(0, 16), (16, 16), (16, 4), (16, 0)]
+        reference = np.asarray(Image.open(BytesIO(data)))
+        decoded = []
+        for strip in strips:
+            arr = np.asarray(Image.open(BytesIO(strip.data)))
+            above, below = strip.overlap
+            assert arr.shape[0] == above + strip.rows + below
+            decoded.append(arr[above : above + strip.rows])
+
+        assert np.array_equal(np.concatenate(decoded), reference)
+
+
+class TestRestartRegion:
+    """Tests for restart_region()."""
+
+    def test_region(self):
+        """Test the intervals covering the columns are used."""
+        # 4 MCUs per line and 2 MCUs per interval
+        data = restarts(rows=24, nr_intervals=6)
+        region = restart_region(data, slice(10, 12), slice(17, 20))
+        assert region[:4] == (8, 16, 8, 16)
+        assert region.crop == (slice(2, 4, 1), slice(1, 4, 1))
+        sof = segment(0xFFC0, pack(">BHHB", 8, 8, 16, 1) + b"\x01\x11\x00")
+        header = APP0 + DQT8 + DHT_ + DRI + sof + SOS
+        assert region.data == SOI + header + b"\x04\xFF\x00" + EOI
+
+        region = restart_region(data, slice(7, 20, 2), slice(16, 20))
+        assert region[:4] == (0, 16, 24, 16)
+        assert region.crop == (slice(7, 20, 2), slice(0, 4, 1))
+        jpg = JPEG(parse_buffer(region.data))
+        assert (jpg.rows, jpg.columns) == (24, 16)
+        scan = jpg.get_segments("SOS")[0]
+        assert [v[0] for k, v in scan.info.items() if k[0] == "ENC"] == [2, 4, 6]
+        assert scan.nr_restarts == 2
+        assert ("RST1", 167) in scan.info
+
+    def test_lines(self):
+        """Test whole lines are used when intervals don't match lines."""
+        # 4 MCUs per line, 3 MCUs per interval, so 4 intervals per 3 lines
+        data = restarts(rows=48, interval=3, nr_intervals=8)
+        region = restart_region(data, slice(30, 40), slice(5, 6))
+        assert region[:4] == (24, 0, 24, 32)
+        assert region.crop == (slice(6, 16, 1), slice(5, 6, 1))
+        assert region.data.endswith(
+            b"\x05\xFF\x00\xFF\xD0\x06\xFF\x00\xFF\xD1\x07\xFF\x00\xFF\xD2"
+            b"\x08\xFF\x00" + EOI
+        )
+
+    def test_defaults(self):
+        """Test the default region is the whole image."""
+        data = restarts()
+        region = restart_region(data)
+        assert region[:4] == (0, 0, 16, 32)
+        assert region.crop == (slice(0, 16, 1), slice(0, 32, 1))
+        assert region.data == restart_strips(data, rows=16)[0].data
+
+    def test_invalid_raises(self):
+        """Test exceptions are raised for invalid regions."""
+        with pytest.raises(ValueError, match="Only positive slice steps"):
+            restart_region(restarts(), slice(None, None, -1))
+
+        with pytest.raises(ValueError, match="The region to decode is empty"):
+            restart_region(restarts(), slice(10, 10))
+
+        with pytest.raises(ValueError, match="The region to decode is empty"):
+            restart_region(restarts(), cols=slice(40, 50))
+
+        with pytest.raises(ValueError, match="has no restart intervals"):
+            restart_region(build().replace(DRI, segment(0xFFDD, b"\x00\x00")))
+
+    def test_pillow(self):
+        """Test the region decodes to the same samples as the full image."""
+        np = pytest.importorskip("numpy")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (100, 123, 3), dtype="u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(
+            buffer, "JPEG", restart_marker_blocks=4, subsampling=0
+        )
+        data = buffer.getvalue()
+
+        reference = np.asarray(Image.open(BytesIO(data)))
+        rows, cols = slice(10, 30), slice(40, 77)
+        region = restart_region(data, rows, cols)
+        assert region[:4] == (8, 32, 24, 64)
+        decoded = np.asarray(Image.open(BytesIO(region.data)))
+        assert np.array_equal(decoded[region.crop], reference[rows, cols])
+
+    def test_subsampled(self):
+        """Test the region of a subsampled image includes its neighbours."""
+        np = pytest.importorskip("numpy")
+        Image = pytest.importorskip("PIL.Image")
+
+        rng = np.random.default_rng(0)
+        arr = rng.integers(0, 256, (100, 123, 3), dtype="u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(
+            buffer, "JPEG", restart_marker_blocks=1, subsampling=2
+        )
+        data = buffer.getvalue()
+
+        reference = np.asarray(Image.open(BytesIO(data)))
+        for rows, cols, position in (
+            # MCU aligned, the intervals on each side are added
+            (slice(32, 48), slice(16, 48), (16, 0, 48, 64)),
+            # At the edges of the image
+            (slice(0, 16), slice(112, 123), (0, 96, 32, 27)),
+            (slice(90, 100), slice(0, 5), (64, 0, 36, 32)),
+            (slice(10, 30), slice(40, 77), (0, 16, 48, 80)),
+        ):
+            region = restart_region(data, rows, cols)
+            assert region[:4] == position
+            decoded = np.asarray(Image.open(BytesIO(region.data)))
+            assert np.array_equal(decoded[region.crop], reference[rows, cols])
+
+
+def progressive():
+    """Return a progressive JPEG with three scans."""
+    sof = segment(0xFFC2, pack(">BHHB", 8, 16, 16, 1) + b"\x01\x11\x00")
+    dc = segment(0xFFDA, b"\x01\x01\x00\x00\x00\x01")
+    ac = segment(0xFFDA, b"\x01\x01\x01\x01\x3F\x00")
+    refine = segment(0xFFDA, b"\x01\x01\x00\x00\x00\x10")
+    return (
+        SOI
+        + DQT8
+        + sof
+        + DHT_
+        + dc
+        + b"\x01\xFF\x00"
+        + DHT_
+        + ac
+        + b"\x02\x03"
+        + b"\xFF"  # Fill byte before SOS
+        + refine
+        + b"\x04"
+        + EOI
+    )
+
+
+class TestScans:
+    """Tests for get_scans() and truncate_scans()."""
+
+    def test_get_scans(self):
+        """Test getting the scans."""
+        data = progressive()
+        scans = get_scans(data)
+        assert scans == [
+            Scan(125, 138, [1], 0, 0, 0, 1),
+            Scan(179, 191, [1], 1, 63, 0, 0),
+            Scan(192, 203, [1], 0, 0, 1, 0),
+        ]
+        assert data[138:140] == b"\xFF\xC4"
+        assert data[191:193] == b"\xFF\xFF"
+        assert data[203:] == EOI
+        assert get_scans(memoryview(data)) == scans
+
+        # Sequential with restart markers
+        assert get_scans(build()) == [Scan(294, 319, [1], 0, 63, 0, 0)]
+        assert get_scans(SOI + EOI) == []
+
+    def test_truncate(self):
+        """Test truncating the scans."""
+        data = progressive()
+        assert truncate_scans(data, 1) == data[:138] + EOI
+        assert truncate_scans(data, 2) == data[:191] + EOI
+        assert truncate_scans(data, 3) == data
+
+        jpg = JPEG(parse_buffer(truncate_scans(data, 2)))
+        assert len(jpg.get_segments("SOS")) == 2
+        assert len(jpg.get_segments("DHT")) == 2
+
+    def test_truncate_raises(self):
+        """Test exceptions are raised if the data can't be truncated."""
+        msg = "'nr_scans' must be between 1 and 3, the number of scans"
+        for nr_scans in (0, 4):
+            with pytest.raises(ValueError, match=msg):
+                truncate_scans(progressive(), nr_scans)
+
+        with pytest.raises(ValueError, match="Only progressive JPEG data"):
+            truncate_scans(build(), 1)
+
+        with pytest.raises(ValueError, match="No SOFn marker found"):
+            truncate_scans(SOI + EOI, 1)
+
+    def test_pillow(self):
+        """Test the truncated data decodes to a preview of the image."""
+        np = pytest.importorskip("numpy")
+        Image = pytest.importorskip("PIL.Image")
+
+        yy, xx = np.mgrid[0:100, 0:120]
+        arr = np.stack([xx, yy, xx + yy], axis=-1).astype("u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(buffer, "JPEG", progressive=True)
+        data = buffer.getvalue()
+
+        scans = get_scans(data)
+        assert len(scans) > 1
+        reference = np.asarray(Image.open(BytesIO(data)), dtype=int)
+        errors = []
+        for ii, scan in enumerate(scans, 1):
+            truncated = truncate_scans(data, ii)
+            assert len(truncated) == scan.nr_bytes + 2
+            decoded = np.asarray(Image.open(BytesIO(truncated)), dtype=int)
+            errors.append(np.abs(decoded - reference).mean())
+
+        assert errors[-1] == 0
+        assert errors[0] > errors[-1]
+
+
+def hierarchical():
+    """Return a hierarchical JPEG with a base frame and two differential
+    frames.
+    """
+    dhp = segment(0xFFDE, pack(">BHHB", 8, 16, 32, 1) + b"\x01\x11\x00")
+    sof1 = segment(0xFFC1, pack(">BHHB", 8, 8, 16, 1) + b"\x01\x11\x00")
+    exp = segment(0xFFDF, b"\x11")
+    sof5 = segment(0xFFC5, pack(">BHHB", 8, 16, 32, 1) + b"\x01\x11\x00")
+    return (
+        SOI
+        + dhp
+        + DQT8
+        + sof1
+        + DHT_
+        + SOS
+        + b"\x01\xFF\x00"
+        + exp
+        + sof5
+        + SOS
+        + b"\x02\x03"
+        + sof5
+        + SOS
+        + b"\x04"
+        + EOI
+    )
+
+
+class TestFrames:
+    """Tests for get_frames() and truncate_frames()."""
+
+    def test_get_frames(self):
+        """Test getting the frames."""
+        data = hierarchical()
+        frames = get_frames(data)
+        assert frames == [
+            Frame(84, 151, "SOF1", 8, 16, [1], False, (0, 0), None),
+            Frame(156, 181, "SOF5", 16, 32, [1], True, (1, 1), 0),
+            Frame(181, 205, "SOF5", 16, 32, [1], True, (0, 0), 1),
+        ]
+        assert data[151:153] == b"\xFF\xDF"
+        assert data[205:] == EOI
+        assert get_frames(bytearray(data)) == frames
+
+        jpg = JPEG(parse_buffer(data))
+        exp = jpg.get_segments("EXP")[0]
+        assert isinstance(exp, EXPSegment)
+        assert exp.expand == (1, 1)
+
+        # Non-hierarchical
+        assert get_frames(build()) == [
+            Frame(281, 319, "SOF0", 16, 32, [1], False, (0, 0), None)
+        ]
+
+    def test_truncate(self):
+        """Test truncating the frames."""
+        data = hierarchical()
+        # Only the base frame, so non-hierarchical
+        truncated = truncate_frames(data, 1)
+        assert truncated == SOI + data[15:151] + EOI
+        jpg = JPEG(parse_buffer(truncated))
+        assert not jpg.is_hierarchical
+        assert (jpg.rows, jpg.columns) == (8, 16)
+
+        assert truncate_frames(data, 2) == data[:181] + EOI
+        assert truncate_frames(data, 3) == data
+
+        # The DHP size is the size of the last frame
+        data = data.replace(b"\x00\x10\x00\x20", b"\x00\x20\x00\x40")
+        truncated = truncate_frames(data, 2)
+        assert truncated[7:11] == b"\x00\x20\x00\x40"
+        assert truncated[:7] + truncated[11:] == data[:7] + data[11:181] + EOI
+
+    def test_truncate_components(self):
+        """Test the DHP segment is kept if components are in later frames."""
+        components = b"\x01\x11\x00\x02\x11\x00"
+        dhp = segment(0xFFDE, pack(">BHHB", 8, 8, 16, 2) + components)
+        data = SOI + dhp + hierarchical()[15:]
+        assert truncate_frames(data, 1) == data[:154] + EOI
+
+    def test_truncate_raises(self):
+        """Test exceptions are raised if the data can't be truncated."""
+        msg = "'nr_frames' must be between 1 and 3, the number of frames"
+        for nr_frames in (0, 4):
+            with pytest.raises(ValueError, match=msg):
+                truncate_frames(hierarchical(), nr_frames)
+
+        with pytest.raises(ValueError, match="Only hierarchical JPEG data"):
+            truncate_frames(build(), 1)
+
+    def test_pillow(self):
+        """Test the base frame decodes to the image it was encoded from."""
+        np = pytest.importorskip("numpy")
+        Image = pytest.importorskip("PIL.Image")
+
+        yy, xx = np.mgrid[0:40, 0:60]
+        arr = np.stack([xx, yy, xx + yy], axis=-1).astype("u1")
+        buffer = BytesIO()
+        Image.fromarray(arr).save(buffer, "JPEG")
+        # Extended sequential DCT is allowed in hierarchical JPEG
+        base = buffer.getvalue().replace(b"\xFF\xC0", b"\xFF\xC1", 1)
+
+        # Add a DHP segment and a differential frame at twice the size
+        sof = JPEG(parse_buffer(base)).frame
+        components = b"".join(
+            bytes([ci, hi << 4 | vi, tqi])
+            for ci, (hi, vi, tqi) in sof.components.items()
+        )
+        size = pack(">BHHB", 8, 80, 120, 3)
+        data = (
+            SOI
+            + segment(0xFFDE, size + components)
+            + base[2:-2]
+            + segment(0xFFDF, b"\x11")
+            + segment(0xFFC5, size + components)
+            + segment(0xFFDA, b"\x03\x01\x00\x02\x11\x03\x11\x00\x3F\x00")
+            + b"\x12\x34"
+            + EOI
+        )
+
+        frames = get_frames(data)
+        assert [(f.rows, f.columns) for f in frames] == [(40, 60), (80, 120)]
+        truncated = truncate_frames(data, 1)
+        assert truncated == base
+        decoded = np.asarray(Image.open(BytesIO(truncated)))
+        assert decoded.shape == (40, 60, 3)
+
+
+class TestStreamParser:
+    """Tests for StreamParser and parse_stream()."""
+
+    def test_feed(self):
+        """Test the events match parse_buffer() for any size of chunk."""
+        data = build()
+        info = parse_buffer(data)
+        sos = {k: v for k, v in info[("SOS", 294)][2].items() if isinstance(k, str)}
+        for size in (1, 2, 3, 7, len(data)):
+            parser = StreamParser()
+            events = []
+            for idx in range(0, len(data), size):
+                events.extend(parser.feed(data[idx : idx + size]))
+
+            assert parser.done
+            parser.close()
+            assert [(e.kind, e.name, e.offset) for e in events] == [
+                ("segment", "SOI", 1),
+                ("segment", "APP0", 3),
+                ("segment", "COM", 21),
+                ("segment", "DQT", 32),
+                ("segment", "DQT", 101),
+                ("segment", "DHT", 234),
+                ("segment", "DRI", 275),
+                ("segment", "SOF0", 281),
+                ("scan", "SOS", 294),
+                ("restart", "RST0", 308),
+                ("restart", "RST1", 316),
+                ("eoi", "EOI", 321),
+            ]
+            for event in events:
+                key = (event.name, event.offset)
+                if event.kind == "segment":
+                    assert (event.marker, event.fill_bytes, event.info) == info[key]
+                elif event.kind == "restart":
+                    assert key in info[("SOS", 294)][2]
+
+            assert events[8].info == sos
+            assert events[10].fill_bytes == 1
+            assert events[11].fill_bytes == 2
+
+    def test_events_early(self):
+        """Test events are returned as soon as their data arrives."""
+        data = build()
+        parser = StreamParser()
+        assert [e.name for e in parser.feed(data[:40])] == ["SOI", "APP0", "COM"]
+        assert parser.feed(data[40:100]) == []
+        assert [e.name for e in parser.feed(data[100:304])] == [
+            "DQT",
+            "DQT",
+            "DHT",
+            "DRI",
+            "SOF0",
+            "SOS",
+        ]
+        # Only the unparsed data is kept
+        assert len(parser._buf) == 0
+        assert [e.name for e in parser.feed(data[304:310])] == ["RST0"]
+        assert not parser.done
+        with pytest.raises(ValueError, match="ended at offset 310 before the EOI"):
+            parser.close()
+
+        assert [e.name for e in parser.feed(data[310:] + b"\x00\x01")] == [
+            "RST1",
+            "EOI",
+        ]
+        assert parser.done
+        assert parser.feed(b"\xFF\xD8") == []
+
+    def test_bounded(self):
+        """Test the entropy-coded data isn't kept."""
+        data = SOI + SOF0 + SOS + b"\x01\xFF\x00" * 100000 + EOI
+        parser = StreamParser()
+        sizes = []
+        for idx in range(0, len(data), 4096):
+            parser.feed(data[idx : idx + 4096])
+            sizes.append(len(parser._buf))
+
+        assert parser.done
+        assert max(sizes) <= 1
+
+    def test_invalid_raises(self):
+        """Test invalid data raises an exception."""
+        with pytest.raises(ValueError, match="SOI marker not found"):
+            StreamParser().feed(b"\x00\xFF\xD8")
+
+        with pytest.raises(ValueError, match="SOI marker not found"):
+            StreamParser().feed(SOF0)
+
+        with pytest.raises(ValueError, match="No marker found at offset 2"):
+            StreamParser().feed(SOI + b"\x00\x00")
+
+        msg = "Unknown marker 0xFF00 at offset 2"
+        with pytest.raises(NotImplementedError, match=msg):
+            StreamParser().feed(SOI + b"\xFF\x00\x00\x02")
+
+    def test_parse_stream(self):
+        """Test parsing a file-like that can't seek."""
+
+        class Pipe:
+            def __init__(self, data):
+                self.fp = BytesIO(data)
+
+            def read(self, size):
+                return self.fp.read(size)
+
+        data = build()
+        events = list(parse_stream(Pipe(data), chunk_size=5))
+        assert [e.kind for e in events].count("restart") == 2
+        assert events[-1].kind == "eoi"
+
+        with pytest.raises(ValueError, match="ended at offset 300 before the EOI"):
+            list(parse_stream(Pipe(data[:300])))
+
+    def test_pillow(self):
+        """Test parsing progressive JPEG data from Pillow."""
+        Image = pytest.importorskip("PIL.Image")
+        np = pytest.importorskip("numpy")
+
+        arr = np.arange(64 * 48 * 3, dtype="u1").reshape(64, 48, 3)
+        fp = BytesIO()
+        Image.fromarray(arr).save(fp, "JPEG", progressive=True)
+        data = fp.getvalue()
+
+        events = list(parse_stream(BytesIO(data), chunk_size=100))
+        scans = [e.offset for e in events if e.kind == "scan"]
+        assert scans == [offset for name, offset in parse_buffer(data) if name == "SOS"]
+        assert len(scans) == len(get_scans(data))
+
+
+class TestSegmentParsers:
+    """Tests for the file-like segment parsers."""
+
+    def test_positioned(self):
+        """Test the file-like is positioned at the end of the segment."""
+        for parser, data in ((DQT, DQT16), (DHT, DHT_), (SOF, SOF0)):
+            fp = BytesIO(data[2:] + b"\xFF\xD9")
+            parser(fp)
+            assert fp.read() == b"\xFF\xD9"
+
+        fp = BytesIO(DQT8[2:])
+        assert DQT(fp)["Qk"] == [list(range(64))]
+
+    def test_dqt_invalid_precision_raises(self):
+        """Test an invalid DQT precision raises an exception."""
+        msg = "JPEG 10918 - DQT: invalid precision '2'"
+        with pytest.raises(ValueError, match=msg):
+            DQT(BytesIO(segment(0xFFDB, b"\x20" + b"\x00" * 64)[2:]))
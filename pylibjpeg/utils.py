@@ -1,10 +1,22 @@
 from enum import IntEnum
+import importlib
 from importlib import metadata
 import logging
+import mmap
 import os
 from pathlib import Path
-import sys
-from typing import BinaryIO, Any, Protocol, Union, Dict, Tuple, cast
+import threading
+from typing import (
+    BinaryIO,
+    Any,
+    Callable,
+    Optional,
+    Protocol,
+    Union,
+    Dict,
+    Tuple,
+    cast,
+)
 
 import numpy as np
 
@@ -12,7 +24,9 @@ import numpy as np
 LOGGER = logging.getLogger(__name__)
 
 
-DecodeSource = Union[str, os.PathLike, BinaryIO, bytes]
+# Objects supporting the buffer protocol
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap, np.ndarray]
+DecodeSource = Union[str, os.PathLike, BinaryIO, Buffer]
 
 
 class Decoder(Protocol):
@@ -52,25 +66,144 @@ class Version(IntEnum):
     v2 = 2
 
 
-def decode(src: DecodeSource, decoder: str = "", **kwargs: Any) -> np.ndarray:
+class PluginRegistry:
+    """A process-wide cache of the installed *pylibjpeg* plugins.
+
+    .. versionadded:: 2.2
+
+    The installed distributions are only scanned for ``pylibjpeg.*`` entry
+    points the first time they're needed and each plugin's callable is only
+    imported the first time it's requested. Use :meth:`invalidate` after
+    installing or removing plugins at runtime.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._groups: Optional[Dict[str, Tuple[metadata.EntryPoint, ...]]] = None
+        self._loaded: Dict[metadata.EntryPoint, Callable[..., Any]] = {}
+
+    def _scan(self) -> Dict[str, Tuple[metadata.EntryPoint, ...]]:
+        """Return the ``pylibjpeg.*`` entry points as {group: entry points}."""
+        groups: Dict[str, Dict[metadata.EntryPoint, None]] = {}
+        seen = set()
+        for dist in metadata.distributions():
+            # Match importlib.metadata.entry_points() and only use the first
+            #   distribution found for a given package name
+            name = dist.name
+            if name in seen:
+                continue
+
+            seen.add(name)
+            for ep in dist.entry_points:
+                if ep.group.startswith("pylibjpeg."):
+                    groups.setdefault(ep.group, {})[ep] = None
+
+        return {group: tuple(eps) for group, eps in groups.items()}
+
+    def entry_points(self, group: str) -> Tuple[metadata.EntryPoint, ...]:
+        """Return the entry points registered for `group`.
+
+        Parameters
+        ----------
+        group : str
+            The name of the entry point group, such as
+            ``"pylibjpeg.jpeg_decoders"``.
+
+        Returns
+        -------
+        tuple[importlib.metadata.EntryPoint, ...]
+            The entry points for `group`, which may be empty.
+        """
+        groups = self._groups
+        if groups is None:
+            with self._lock:
+                if self._groups is None:
+                    self._groups = self._scan()
+
+                groups = self._groups
+
+        return groups.get(group, ())
+
+    def invalidate(self) -> None:
+        """Clear the cached entry points and loaded plugins.
+
+        The next lookup will rescan the installed distributions.
+        """
+        with self._lock:
+            importlib.invalidate_caches()
+            self._groups = None
+            self._loaded = {}
+
+    def load(self, ep: metadata.EntryPoint) -> Callable[..., Any]:
+        """Return the callable for the entry point `ep`, importing if required.
+
+        Parameters
+        ----------
+        ep : importlib.metadata.EntryPoint
+            The entry point to load.
+
+        Returns
+        -------
+        Callable
+            The plugin's encoding or decoding function.
+        """
+        try:
+            return self._loaded[ep]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if ep not in self._loaded:
+                self._loaded[ep] = cast(Callable[..., Any], ep.load())
+
+            return self._loaded[ep]
+
+
+# The process-wide plugin cache used by the get_*() functions
+REGISTRY = PluginRegistry()
+
+
+def decode(
+    src: DecodeSource,
+    decoder: str = "",
+    use_mmap: bool = False,
+    out: Optional[np.ndarray] = None,
+    **kwargs: Any,
+) -> np.ndarray:
     """Return the decoded JPEG image as a :class:`numpy.ndarray`.
 
+    .. versionchanged:: 2.2
+
+        Added support for `src` being any object that supports the buffer
+        protocol, and added the `use_mmap` and `out` keyword parameters.
+
     Parameters
     ----------
-    src : str, file-like, os.PathLike, or bytes
+    src : str, file-like, os.PathLike, or bytes-like
         The data to decode. May be a path to a file (as ``str`` or
-        path-like), a file-like, or a ``bytes`` containing the encoded binary
-        data.
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data, such as :class:`bytes`,
+        :class:`bytearray`, :class:`memoryview`, :class:`mmap.mmap` or
+        :class:`numpy.ndarray`. Buffers are passed to decoders that support
+        them without being copied.
     decoder : str, optional
         The name of the plugin to use when decoding the data. If not used
-        then all available decoders will be tried.
+        then the available decoders for the format of the data will be tried,
+        or all available decoders if the format can't be identified.
+    use_mmap : bool, optional
+        If ``True`` and `src` is a path then memory-map the file rather than
+        reading it, default ``False``.
+    out : numpy.ndarray, optional
+        A C-contiguous and writeable array to decode into, which must have the
+        same shape and dtype as the decoded image. Decoders that can't write
+        into `out` directly have their decoded image copied into it.
     kwargs : dict
         A ``dict`` containing keyword parameters to pass to the decoder.
 
     Returns
     -------
     numpy.ndarray
-        An ``ndarray`` containing the decoded image data.
+        An ``ndarray`` containing the decoded image data, or `out` if used.
 
     Raises
     ------
@@ -78,25 +211,377 @@ def decode(src: DecodeSource, decoder: str = "", **kwargs: Any) -> np.ndarray:
         If `decoder` is not ``None`` and the corresponding plugin is not
         available.
     """
-    decoders = get_decoders()
+    _check_decoders()
+    if out is not None:
+        _check_out(out)
+
+    return _decode_data(_read_source(src, use_mmap), decoder, out=out, **kwargs)
+
+
+def decode_pixel_data(
+    src: DecodeSource,
+    transfer_syntax_uid: str,
+    decoder: str = "",
+    out: Optional[np.ndarray] = None,
+    **kwargs: Any,
+) -> Union[np.ndarray, bytearray]:
+    """Return a frame of decoded DICOM *Pixel Data*.
+
+    .. versionadded:: 2.2
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        A single frame of encoded *Pixel Data*. May be a path to a file (as
+        ``str`` or path-like), a file-like, or an object supporting the buffer
+        protocol containing the encoded binary data.
+    transfer_syntax_uid : str
+        The *Transfer Syntax UID* of the encoded data.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data. If not used
+        then all the available decoders for `transfer_syntax_uid` will be
+        tried.
+    out : numpy.ndarray, optional
+        A C-contiguous and writeable array to decode into, which must have the
+        same size in bytes as the decoded frame. Decoders that can't write
+        into `out` directly have their decoded frame copied into it.
+    kwargs : dict
+        A ``dict`` containing the keyword parameters to pass to the decoder,
+        as described in the :doc:`plugin specification </plugins>`.
+
+    Returns
+    -------
+    numpy.ndarray | bytearray
+        The decoded frame, as returned by the decoder, or `out` if used.
+
+    Raises
+    ------
+    ValueError
+        If no decoders are available for `transfer_syntax_uid` or if the data
+        couldn't be decoded.
+    """
+    if out is not None:
+        _check_out(out)
+
+    decoders = cast(
+        Dict[str, Dict[str, Decoder]], get_pixel_data_decoders(Version.v2)
+    ).get(transfer_syntax_uid, {})
+    if decoder:
+        decoders = {decoder: decoders[decoder]} if decoder in decoders else {}
+
     if not decoders:
+        raise ValueError(
+            "No pixel data decoders are available for the transfer syntax "
+            f"'{transfer_syntax_uid}'"
+        )
+
+    data = _read_source(src)
+    kwargs["transfer_syntax_uid"] = transfer_syntax_uid
+    for name, func in decoders.items():
+        try:
+            frame = _call_decoder(func, data, out, **kwargs)
+        except Exception as exc:
+            LOGGER.debug(f"Decoding with the {name} plugin failed")
+            LOGGER.exception(exc)
+        else:
+            return _copy_frame(frame, out)
+
+    raise ValueError("Unable to decode the data with the available plugins")
+
+
+def reshape_pixel_data(
+    frame: Union[np.ndarray, bytes, bytearray, memoryview],
+    rows: int,
+    columns: int,
+    samples_per_pixel: int = 1,
+    bits_allocated: int = 8,
+    pixel_representation: int = 0,
+    planar_configuration: int = 0,
+    number_of_frames: int = 1,
+    copy: Optional[bool] = None,
+    **kwargs: Any,
+) -> np.ndarray:
+    """Return decoded *Pixel Data* as a typed and shaped
+    :class:`~numpy.ndarray`.
+
+    .. versionadded:: 2.2
+
+    Takes the little endian ordered data returned by a pixel data decoder,
+    as either a :class:`bytearray` or a 1-dimensional ``uint8`` ndarray, and
+    returns it with the dtype given by `bits_allocated` and
+    `pixel_representation` and the shape (rows, columns), (rows, columns,
+    samples) or, for multiple frames, with a leading frames axis. The same
+    keyword parameters that were passed to the decoder may be used.
+
+    The returned array is a view of `frame` whenever possible, including
+    for planar configuration ``1`` data, where it's a non-contiguous view of
+    the color-by-plane data, and is read-only if `frame` is. A copy is only
+    needed if `frame` isn't C-contiguous, which is logged at the ``DEBUG``
+    level.
+
+    Parameters
+    ----------
+    frame : numpy.ndarray, bytes, bytearray or memoryview
+        The decoded *Pixel Data*. Any trailing padding is ignored.
+    rows : int
+        The number of rows of pixels.
+    columns : int
+        The number of columns of pixels.
+    samples_per_pixel : int, optional
+        The number of samples per pixel, default ``1``.
+    bits_allocated : int, optional
+        The number of bits used to contain each sample, one of ``8``
+        (default), ``16``, ``32`` or ``64``.
+    pixel_representation : int, optional
+        ``0`` (default) for unsigned integers, ``1`` for 2's complement
+        signed integers.
+    planar_configuration : int, optional
+        ``0`` (default) if the samples are color-by-pixel, ``1`` if they're
+        color-by-plane.
+    number_of_frames : int, optional
+        The number of frames in `frame`, default ``1``.
+    copy : bool, optional
+        If ``None`` (default) then only copy when unavoidable. If ``False``
+        then raise an exception instead of copying, and if ``True`` then
+        always return a copy.
+    kwargs : dict
+        Other keyword parameters, which are ignored.
+
+    Returns
+    -------
+    numpy.ndarray
+        The shaped *Pixel Data*.
+
+    Raises
+    ------
+    ValueError
+        If a parameter is invalid, `frame` is too short or a copy is needed
+        and `copy` is ``False``.
+    """
+    if bits_allocated not in (8, 16, 32, 64):
+        raise ValueError(f"Unsupported 'bits_allocated' value {bits_allocated}")
+
+    if pixel_representation not in (0, 1):
+        raise ValueError(
+            f"Invalid 'pixel_representation' value {pixel_representation}"
+        )
+
+    if planar_configuration not in (0, 1):
+        raise ValueError(
+            f"Invalid 'planar_configuration' value {planar_configuration}"
+        )
+
+    view = frame.data if isinstance(frame, np.ndarray) else memoryview(frame)
+    copied = not view.c_contiguous
+    if copied and copy is False:
+        raise ValueError("'frame' must be C-contiguous when 'copy' is False")
+
+    if copied:
+        frame = bytearray(view.tobytes())
+
+    view = _as_view(frame)
+    kind = "i" if pixel_representation else "u"
+    dtype = np.dtype(f"<{kind}{bits_allocated // 8}")
+    length = number_of_frames * rows * columns * samples_per_pixel
+    if len(view) < length * dtype.itemsize:
+        raise ValueError(
+            f"The decoded pixel data is {len(view)} bytes but at least "
+            f"{length * dtype.itemsize} bytes are needed"
+        )
+
+    arr: np.ndarray = np.frombuffer(view, dtype=dtype, count=length)
+    if samples_per_pixel == 1:
+        arr = arr.reshape(number_of_frames, rows, columns)
+    elif planar_configuration:
+        arr = arr.reshape(number_of_frames, samples_per_pixel, rows, columns)
+        arr = arr.transpose(0, 2, 3, 1)
+    else:
+        arr = arr.reshape(number_of_frames, rows, columns, samples_per_pixel)
+
+    if number_of_frames == 1:
+        arr = arr[0]
+
+    if copy:
+        arr = arr.copy()
+    elif copied:
+        LOGGER.debug("The decoded pixel data was copied as it isn't C-contiguous")
+
+    return arr
+
+
+def _check_decoders() -> None:
+    """Raise an exception if no JPEG decoders are installed."""
+    if not any(REGISTRY.entry_points(ep) for ep in DECODER_ENTRY_POINTS.values()):
         raise RuntimeError(
             "No JPEG decoders are available - have you installed any plugins?"
         )
 
+
+def _read_source(src: DecodeSource, use_mmap: bool = False) -> Buffer:
+    """Return the encoded data from `src`.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The source of the encoded data, buffers are returned as-is.
+    use_mmap : bool, optional
+        If ``True`` and `src` is a path then return the memory-mapped file.
+    """
     if isinstance(src, (str, os.PathLike)):
         path = Path(src).resolve(strict=True)
         with path.open("rb") as f:
-            data = f.read()
-    elif isinstance(src, bytes):
-        data = src
+            if use_mmap and path.stat().st_size:
+                # The map stays valid after the file is closed
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            return f.read()
+
+    if isinstance(src, (bytes, bytearray, memoryview, mmap.mmap, np.ndarray)):
+        return src
+
+    # BinaryIO
+    return src.read()
+
+
+def _as_view(data: Buffer) -> memoryview:
+    """Return a 1-dimensional unsigned byte :class:`memoryview` of `data`."""
+    view = data.data if isinstance(data, np.ndarray) else memoryview(data)
+    if view.format == "B" and view.ndim == 1:
+        return view
+
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+
+    return view.cast("B")
+
+
+def _as_plugin_source(func: Callable[..., Any], data: Buffer) -> bytes:
+    """Return `data` in a form accepted by the plugin function `func`.
+
+    Plugin functions that accept any object supporting the buffer protocol
+    set a ``supports_buffers`` attribute to ``True``, other functions are
+    passed :class:`bytes`.
+    """
+    if isinstance(data, bytes) or getattr(func, "supports_buffers", False):
+        return cast(bytes, data)
+
+    return _as_view(data).tobytes()
+
+
+def _check_out(out: np.ndarray) -> None:
+    """Raise an exception if `out` can't be decoded into."""
+    if not isinstance(out, np.ndarray):
+        raise TypeError("'out' must be a numpy.ndarray")
+
+    if not out.flags.c_contiguous:
+        raise ValueError("'out' must be C-contiguous")
+
+    if not out.flags.writeable:
+        raise ValueError("'out' must be writeable")
+
+
+def _call_decoder(
+    func: Decoder, data: Buffer, out: Optional[np.ndarray], **kwargs: Any
+) -> np.ndarray:
+    """Return the result of decoding `data` with the plugin function `func`.
+
+    Plugin functions that can decode into an existing array set a
+    ``supports_out`` attribute to ``True`` and are passed `out`.
+    """
+    if out is not None and getattr(func, "supports_out", False):
+        kwargs["out"] = out
+
+    return func(_as_plugin_source(func, data), **kwargs)
+
+
+def _copy_image(arr: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    """Return `out` after copying the decoded image `arr` into it.
+
+    If `out` is ``None`` or the decoder wrote into it then return `arr`.
+    """
+    if out is None or arr is out:
+        return arr
+
+    if arr.shape != out.shape or arr.dtype != out.dtype:
+        raise ValueError(
+            f"The decoded image has shape {arr.shape} and dtype '{arr.dtype}' "
+            f"but 'out' has shape {out.shape} and dtype '{out.dtype}'"
+        )
+
+    np.copyto(out, arr)
+
+    return out
+
+
+def _copy_frame(
+    frame: Union[np.ndarray, bytearray], out: Optional[np.ndarray]
+) -> Union[np.ndarray, bytearray]:
+    """Return `out` after copying the decoded *Pixel Data* `frame` into it.
+
+    If `out` is ``None`` or the decoder wrote into it then return `frame`.
+    """
+    if out is None or frame is out:
+        return frame
+
+    if isinstance(frame, np.ndarray):
+        src = frame.reshape(-1).view(np.uint8)
     else:
-        # BinaryIO
-        data = src.read()
+        src = np.frombuffer(frame, dtype=np.uint8)
+
+    if src.nbytes != out.nbytes:
+        raise ValueError(
+            f"The decoded frame is {src.nbytes} bytes but 'out' is {out.nbytes} "
+            "bytes"
+        )
+
+    np.copyto(out.reshape(-1).view(np.uint8), src)
+
+    return out
+
 
+def _resolve_decoders() -> Dict[str, Dict[str, Decoder]]:
+    """Return the available decoders as ``{decoder type: {package: callable}}``.
+
+    The decoders for all types are available using an empty string.
+    """
+    resolved = {name: get_decoders(name) for name in DECODER_ENTRY_POINTS}
+    resolved[""] = get_decoders()
+
+    return resolved
+
+
+def _decode_data(
+    data: Buffer,
+    decoder: str = "",
+    resolved: Optional[Dict[str, Dict[str, Decoder]]] = None,
+    out: Optional[np.ndarray] = None,
+    **kwargs: Any,
+) -> np.ndarray:
+    """Return the decoded `data` as a :class:`numpy.ndarray`.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The encoded image data.
+    decoder : str, optional
+        The name of the plugin to use when decoding the data.
+    resolved : dict[str, dict[str, Decoder]], optional
+        The available decoders, as returned by :func:`_resolve_decoders`. If
+        not used then the decoders will be looked up as needed.
+    out : numpy.ndarray, optional
+        The array to decode into, which must already have been checked with
+        :func:`_check_out`.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the decoder.
+    """
     if decoder:
         try:
-            return decoders[decoder](data, **kwargs)
+            if resolved is None:
+                func = cast(Decoder, _get_plugin(DECODER_ENTRY_POINTS, decoder))
+            else:
+                func = resolved[""][decoder]
+
+            arr = _call_decoder(func, data, out, **kwargs)
         except KeyError:
             raise ValueError(
                 f"The '{decoder}' decoder is not available - have you installed "
@@ -105,18 +590,175 @@ def decode(src: DecodeSource, decoder: str = "", **kwargs: Any) -> np.ndarray:
         except Exception as exc:
             LOGGER.debug(f"Decoding with the {decoder} plugin failed")
             LOGGER.exception(exc)
+        else:
+            return _copy_image(arr, out)
+
+    # Only try the decoders for the format of the encoded data, if known
+    decoder_type = cast(str, _sniff(_as_view(data), complete=True))
+    if resolved is None:
+        decoders = get_decoders(decoder_type) if decoder_type else {}
+        if not decoders:
+            decoders = get_decoders()
+    else:
+        decoders = resolved[decoder_type] or resolved[""]
 
     for name, func in decoders.items():
         try:
-            return func(data, **kwargs)
+            arr = _call_decoder(func, data, out, **kwargs)
         except Exception as exc:
             LOGGER.debug(f"Decoding with the {name} plugin failed")
             LOGGER.exception(exc)
+        else:
+            return _copy_image(arr, out)
 
     # If we made it here then we were unable to decode the data
     raise ValueError("Unable to decode the data with the available plugins")
 
 
+def sniff_format(src: DecodeSource) -> str:
+    """Return the format of the encoded image data in `src`.
+
+    .. versionadded:: 2.2
+
+    Only the leading bytes of `src` are read, which is enough to identify
+    the format from its signature or, for data starting with an SOI marker,
+    the first SOFn marker.
+
+    Parameters
+    ----------
+    src : str, file-like, os.PathLike, or bytes-like
+        The encoded data to identify. May be a path to a file (as ``str`` or
+        path-like), a file-like, or an object supporting the buffer protocol
+        containing the encoded binary data. File-likes will be returned to
+        their original position.
+
+    Returns
+    -------
+    str
+        The matching key of :data:`DECODER_ENTRY_POINTS`, one of ``"JPEG"``,
+        ``"JPEG XT"``, ``"JPEG-LS"``, ``"JPEG 2000"``, ``"JPEG XR"``,
+        ``"JPEG XS"`` or ``"JPEG XL"``, or an empty string if the format
+        cannot be identified.
+    """
+    if isinstance(src, (str, os.PathLike)):
+        with Path(src).open("rb") as f:
+            return _sniff_file(f)
+
+    if isinstance(src, (bytes, bytearray, memoryview, mmap.mmap, np.ndarray)):
+        return cast(str, _sniff(_as_view(src), complete=True))
+
+    # BinaryIO
+    start = src.tell()
+    try:
+        return _sniff_file(src)
+    finally:
+        src.seek(start)
+
+
+# Leading bytes of encoded data and their format
+_SIGNATURES = (
+    # JPEG 2000 codestream: SOC and SIZ markers
+    (b"\xFF\x4F\xFF\x51", "JPEG 2000"),
+    # JP2 and JPH signature boxes
+    (b"\x00\x00\x00\x0C\x6A\x50\x20\x20\x0D\x0A\x87\x0A", "JPEG 2000"),
+    # JPEG XL codestream and container signature box
+    (b"\xFF\x0A", "JPEG XL"),
+    (b"\x00\x00\x00\x0C\x4A\x58\x4C\x20\x0D\x0A\x87\x0A", "JPEG XL"),
+    # JPEG XS codestream (SOC and CAP markers) and container signature box
+    (b"\xFF\x10\xFF\x50", "JPEG XS"),
+    (b"\x00\x00\x00\x0C\x4A\x58\x53\x20\x0D\x0A\x87\x0A", "JPEG XS"),
+    # JPEG XR (little-endian TIFF-like header)
+    (b"\x49\x49\xBC", "JPEG XR"),
+)
+_SIGNATURE_LENGTH = max(len(x[0]) for x in _SIGNATURES)
+
+# The second byte of the 10918 SOFn markers
+_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF,
+}  # fmt: skip
+
+
+def _sniff(data: memoryview, complete: bool) -> Optional[str]:
+    """Return the format of the encoded `data`.
+
+    Parameters
+    ----------
+    data : memoryview
+        The leading bytes of the encoded data.
+    complete : bool
+        ``True`` if `data` contains all the encoded data, ``False`` if more
+        is available.
+
+    Returns
+    -------
+    str | None
+        The format, an empty string if it cannot be identified or ``None`` if
+        more data is needed.
+    """
+    if data[:2] == b"\xFF\xD8":
+        return _sniff_10918(data, complete)
+
+    for signature, name in _SIGNATURES:
+        if data[: len(signature)] == signature:
+            return name
+
+    if not complete and len(data) < _SIGNATURE_LENGTH:
+        return None
+
+    return ""
+
+
+def _sniff_10918(data: memoryview, complete: bool) -> Optional[str]:
+    """Return the format of `data` starting with an SOI marker.
+
+    JPEG-LS is identified by an SOF55 marker and JPEG XT by an APP11 marker
+    segment containing boxes, otherwise the data is assumed to be 10918 JPEG.
+    """
+    is_xt = False
+    offset = 2
+    length = len(data)
+    while True:
+        # Skip any fill bytes
+        while offset + 1 < length and data[offset + 1] == 0xFF:
+            offset += 1
+
+        if offset + 6 > length:
+            break
+
+        if data[offset] != 0xFF:
+            # Not a marker, let the decoders sort it out
+            return "JPEG"
+
+        marker = data[offset + 1]
+        if marker == 0xF7:
+            return "JPEG-LS"
+
+        if marker in _SOF_MARKERS or marker == 0xDA:
+            return "JPEG XT" if is_xt else "JPEG"
+
+        if marker == 0xEB and data[offset + 4 : offset + 6] == b"JP":
+            is_xt = True
+
+        offset += 2 + ((data[offset + 2] << 8) | data[offset + 3])
+
+    return "JPEG" if complete else None
+
+
+def _sniff_file(f: BinaryIO) -> str:
+    """Return the format of the encoded data in the file-like `f`."""
+    data = b""
+    size = 4096
+    while True:
+        data += f.read(size - len(data))
+        complete = len(data) < size
+        name = _sniff(memoryview(data), complete)
+        if name is not None:
+            return name
+
+        size *= 4
+
+
 def _encode(
     arr: np.ndarray, encoder: str = "", **kwargs: Any
 ) -> Union[bytes, bytearray]:
@@ -169,6 +811,123 @@ def _encode(
     raise ValueError("Unable to encode the data")
 
 
+def encode(
+    arr: np.ndarray, encoder: str = "", encoder_type: str = "", **kwargs: Any
+) -> Union[bytes, bytearray]:
+    """Return the encoded `arr` as a :class:`bytes`.
+
+    .. versionadded:: 2.2
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The image data to encode as a :class:`~numpy.ndarray`.
+    encoder : str, optional
+        The name of the plugin to use when encoding the data.
+    encoder_type : str, optional
+        The format to encode to, one of the keys of
+        :data:`ENCODER_ENTRY_POINTS`, such as ``"JPEG 2000"``. If used without
+        `encoder` then only the encoders for the format will be tried.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the encoder.
+
+    Returns
+    -------
+    bytes | bytearray
+        The encoded image data.
+
+    Raises
+    ------
+    RuntimeError
+        If no encoders are available for `encoder_type`, or if no encoders
+        are available at all.
+    ValueError
+        If `encoder_type` is unknown, if the `encoder` plugin is not available
+        or if none of the encoders were able to encode `arr`.
+
+    Notes
+    -----
+    When only one encoder is used, such as when `encoder` is supplied or
+    only one plugin is available for `encoder_type`, then any exception
+    raised by the encoder is not caught.
+    """
+    return _encode_data(arr, _resolve_encoders(encoder, encoder_type), **kwargs)
+
+
+def _resolve_encoders(encoder: str = "", encoder_type: str = "") -> Dict[str, Encoder]:
+    """Return the encoders to use as ``{package: callable}``.
+
+    Parameters
+    ----------
+    encoder : str, optional
+        The name of the plugin to use, if not used then all the encoders for
+        `encoder_type` will be returned.
+    encoder_type : str, optional
+        The format to encode to, if not used then all available encoders
+        will be returned.
+    """
+    if encoder_type and encoder_type not in ENCODER_ENTRY_POINTS:
+        raise ValueError(f"Unknown encoder type '{encoder_type}'")
+
+    if encoder:
+        if encoder_type:
+            encoders = get_encoders(encoder_type)
+        else:
+            # Only load the matching plugin
+            try:
+                encoders = {
+                    encoder: cast(Encoder, _get_plugin(ENCODER_ENTRY_POINTS, encoder))
+                }
+            except KeyError:
+                encoders = {}
+
+        if encoder not in encoders:
+            raise ValueError(
+                f"The '{encoder}' encoder is not available - have you installed "
+                "the plugin?"
+            )
+
+        return {encoder: encoders[encoder]}
+
+    encoders = get_encoders(encoder_type)
+    if not encoders:
+        if encoder_type:
+            raise RuntimeError(f"No {encoder_type} encoders are available")
+
+        raise RuntimeError("No encoders are available")
+
+    return encoders
+
+
+def _encode_data(
+    arr: np.ndarray, encoders: Dict[str, Encoder], **kwargs: Any
+) -> Union[bytes, bytearray]:
+    """Return `arr` encoded with the first of `encoders` to succeed.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The image data to encode.
+    encoders : dict[str, Encoder]
+        The encoders to use, as returned by :func:`_resolve_encoders`.
+    kwargs : dict
+        A ``dict`` containing keyword parameters to pass to the encoder.
+    """
+    if len(encoders) == 1:
+        func = next(iter(encoders.values()))
+        return func(arr, **kwargs)
+
+    for name, func in encoders.items():
+        try:
+            return func(arr, **kwargs)
+        except Exception as exc:
+            LOGGER.debug(f"Encoding with the {name} plugin failed: {exc}")
+            error = exc
+
+    # If we made it here then we were unable to encode the data
+    raise ValueError("Unable to encode the data with the available plugins") from error
+
+
 def get_decoders(decoder_type: str = "") -> Dict[str, Decoder]:
     """Return a :class:`dict` of JPEG decoders as {package: callable}.
 
@@ -236,6 +995,10 @@ def _get_plugins(
 ) -> Dict[str, Union[Decoder, Encoder]]:
     """Return a :class:`dict` of JPEG encoders/decoders as {package: callable}.
 
+    .. versionchanged:: 2.2
+
+        Plugins are now looked up using the cached :data:`REGISTRY`.
+
     Parameters
     ----------
     entry_points : dict[str, str]
@@ -253,54 +1016,10 @@ def _get_plugins(
         If no `plugin_type` is used then all available encoders/decoders will
         be returned.
     """
-    plugins = {}
-
-    # Python 3.8, 3.9
-    if sys.version_info[:2] < (3, 10):
-        # {"package name": [EntryPoint(), ...]}
-        ep = metadata.entry_points()
-        if not plugin_type:
-            for entry_point in entry_points.values():
-                eps = cast(Tuple[metadata.EntryPoint], ep.get(entry_point, tuple()))
-                if eps:
-                    names = sorted(list(set([f"'{x.name}'" for x in eps])))
-                    LOGGER.debug(
-                        f"Found plugin(s) {', '.join(names)} for entry point "
-                        f"'{entry_point}'"
-                    )
-                    plugins.update({val.name: val.load() for val in eps})
-                else:
-                    LOGGER.debug(f"No plugins found for entry point '{entry_point}'")
-
-            return plugins
-
-        try:
-            entry_point = entry_points[plugin_type]
-        except KeyError:
-            raise KeyError(f"No matching plugin entry point for '{plugin_type}'")
-
-        eps = cast(Tuple[metadata.EntryPoint], ep.get(entry_point, tuple()))
-        if eps:
-            names = sorted(list(set([f"'{x.name}'" for x in eps])))
-            LOGGER.debug(f"Found plugin(s) {names} for entry point '{entry_point}'")
-        else:
-            LOGGER.debug(f"No plugins found for entry point '{entry_point}'")
-
-        return {val.name: val.load() for val in eps}
-
-    # Python 3.10+
     if not plugin_type:
+        plugins: Dict[str, Union[Decoder, Encoder]] = {}
         for entry_point in entry_points.values():
-            eps = metadata.entry_points(group=entry_point)
-            if eps:
-                names = sorted(list(set([f"'{x.name}'" for x in eps])))
-                LOGGER.debug(
-                    f"Found plugin(s) {', '.join(names)} for entry point "
-                    f"'{entry_point}'"
-                )
-                plugins.update({val.name: val.load() for val in eps})
-            else:
-                LOGGER.debug(f"No plugins found for entry point '{entry_point}'")
+            plugins.update(_get_entry_point_plugins(entry_point))
 
         return plugins
 
@@ -309,14 +1028,52 @@ def _get_plugins(
     except KeyError:
         raise KeyError(f"No matching plugin entry point for '{plugin_type}'")
 
-    eps = metadata.entry_points(group=entry_point)
+    return _get_entry_point_plugins(entry_point)
+
+
+def _get_plugin(entry_points: Dict[str, str], name: str) -> Union[Decoder, Encoder]:
+    """Return the encoding/decoding function for the plugin `name`.
+
+    Only the matching plugin is loaded.
+
+    Parameters
+    ----------
+    entry_points : dict[str, str]
+        A dict matching the plugin types to their entry points.
+    name : str
+        The name of the plugin.
+
+    Raises
+    ------
+    KeyError
+        If no plugin named `name` is available.
+    """
+    for entry_point in entry_points.values():
+        for ep in REGISTRY.entry_points(entry_point):
+            if ep.name == name:
+                return cast(Union[Decoder, Encoder], REGISTRY.load(ep))
+
+    raise KeyError(name)
+
+
+def _get_entry_point_plugins(entry_point: str) -> Dict[str, Union[Decoder, Encoder]]:
+    """Return the plugins for `entry_point` as {package: callable}.
+
+    Parameters
+    ----------
+    entry_point : str
+        The name of the entry point group.
+    """
+    eps = REGISTRY.entry_points(entry_point)
     if eps:
-        names = list(set([f"'{x.name}'" for x in eps]))
-        LOGGER.debug(f"Found plugin(s) {names} for entry point '{entry_point}'")
+        names = sorted(set([f"'{x.name}'" for x in eps]))
+        LOGGER.debug(
+            f"Found plugin(s) {', '.join(names)} for entry point '{entry_point}'"
+        )
     else:
         LOGGER.debug(f"No plugins found for entry point '{entry_point}'")
 
-    return {val.name: val.load() for val in eps}
+    return {ep.name: REGISTRY.load(ep) for ep in eps}
 
 
 def get_pixel_data_decoders(
@@ -415,47 +1172,22 @@ def _get_pixel_data_plugins(
         * ``{UID: function}`` for `version` ``1``
         * ``{UID: {plugin name: function}}`` for `version` ``2``
     """
-    plugins = {}
-
-    # Python 3.8, 3.9
-    if sys.version_info[:2] < (3, 10):
-        entry_points = metadata.entry_points()
-        if entry_point not in entry_points:
-            LOGGER.debug(f"No plugins found for entry point '{entry_point}'")
-            return {}
-
-        # dict[str, Tuple[EntryPoint]], may be multiple EntryPoints for same UID
-        eps = entry_points[entry_point]
-        LOGGER.debug(f"Found plugin(s) for entry point '{entry_point}'")
-        for ep in set(eps):
-            name = ep.value.split(":")[0]
-            LOGGER.debug(f"  Found plugin '{name}' for UID '{ep.name}'")
-            if version == Version.v1:
-                # Return {UID: encode/decode function}
-                plugins[ep.name] = ep.load()
-            else:
-                # Return {UID: {plugin name: encode/decode function}}
-                uid_plugins = plugins.setdefault(ep.name, {})
-                uid_plugins[name] = ep.load()
-
-        return plugins
-
-    # Python 3.10+
-    eps = metadata.entry_points(group=entry_point)
+    plugins: Dict[str, Any] = {}
+    eps = REGISTRY.entry_points(entry_point)
     if not eps:
         LOGGER.debug(f"No plugins found for entry point '{entry_point}'")
         return {}
 
     LOGGER.debug(f"Found plugin(s) for entry point '{entry_point}'")
-    for ep in set(eps):
+    for ep in eps:
         name = ep.value.split(":")[0]
         LOGGER.debug(f"  Found plugin '{name}' for UID '{ep.name}'")
         if version == Version.v1:
             # Return {UID: encode/decode function}
-            plugins[ep.name] = ep.load()
+            plugins[ep.name] = REGISTRY.load(ep)
         else:
             # Return {UID: {plugin name: encode/decode function}}
             uid_plugins = plugins.setdefault(ep.name, {})
-            uid_plugins[name] = ep.load()
+            uid_plugins[name] = REGISTRY.load(ep)
 
     return plugins